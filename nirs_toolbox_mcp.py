@@ -10,9 +10,31 @@ NIRS-Toolbox MCP Server
 import os
 import sys
 import re
+import asyncio
+import contextvars
+import difflib
+import functools
+import hashlib
+import math
+import heapq
+import multiprocessing
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict, List, Tuple
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
+import anyio
+import httpx
+from typing_extensions import NotRequired, TypedDict
 from mcp.server.fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 
 # ==========================================
 # 1. 配置
@@ -20,282 +42,2720 @@ from mcp.server.fastmcp import FastMCP
 
 mcp = FastMCP("huppert", json_response=True)
 
+def parse_toolbox_paths(value: str) -> Dict[str, Path]:
+    """
+    解析 NIRS_TOOLBOX_PATH：多个工具箱用路径分隔符（macOS/Linux 为 :）分隔，
+    每项可写成 名称=路径，未命名时使用目录名；第一个为默认工具箱
+    """
+    toolboxes = {}
+    for item in filter(None, (part.strip() for part in value.split(os.pathsep))):
+        name, sep, path = item.partition('=')
+        if not sep:
+            name, path = '', item
+        path = Path(path).expanduser()
+        name = name.strip() or path.name
+        unique, n = name, 2
+        while unique in toolboxes:
+            unique, n = f"{name}_{n}", n + 1
+        toolboxes[unique] = path
+    return toolboxes
+
+
+# 解析进程（spawn 的工作进程、预加载本模块的 forkserver 进程）会重新导入本模块，只在主进程中输出启动信息
+_MAIN_PROCESS = multiprocessing.parent_process() is None and 'multiprocessing.forkserver' not in sys.modules
+
+
+def startup_log(message: str):
+    """导入时的启动信息（输出到 stderr，解析进程中不输出）"""
+    if _MAIN_PROCESS:
+        print(message, file=sys.stderr)
+
+
 # 工具箱路径 - 支持环境变量配置
-NIRS_TOOLBOX_PATH = os.getenv("NIRS_TOOLBOX_PATH")
+TOOLBOX_PATHS = parse_toolbox_paths(os.getenv("NIRS_TOOLBOX_PATH", ""))
 
-if NIRS_TOOLBOX_PATH is None:
+if not TOOLBOX_PATHS:
     # 回退到默认路径（如果存在）
     default_path = Path("/Users/liam/Desktop/好用的工具/nirs-toolbox").expanduser()
     if default_path.exists():
-        NIRS_TOOLBOX_PATH = default_path
-        print(f"⚠️  使用默认路径：{NIRS_TOOLBOX_PATH}", file=sys.stderr)
+        TOOLBOX_PATHS = {default_path.name: default_path}
+        startup_log(f"⚠️  使用默认路径：{default_path}")
+    else:
+        # 不在导入时退出：服务器照常响应 initialize，工具调用时返回错误
+        startup_log(f"❌ 错误：请设置 NIRS_TOOLBOX_PATH 环境变量")
+        startup_log(f"   示例: export NIRS_TOOLBOX_PATH=/path/to/nirs-toolbox")
+        startup_log(f"   多个工具箱: export NIRS_TOOLBOX_PATH=release=/path/a{os.pathsep}lab=/path/b")
+
+for _name, _path in TOOLBOX_PATHS.items():
+    label = f"（{_name}）" if len(TOOLBOX_PATHS) > 1 else ""
+    if _path.exists():
+        startup_log(f"✅ 工具箱路径：{_path}{label}")
+    else:
+        startup_log(f"❌ 错误：工具箱路径不存在: {_path}{label}")
+
+# 默认工具箱（第一个）；未配置时为 None
+NIRS_TOOLBOX_PATH = next(iter(TOOLBOX_PATHS.values()), None)
+
+# 定义命名空间路径
+NIRS_NS = NIRS_TOOLBOX_PATH / "+nirs" if NIRS_TOOLBOX_PATH else None
+DEMOS_PATH = NIRS_TOOLBOX_PATH / "demos" if NIRS_TOOLBOX_PATH else None
+
+# 解析结果缓存容量（模块数），设为 0 关闭缓存
+PARSE_CACHE_SIZE = int(os.getenv("NIRS_MCP_PARSE_CACHE_SIZE", "128"))
+
+# 索引快照路径，默认保存在工具箱目录旁；设为 off 关闭快照
+INDEX_SNAPSHOT_PATH = os.getenv("NIRS_MCP_INDEX_PATH", "")
+
+# 文件监听：auto（默认，有 watchdog 时用 inotify 等系统通知，否则轮询）/ poll / off
+WATCH_MODE = os.getenv("NIRS_MCP_WATCH", "auto").lower()
+WATCH_INTERVAL = float(os.getenv("NIRS_MCP_WATCH_INTERVAL", "2"))
+
+# 批量解析的进程数，默认等于 CPU 核数；设为 1 时串行解析
+PARSE_WORKERS = int(os.getenv("NIRS_MCP_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# 处理请求时读取文件/解析的线程数（有界，避免并发请求耗尽文件句柄）
+IO_WORKERS = int(os.getenv("NIRS_MCP_IO_WORKERS", "8"))
+
+# 单次返回的源代码字节数上限，超出部分通过 cursor 分段读取
+SOURCE_MAX_BYTES = int(os.getenv("NIRS_MCP_SOURCE_MAX_BYTES", "16384"))
+
+# 请求统计：延迟分位数按最近 N 次调用计算；定期输出间隔（秒，0 关闭）和输出文件（留空输出到 stderr）
+STATS_WINDOW = int(os.getenv("NIRS_MCP_STATS_WINDOW", "1000"))
+STATS_INTERVAL = float(os.getenv("NIRS_MCP_STATS_INTERVAL", "0"))
+STATS_FILE = os.getenv("NIRS_MCP_STATS_FILE", "")
+
+# 守护进程：--daemon 时在本地端口（或 Unix socket，优先）提供 streamable HTTP；
+# stdio 启动时若检测到同配置的守护进程，则只做转发（NIRS_MCP_SHIM=off 关闭）
+DAEMON_HOST = os.getenv("NIRS_MCP_DAEMON_HOST", "127.0.0.1")
+DAEMON_PORT = int(os.getenv("NIRS_MCP_DAEMON_PORT", "8765"))
+DAEMON_SOCKET = os.getenv("NIRS_MCP_DAEMON_SOCKET", "")
+SHIM_MODE = os.getenv("NIRS_MCP_SHIM", "auto").lower()
+
+# 工具的默认输出格式：markdown（默认）或 json（直接由索引构建的结构化结果，不拼接 markdown）
+OUTPUT_FORMAT = os.getenv("NIRS_MCP_OUTPUT", "markdown").lower()
+
+# ==========================================
+# 2. 辅助函数
+# ==========================================
+
+# ------------------------------------------
+# 磁盘读取计数：当前请求的读取字节数和打开文件数（通过上下文变量传到线程池）
+# ------------------------------------------
+
+_IO_COUNTERS = contextvars.ContextVar('nirs_io_counters', default=None)
+_IO_COUNTERS_LOCK = threading.Lock()
+
+
+def count_io(nbytes: int, files: int = 1):
+    """记录一次文件读取（nbytes 为从磁盘读取的原始字节数）；不在请求处理中（如后台同步）时忽略"""
+    counters = _IO_COUNTERS.get()
+    if counters is not None:
+        with _IO_COUNTERS_LOCK:
+            counters['files_opened'] += files
+            counters['bytes_read'] += nbytes
+
+
+def decode_text(raw: bytes) -> str:
+    """按 UTF-8 解码并统一换行符（与文本模式读取的结果一致）；I/O 统计应使用解码前的字节数"""
+    return raw.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+
+
+# ------------------------------------------
+# MATLAB 单遍词法/语法分析
+# ------------------------------------------
+
+_LEX_SPECIAL_RE = re.compile(r"%|\.\.\.|'|\"")
+_STMT_SPLIT_RE = re.compile(r'[()\[\]{},;]')
+_IDENT_RE = re.compile(r'[A-Za-z_]\w*')
+_CLASSDEF_RE = re.compile(r'classdef\s*(?:\(([^)]*)\))?\s*(\w+)\s*(?:<\s*(.+))?$', re.S)
+_FUNCTION_RE = re.compile(r'function\s*(?:(\[[^\]]*\]|\w+)\s*=\s*)?([\w.]+)\s*(?:\((.*)\))?\s*$', re.S)
+_DECLARATION_RE = re.compile(r'(?:(\[[^\]]*\]|\w+)\s*=\s*)?([\w.]+)\s*(?:\((.*)\))?\s*$', re.S)
+
+# 以 end 结束的块关键字；properties 等只在 classdef 内部、arguments 只在 function 内部是关键字
+BLOCK_KEYWORDS = {'if', 'for', 'parfor', 'while', 'switch', 'try', 'spmd', 'function', 'classdef'}
+CLASS_BLOCK_KEYWORDS = {'properties', 'methods', 'events', 'enumeration'}
+
+# 代码中的 nirs.* 完整限定名（在屏蔽字符串后的代码上匹配，注释和字符串不计）
+_REFERENCE_RE = re.compile(r'(?<![\w.])nirs(?:\.[A-Za-z_]\w*)+')
+
+# 示例中的流水线语句：job = nirs.modules.X(job)、job.prop = value
+_PIPELINE_STEP_RE = re.compile(r'(\w+)\s*=\s*(nirs\.modules\.\w+)\s*(?:\((.*)\))?\s*$', re.S)
+_PIPELINE_OPTION_RE = re.compile(r'(\w+)\.(\w+(?:\.\w+)*)\s*=(?!=)\s*(.+)$', re.S)
+_ASSIGNMENT_RE = re.compile(r'(\w+)\s*=(?!=)')
+
+
+def scan_matlab_line(line: str) -> Tuple[str, str, str, bool]:
+    """
+    拆分一行代码，正确跳过字符串中的 % 和 ...
+    
+    Returns:
+        (代码, 字符串内容替换为空格的代码, 行尾注释, 是否以 ... 续行)
+    """
+    spans = []
+    pos = 0
+    code, comment, continued = line, '', False
+    
+    while True:
+        match = _LEX_SPECIAL_RE.search(line, pos)
+        if not match:
+            break
+        token, i = match.group(), match.start()
+        if token == '%':
+            code, comment = line[:i], line[i + 1:]
+            break
+        if token == '...':
+            code, continued = line[:i], True
+            break
+        # 紧跟在标识符、右括号、点或引号后的 ' 是转置运算符
+        if token == "'" and i > 0 and (line[i - 1].isalnum() or line[i - 1] in "_)]}.'"):
+            pos = i + 1
+            continue
+        # 字符串：成对的引号表示转义
+        j = i + 1
+        while True:
+            k = line.find(token, j)
+            if k == -1:
+                k = len(line)
+                break
+            if line[k + 1:k + 2] == token:
+                j = k + 2
+                continue
+            break
+        spans.append((i + 1, k))
+        pos = k + 1
+    
+    masked = code
+    for start, end in spans:
+        if start < len(code):
+            end = min(end, len(code))
+            masked = masked[:start] + ' ' * (end - start) + masked[end:]
+    
+    return code, masked, comment.strip(), continued
+
+
+def bracket_stack(masked: str, stack: List[str]) -> List[str]:
+    """更新未闭合括号栈（输入为屏蔽字符串后的代码），返回新的栈"""
+    stack = list(stack)
+    for ch in masked:
+        if ch in '([{':
+            stack.append(ch)
+        elif ch in ')]}' and stack:
+            stack.pop()
+    return stack
+
+
+def lex_matlab(content: str):
+    """
+    单遍扫描 MATLAB 源码，按逻辑行产生事件（续行已合并）
+    
+    ... 续行和未闭合的 ( [ { 都会与下一行合并；[ ] 和 { } 内的换行等同于 ;（矩阵换行）。
+    
+    事件为 (类型, 行号, 数据)：
+    - ('comment', 行号, 注释文本)：整行注释，包括 %{ ... %} 块注释中的行
+    - ('blank', 行号, None)：空行
+    - ('code', 起始行号, (代码, 屏蔽字符串后的代码, 行尾注释, 结束行号))
+    """
+    block_depth = 0
+    pending = None  # 续行中的 [代码, 屏蔽代码, 起始行号]
+    brackets = []   # pending 中未闭合的括号
+    
+    for lineno, line in enumerate(content.split('\n')):
+        stripped = line.strip()
+        
+        # 块注释（%{ 和 %} 必须单独成行，可嵌套）
+        if stripped == '%{':
+            block_depth += 1
+            continue
+        if block_depth:
+            if stripped == '%}':
+                block_depth -= 1
+            else:
+                yield ('comment', lineno, stripped)
+            continue
+        
+        if not stripped:
+            if pending is None:
+                yield ('blank', lineno, None)
+            continue
+        if stripped.startswith('%'):
+            if not brackets:
+                yield ('comment', lineno, stripped.lstrip('%').strip())
+            continue
+        
+        # 括号未闭合（语法错误）时不跨越函数定义和块结束
+        if brackets and (stripped == 'end' or re.match(r'function\b', stripped)):
+            yield ('code', pending[2], (pending[0], pending[1], '', lineno - 1))
+            pending, brackets = None, []
+        
+        code, masked, comment, continued = scan_matlab_line(line)
+        if pending is not None:
+            # 矩阵和元胞数组内的换行是行分隔符
+            sep = '; ' if brackets and brackets[-1] in '[{' and pending[1][-1] not in '[{,;' else ' '
+            code = pending[0] + sep + code.strip()
+            masked = pending[1] + sep + masked.strip()
+            start = pending[2]
+        else:
+            code, masked, start = code.strip(), masked.strip(), lineno
+        
+        brackets = bracket_stack(masked[len(pending[1]):] if pending is not None else masked, brackets)
+        if continued or brackets:
+            pending = [code, masked, start]
+            continue
+        pending = None
+        yield ('code', start, (code, masked, comment, lineno))
+    
+    if pending is not None:
+        yield ('code', pending[2], (pending[0], pending[1], '', pending[2]))
+
+
+def split_statements(code: str, masked: str) -> List[Tuple[str, str]]:
+    """按括号外的 , 和 ; 拆分一行中的多条语句"""
+    statements = []
+    depth = 0
+    start = 0
+    for match in _STMT_SPLIT_RE.finditer(masked):
+        ch = match.group()
+        if ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            statements.append((code[start:match.start()], masked[start:match.start()]))
+            start = match.end()
+    statements.append((code[start:], masked[start:]))
+    return [(c.strip(), m.strip()) for c, m in statements if m.strip()]
+
+
+def parse_property_statement(code: str, masked: str, comment: str) -> Dict:
+    """解析 properties 块中的一条属性声明：名称、校验、默认值和注释"""
+    eq = -1
+    depth = 0
+    for i, ch in enumerate(masked):
+        if ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth -= 1
+        elif ch == '=' and depth == 0 and masked[i - 1:i] not in ('=', '<', '>', '~') \
+                and masked[i + 1:i + 2] != '=':
+            eq = i
+            break
+    
+    left = code[:eq] if eq >= 0 else code
+    name_match = _IDENT_RE.match(left.strip())
+    name = name_match.group() if name_match else left.strip()
+    
+    return {
+        'name': name,
+        'validation': left.strip()[len(name):].strip(),
+        'default': code[eq + 1:].strip() if eq >= 0 else '',
+        'comment': comment,
+    }
+
+
+def parse_signature(match) -> Dict:
+    """从函数/方法声明的匹配结果中提取名称、返回值和参数"""
+    return {
+        'name': match.group(2),
+        'returns': (match.group(1) or '').strip(),
+        'params': (match.group(3) or '').strip(),
+    }
+
+
+def collect_references(references: Dict[str, List[int]], masked: str, lineno: int):
+    """记录一段代码中引用的 nirs.* 限定名及所在行号（1 起始）"""
+    if 'nirs.' not in masked:
+        return
+    for symbol in _REFERENCE_RE.findall(masked):
+        lines = references.setdefault(symbol, [])
+        if not lines or lines[-1] != lineno + 1:
+            lines.append(lineno + 1)
+
+
+def extract_references(content: str) -> Dict[str, List[int]]:
+    """提取脚本（如 demos）代码中引用的 nirs.* 限定名 -> 行号列表"""
+    references = {}
+    for kind, lineno, data in lex_matlab(content):
+        if kind == 'code':
+            collect_references(references, data[1], lineno)
+    return references
+
+
+def extract_workflows(content: str) -> List[Dict]:
+    """
+    从示例脚本中提取流水线：以 job = nirs.modules.X() 开始，
+    后续 job = nirs.modules.Y(job) 依次串联，job.prop = value 记为上一步的参数设置。
+    
+    Returns:
+        [{'line': 起始行号, 'steps': [{'module': 限定名, 'line': 行号, 'options': [语句]}]}]，
+        只保留至少两步的流水线
+    """
+    finished = []
+    open_chains = {}  # 变量名 -> 正在串联的流水线
+    
+    for kind, lineno, data in lex_matlab(content):
+        if kind != 'code':
+            continue
+        for stmt_code, stmt_masked in split_statements(data[0], data[1]):
+            stmt_code = stmt_code.strip()
+            step = _PIPELINE_STEP_RE.match(stmt_code)
+            if step:
+                var, module, arg = step.group(1), step.group(2), (step.group(3) or '').strip()
+                chain = open_chains.get(var)
+                if chain is None or arg != var:
+                    if chain is not None:
+                        finished.append(chain)
+                    chain = open_chains[var] = {'line': lineno + 1, 'steps': []}
+                chain['steps'].append({'module': module, 'line': lineno + 1, 'options': []})
+                continue
+            
+            option = _PIPELINE_OPTION_RE.match(stmt_code)
+            if option and option.group(1) in open_chains:
+                open_chains[option.group(1)]['steps'][-1]['options'].append(stmt_code.rstrip(';'))
+                continue
+            
+            # 变量被赋成其他值时流水线结束
+            assignment = _ASSIGNMENT_RE.match(stmt_masked.strip())
+            if assignment and assignment.group(1) in open_chains:
+                finished.append(open_chains.pop(assignment.group(1)))
+    
+    finished.extend(open_chains.values())
+    return sorted((chain for chain in finished if len(chain['steps']) >= 2), key=lambda c: c['line'])
+
+
+def parse_matlab_source(content: str) -> Dict:
+    """
+    单遍解析 MATLAB 源码结构
+    
+    维护块关键字栈以正确匹配嵌套的 end，识别带属性的 properties/methods 块、
+    块注释和续行，一次性提取类定义、全部属性、方法签名和帮助注释，
+    并记录每个函数、代码块和帮助注释的起止行号（0 起始）。
+    """
+    lines = content.split('\n')
+    result = {
+        'classdef': None,
+        'functions': [],      # 文件中的所有函数（含方法），带所在块的属性
+        'properties': [],
+        'blocks': [],         # properties/methods/events/enumeration 块
+        'leading_comments': [],
+        'leading_span': None,
+        'references': {},     # nirs.* 限定名 -> 行号列表
+    }
+    
+    stack = []             # [(关键字, 块属性, 需要记录结束行的节点)]
+    help_owner = None      # 正在收集帮助注释的类或函数
+    help_started = False
+    prop_comments = []     # 属性声明前的注释
+    seen_code = False
+    
+    def start_help(owner: Dict, key: str):
+        nonlocal help_owner, help_started
+        help_owner, help_started = (owner, key), False
+    
+    for kind, lineno, data in lex_matlab(content):
+        if kind == 'comment':
+            if help_owner is not None:
+                owner, key = help_owner
+                owner[key].append(data)
+                span = owner['help_span']
+                owner['help_span'] = (span[0] if span else lineno, lineno)
+                help_started = True
+            elif not seen_code:
+                result['leading_comments'].append(data)
+                span = result['leading_span']
+                result['leading_span'] = (span[0] if span else lineno, lineno)
+            elif stack and stack[-1][0] == 'properties':
+                prop_comments.append(data)
+            continue
+        
+        if kind == 'blank':
+            if help_started:
+                help_owner = None
+            prop_comments = []
+            continue
+        
+        seen_code = True
+        help_owner = None
+        code, masked, comment, end_lineno = data
+        collect_references(result['references'], masked, lineno)
+        
+        for stmt_code, stmt_masked in split_statements(code, masked):
+            word_match = _IDENT_RE.match(stmt_masked)
+            word = word_match.group() if word_match else ''
+            # obj.end 之类的字段访问不是关键字
+            if word and stmt_masked[len(word):len(word) + 1] == '.':
+                word = ''
+            top = stack[-1][0] if stack else None
+            
+            if word == 'end':
+                if stack:
+                    node = stack.pop()[2]
+                    if node is not None:
+                        node['end_line'] = end_lineno
+                prop_comments = []
+                continue
+            
+            if word == 'classdef':
+                class_match = _CLASSDEF_RE.match(stmt_code)
+                node = None
+                if class_match and result['classdef'] is None:
+                    parents = class_match.group(3) or ''
+                    node = result['classdef'] = {
+                        'name': class_match.group(2),
+                        'attributes': (class_match.group(1) or '').strip(),
+                        'parents': [p.strip() for p in parents.split('&') if p.strip()],
+                        'help': [],
+                        'help_span': None,
+                        'line': lineno,
+                        'end_line': None,
+                    }
+                    start_help(node, 'help')
+                stack.append(('classdef', '', node))
+                continue
+            
+            if word in CLASS_BLOCK_KEYWORDS and top == 'classdef':
+                attrs = stmt_code[len(word):].strip()
+                if attrs.startswith('(') and attrs.endswith(')'):
+                    attrs = attrs[1:-1].strip()
+                block = {'kind': word, 'attributes': attrs, 'line': lineno, 'end_line': None}
+                result['blocks'].append(block)
+                stack.append((word, attrs, block))
+                prop_comments = []
+                continue
+            
+            if word == 'function':
+                func_match = _FUNCTION_RE.match(stmt_code)
+                func = None
+                if func_match:
+                    func = parse_signature(func_match)
+                    func.update({
+                        'comment': [],
+                        'help_span': None,
+                        'in_methods': top == 'methods',
+                        'attributes': stack[-1][1] if top == 'methods' else '',
+                        'depth': len(stack),
+                        'line': lineno,
+                        'end_line': None,
+                        'source_line': ' '.join(l.strip() for l in lines[lineno:end_lineno + 1]),
+                    })
+                    result['functions'].append(func)
+                    start_help(func, 'comment')
+                stack.append(('function', '', func))
+                continue
+            
+            if word == 'arguments' and top == 'function':
+                stack.append(('arguments', '', None))
+                continue
+            
+            if word in BLOCK_KEYWORDS:
+                stack.append((word, '', None))
+                continue
+            
+            if top == 'properties':
+                prop = parse_property_statement(stmt_code, stmt_masked, comment)
+                if not prop['comment'] and prop_comments:
+                    prop['comment'] = ' '.join(prop_comments)
+                prop['attributes'] = stack[-1][1]
+                prop['line'] = lineno
+                prop['source_line'] = ' '.join(l.strip() for l in lines[lineno:end_lineno + 1])
+                result['properties'].append(prop)
+                prop_comments = []
+            elif top == 'methods':
+                # 没有 function 关键字的方法声明（抽象方法或在单独文件中实现的方法）
+                decl_match = _DECLARATION_RE.match(stmt_code)
+                if decl_match:
+                    func = parse_signature(decl_match)
+                    func.update({
+                        'comment': [],
+                        'help_span': None,
+                        'in_methods': True,
+                        'attributes': stack[-1][1],
+                        'depth': len(stack),
+                        'line': lineno,
+                        'end_line': end_lineno,
+                        'source_line': ' '.join(l.strip() for l in lines[lineno:end_lineno + 1]),
+                    })
+                    result['functions'].append(func)
+    
+    # 没有 end 的函数（函数文件中允许省略）延伸到下一个函数之前
+    last_line = max(len(lines) - 1, 0)
+    for i, func in enumerate(result['functions']):
+        if func['end_line'] is None:
+            later = [f['line'] for f in result['functions'][i + 1:] if f['line'] > func['line']]
+            func['end_line'] = later[0] - 1 if later else last_line
+    
+    return result
+
+
+def line_byte_offsets(raw: bytes) -> List[int]:
+    """计算每一行起始位置的字节偏移"""
+    offsets = [0]
+    pos = raw.find(b'\n')
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = raw.find(b'\n', pos + 1)
+    return offsets
+
+
+def build_sections(parsed: Dict, offsets: List[int], total_bytes: int) -> Dict[str, Dict]:
+    """
+    将解析出的行范围转换为可直接 seek 的字节区间
+    
+    分段包括：帮助注释（help）、properties 等代码块（properties、properties_2 ...）、
+    每个函数/方法（按名称）。
+    """
+    def span(kind: str, first: int, last: int) -> Dict:
+        last = min(last, len(offsets) - 1)
+        end = offsets[last + 1] if last + 1 < len(offsets) else total_bytes
+        return {'kind': kind, 'start_line': first + 1, 'end_line': last + 1,
+                'start': offsets[first], 'end': end}
+    
+    sections = {}
+    classdef = parsed['classdef']
+    main_help = classdef['help_span'] if classdef else None
+    if not main_help and parsed['functions'] and not classdef:
+        main_help = parsed['functions'][0]['help_span']
+    main_help = main_help or parsed['leading_span']
+    if main_help:
+        sections['help'] = span('help', *main_help)
+    
+    counts = {}
+    for block in parsed['blocks']:
+        if block['kind'] == 'methods' or block['end_line'] is None:
+            continue
+        counts[block['kind']] = counts.get(block['kind'], 0) + 1
+        name = block['kind'] if counts[block['kind']] == 1 else f"{block['kind']}_{counts[block['kind']]}"
+        sections[name] = span(block['kind'], block['line'], block['end_line'])
+    
+    for func in parsed['functions']:
+        if func['name'] not in sections:
+            sections[func['name']] = span('method' if func['in_methods'] else 'function',
+                                          func['line'], func['end_line'])
+    
+    return sections
+
+
+def read_matlab_file(filepath: Path, raw: bytes = None) -> Tuple[str, List[int], int, str]:
+    """读取源文件，返回 (文本, 每行起始字节偏移, 总字节数, 内容哈希)；raw 为已读取的文件内容时不再读取"""
+    if raw is None:
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        count_io(len(raw))
+    digest = hashlib.sha1(raw).hexdigest()
+    return raw.decode('utf-8', errors='ignore'), line_byte_offsets(raw), len(raw), digest
+
+
+def load_matlab_source(filepath: Path, raw: bytes = None) -> Tuple[str, List[int], int, str, Dict]:
+    """读取并解析源文件，返回 (文本, 每行起始字节偏移, 总字节数, 内容哈希, 解析结果)"""
+    content, offsets, total_bytes, digest = read_matlab_file(filepath, raw)
+    return content, offsets, total_bytes, digest, parse_matlab_source(content)
+
+
+def parse_matlab_file(filepath: Path, raw: bytes = None) -> Dict:
+    """解析模块文件：类型以完整解析结果为准（有 classdef 即为类），不依赖文件头部的判断"""
+    source = load_matlab_source(filepath, raw)
+    if source[4]['classdef']:
+        return parse_matlab_class(filepath, source)
+    return parse_matlab_function(filepath, source)
+
+
+def parse_matlab_class(filepath: Path, source: Tuple = None) -> Dict:
+    """解析MATLAB类文件 - 单遍解析，支持多个带属性的 properties/methods 块；source 为已读取的 load_matlab_source 结果"""
+    content, offsets, total_bytes, digest, parsed = source or load_matlab_source(filepath)
+    
+    info = {
+        'name': filepath.stem,
+        'type': 'class',
+        'description': '',
+        'properties': [],
+        'properties_detailed': [],  # 详细属性信息
+        'methods': [],
+        'methods_detailed': [],  # 详细方法信息
+        'parent_class': '',
+        'parent_classes': [],
+        'sections': {},  # 分段名 -> 字节区间
+        'references': {},  # 代码中引用的 nirs.* 限定名 -> 行号
+        'sha': digest,  # 内容哈希，多工具箱时用于去重
+        'full_code': content,
+        'file_path': str(filepath)
+    }
+    
+    info['sections'] = build_sections(parsed, offsets, total_bytes)
+    info['references'] = parsed['references']
+    
+    classdef = parsed['classdef']
+    if classdef:
+        info['name'] = classdef['name']
+        info['parent_classes'] = classdef['parents']
+        if classdef['parents']:
+            info['parent_class'] = classdef['parents'][0]
+        # 类注释：classdef 之后的注释块，没有时使用文件开头的注释
+        help_lines = classdef['help'] or parsed['leading_comments']
+        info['description'] = '\n'.join(help_lines)
+    
+    for prop in parsed['properties']:
+        info['properties'].append(prop['source_line'])
+        info['properties_detailed'].append({
+            'name': prop['name'],
+            'default': prop['default'],
+            'comment': prop['comment'],
+            'validation': prop['validation'],
+            'attributes': prop['attributes'],
+        })
+    
+    # 只收录 methods 块中的方法，构造函数除外
+    for func in parsed['functions']:
+        if not func['in_methods'] or func['name'] == info['name']:
+            continue
+        info['methods'].append(func['name'])
+        info['methods_detailed'].append({
+            'name': func['name'],
+            'returns': func['returns'],
+            'params': func['params'],
+            'comment': '\n'.join(func['comment']),
+            'attributes': func['attributes'],
+        })
+    
+    return info
+
+
+def parse_matlab_function(filepath: Path, source: Tuple = None) -> Dict:
+    """解析MATLAB函数文件；source 为已读取的 load_matlab_source 结果"""
+    content, offsets, total_bytes, digest, parsed = source or load_matlab_source(filepath)
+    
+    info = {
+        'name': filepath.stem,
+        'type': 'function',
+        'description': '',
+        'signature': '',
+        'sections': {},  # 分段名 -> 字节区间
+        'references': {},  # 代码中引用的 nirs.* 限定名 -> 行号
+        'sha': digest,  # 内容哈希，多工具箱时用于去重
+        'full_code': content
+    }
+    
+    info['sections'] = build_sections(parsed, offsets, total_bytes)
+    info['references'] = parsed['references']
+    
+    # 主函数签名和紧随其后的帮助注释；没有时使用文件开头的注释
+    if parsed['functions']:
+        main = parsed['functions'][0]
+        info['signature'] = main['source_line']
+        info['description'] = '\n'.join(main['comment'] or parsed['leading_comments'])
     else:
-        print(f"❌ 错误：请设置 NIRS_TOOLBOX_PATH 环境变量", file=sys.stderr)
-        print(f"   示例: export NIRS_TOOLBOX_PATH=/path/to/nirs-toolbox", file=sys.stderr)
-        sys.exit(1)
-else:
-    NIRS_TOOLBOX_PATH = Path(NIRS_TOOLBOX_PATH).expanduser()
+        info['description'] = '\n'.join(parsed['leading_comments'])
+    
+    return info
+
+
+# 解析结果 LRU 缓存：(内容哈希, 文件名) -> 解析结果；多个工具箱中内容相同的文件共用一份
+_PARSE_CACHE = OrderedDict()
+# 索引之后被修改过的文件：(路径, 修改时间, 大小) -> 内容哈希，避免每次查询都重新读取计算哈希
+_CHANGED_FILE_SHA = OrderedDict()
+_PARSE_CACHE_LOCK = threading.Lock()
+_PARSE_CACHE_STATS = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def cache_put(cache: OrderedDict, key, value) -> int:
+    """写入 LRU 表并淘汰超出容量的旧项，返回淘汰数（调用方持有 _PARSE_CACHE_LOCK）"""
+    cache[key] = value
+    evicted = 0
+    while len(cache) > PARSE_CACHE_SIZE:
+        cache.popitem(last=False)
+        evicted += 1
+    return evicted
+
+
+def load_module_info(record: Dict, stat: os.stat_result = None) -> Dict:
+    """
+    获取模块解析结果，命中缓存时跳过读文件和解析
+    
+    缓存键为 (内容哈希, 文件名)：文件当前的 stat 与索引记录一致时直接使用记录中的哈希，
+    否则（文件在索引更新前被修改）按 stat 查找此前计算过的哈希，都没有时重新解析。
+    调用方已有 stat 时可直接传入。返回的字典为共享对象，调用方不应修改。
+    """
+    path = record['path']
+    stat = stat or os.stat(path)
+    stat_key = (str(path), stat.st_mtime_ns, stat.st_size)
+    with _PARSE_CACHE_LOCK:
+        sha = record.get('sha') if is_unchanged(record, stat) else _CHANGED_FILE_SHA.get(stat_key)
+        info = _PARSE_CACHE.get((sha, path.stem)) if sha else None
+        if info is not None:
+            _PARSE_CACHE.move_to_end((sha, path.stem))
+            _PARSE_CACHE_STATS['hits'] += 1
+        else:
+            _PARSE_CACHE_STATS['misses'] += 1
+    
+    if info is None:
+        info = parse_matlab_file(path)
+        if PARSE_CACHE_SIZE > 0:
+            with _PARSE_CACHE_LOCK:
+                _PARSE_CACHE_STATS['evictions'] += cache_put(_PARSE_CACHE, (info['sha'], path.stem), info)
+                if not is_unchanged(record, stat):
+                    cache_put(_CHANGED_FILE_SHA, stat_key, info['sha'])
+    
+    # 其他工具箱中的同内容文件：解析结果共享，只替换路径
+    if info.get('file_path', str(path)) != str(path):
+        info = dict(info, file_path=str(path))
+    return info
+
+
+def parse_cache_stats() -> Dict:
+    """返回解析缓存的命中统计"""
+    with _PARSE_CACHE_LOCK:
+        stats = dict(_PARSE_CACHE_STATS)
+        stats['size'] = len(_PARSE_CACHE)
+    stats['capacity'] = PARSE_CACHE_SIZE
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+def get_namespace_files(namespace_path: Path) -> Dict[str, List[Path]]:
+    """获取命名空间下的所有文件，按子命名空间分类"""
+    categories = {}
+    if not namespace_path.is_dir():
+        return categories
+    
+    for subdir in namespace_path.iterdir():
+        if not subdir.is_dir():
+            continue
+        
+        # 跳过非命名空间目录
+        if not subdir.name.startswith('+'):
+            continue
+        
+        category_name = subdir.name[1:]  # 去掉 + 前缀
+        m_files = list(subdir.rglob('*.m'))
+        categories[category_name] = m_files
+    
+    return categories
+
+
+# ------------------------------------------
+# 源代码分段读取：按字节预算或行范围返回，附带续读 cursor
+# ------------------------------------------
+
+def make_source_cursor(stat: os.stat_result, offset: int, line: int, end_line: int = 0) -> str:
+    """生成续读 cursor：字节偏移、行号、结束行号（0 表示不限制）和文件指纹（读取时 fstat 得到的大小、修改时间）"""
+    return f"{offset}:{line}:{end_line}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def parse_source_cursor(stat: os.stat_result, cursor: str) -> Tuple[int, int, int]:
+    """解析续读 cursor，返回 (字节偏移, 行号, 结束行号)；与打开的文件的 fstat 不一致（文件已变化）时报错"""
+    parts = cursor.split(':')
+    if len(parts) != 5 or not all(p.isdigit() for p in parts):
+        raise ValueError(f"无效的 cursor: '{cursor}'")
+    offset, line, end_line, size, mtime = map(int, parts)
+    if size != stat.st_size or mtime != stat.st_mtime_ns:
+        raise ValueError("源文件已变化，请不带 cursor 重新读取")
+    return offset, line, end_line
+
+
+def read_source_chunk(record: Dict, cursor: str = '', start_line: int = 0, end_line: int = 0,
+                      max_bytes: int = SOURCE_MAX_BYTES) -> Dict:
+    """
+    分段读取模块源代码，直接 seek 到 cursor 位置，最多读取 max_bytes 字节
+    
+    尽量在行边界截断；单行超过预算时按 UTF-8 字符边界截断。
+    start_line / end_line 为 1 起始的闭区间行号，0 表示不限制；
+    带 cursor 且未指定 end_line 时沿用 cursor 中记录的结束行号。
+    
+    Raises:
+        ValueError: cursor 无效或文件已变化
+    """
+    max_bytes = max(max_bytes, 256)
+    
+    with open(record['path'], 'rb') as f:
+        stat = os.fstat(f.fileno())
+        total_bytes = stat.st_size
+        if cursor:
+            offset, line, cursor_end = parse_source_cursor(stat, cursor)
+            end_line = end_line or cursor_end
+            f.seek(offset)
+        else:
+            offset, line = 0, 1
+            while line < start_line and f.readline():
+                line += 1
+            offset = f.tell()
+        
+        first_line = line
+        chunks = []
+        used = 0
+        partial = False
+        while not (end_line and line > end_line):
+            raw = f.readline()
+            if not raw:
+                break
+            if used + len(raw) > max_bytes:
+                if not chunks:
+                    cut = max_bytes
+                    while cut > 0 and (raw[cut] & 0xC0) == 0x80:
+                        cut -= 1
+                    chunks.append(raw[:cut])
+                    used += cut
+                    partial = True
+                break
+            chunks.append(raw)
+            used += len(raw)
+            line += 1
+    
+    count_io(used if cursor else offset + used)  # 按行号定位时跳过的行也被读取
+    next_offset = offset + used
+    has_more = next_offset < total_bytes and not (end_line and line > end_line)
+    
+    return {
+        'text': b''.join(chunks).decode('utf-8', errors='ignore'),
+        'start_line': first_line,
+        'end_line': line if partial else line - 1,
+        'offset': offset,
+        'next_offset': next_offset,
+        'total_bytes': total_bytes,
+        'next_cursor': make_source_cursor(stat, next_offset, line, end_line) if has_more else '',
+    }
+
+
+def current_sections(record: Dict) -> Tuple[Dict[str, Dict], os.stat_result]:
+    """
+    返回与磁盘上文件一致的分段表和文件的 stat
+    
+    文件自索引后未变化时直接使用记录中的字节区间；否则（索引尚未同步）
+    按当前文件重新解析（走解析缓存），避免 seek 到过期的偏移。
+    """
+    stat = os.stat(record['path'])
+    if is_unchanged(record, stat):
+        return record.get('sections') or {}, stat
+    return load_module_info(record, stat)['sections'], stat
+
+
+def find_section(sections: Dict[str, Dict], section: str) -> Tuple[str, Dict]:
+    """按名称查找源码分段（先精确匹配，再忽略大小写）；未找到返回 (None, None)"""
+    if section in sections:
+        return section, sections[section]
+    lowered = section.lower()
+    for name, span in sections.items():
+        if name.lower() == lowered:
+            return name, span
+    return None, None
+
+
+def read_section_chunk(record: Dict, span: Dict, stat: os.stat_result, max_bytes: int = SOURCE_MAX_BYTES) -> Dict:
+    """
+    直接 seek 到分段起始字节读取，续读 cursor 限定在分段结束行之内
+    
+    stat 为得到分段表时文件的 stat（见 current_sections）；打开文件时已再次变化则报错。
+    
+    Raises:
+        ValueError: 文件在读取分段表之后又被修改
+    """
+    cursor = make_source_cursor(stat, span['start'], span['start_line'], span['end_line'])
+    chunk = read_source_chunk(record, cursor, max_bytes=max_bytes)
+    chunk['limit_offset'] = span['end']
+    return chunk
+
+
+def format_source_chunk(chunk: Dict, module_name: str, title: str = "源代码") -> str:
+    """格式化源代码分段，附带续读提示"""
+    output = f"## 📝 {title}（第 {chunk['start_line']}-{chunk['end_line']} 行，"
+    output += f"字节 {chunk['offset']}-{chunk['next_offset']} / {chunk['total_bytes']}）\n\n"
+    output += f"```matlab\n{chunk['text'].rstrip()}\n```\n\n"
+    if chunk['next_cursor']:
+        remaining = chunk.get('limit_offset', chunk['total_bytes']) - chunk['next_offset']
+        output += f"*还有 {remaining} 字节未显示，使用 "
+        output += f"`get_module_source(\"{module_name}\", cursor=\"{chunk['next_cursor']}\")` 继续读取*\n\n"
+    return output
+
+
+def format_module_info(info: Dict, namespace: str, source_chunk: Dict = None) -> str:
+    """格式化模块信息为markdown"""
+    output = f"# 📦 {info['name']}\n\n"
+    
+    if info['type'] == 'class':
+        output += f"**类型**: MATLAB 类\n"
+        if info['parent_class']:
+            output += f"**继承自**: `{info['parent_class']}`\n"
+        output += "\n"
+        
+        if info['description']:
+            output += f"## 📄 说明\n\n{info['description']}\n\n"
+        
+        if info['properties']:
+            output += f"## ⚙️ 属性\n\n"
+            for prop in info['properties']:
+                output += f"- `{prop}`\n"
+            output += "\n"
+        
+        if info['methods']:
+            output += f"## 🔧 方法\n\n"
+            for method in info['methods'][:10]:  # 只显示前10个
+                output += f"- `{method}()`\n"
+            if len(info['methods']) > 10:
+                output += f"- ... 还有 {len(info['methods']) - 10} 个方法\n"
+            output += "\n"
+        
+        output += f"## 💻 使用方式\n\n"
+        output += f"```matlab\n"
+        output += f"% 创建实例\n"
+        output += f"obj = nirs.{namespace}.{info['name']}();\n"
+        output += f"```\n\n"
+    
+    else:  # function
+        if info['signature']:
+            output += f"## 函数签名\n\n```matlab\n{info['signature']}\n```\n\n"
+        
+        if info['description']:
+            output += f"## 📄 说明\n\n{info['description']}\n\n"
+        
+        output += f"## 💻 使用方式\n\n"
+        output += f"```matlab\n"
+        output += f"result = nirs.{namespace}.{info['name']}(...);\n"
+        output += f"```\n\n"
+    
+    if source_chunk:
+        output += format_source_chunk(source_chunk, info['name'], "代码")
+    
+    return output
+
+
+# ==========================================
+# 3. 模块索引（启动时构建一次，所有解析器共用）
+# ==========================================
+
+def new_lookups() -> MappingProxyType:
+    """空的查找表"""
+    return MappingProxyType({
+        'modules': {},       # 相对路径 -> 模块记录
+        'by_name': {},       # 模块名 -> [相对路径]
+        'by_category': {},   # 类别名 -> [相对路径]
+        'by_lower': {},      # 小写模块名 -> [模块名]
+        'name_trigrams': {}, # 三元组 -> [模块名]
+        'demos': {},         # 示例名 -> 示例记录
+        'graph': {'by_qualified': {}, 'parents': {}, 'children': {}},  # 继承关系图
+        'references': {},    # nirs.* 限定名（及其前缀）-> 引用位置
+        'workflows': {'entries': [], 'postings': {}, 'vocab': []},  # 从示例中提取的工作流目录
+    })
+
+
+def new_index(toolbox_path: Path, name: str = None, store: Dict = None) -> Dict:
+    """创建空的模块索引；store 为多个工具箱共享的内容去重表（单工具箱时为 None）"""
+    return {
+        'name': name or toolbox_path.name,
+        'root': toolbox_path,
+        'ns': toolbox_path / "+nirs",
+        'demos_path': toolbox_path / "demos",
+        'lookups': new_lookups(),  # 模块表、示例表及其派生查找表（只读，整体替换）
+        'search': new_search_index(),
+        'related': None,     # (所依据的查找表, 相对路径 -> 相关模块 top-k)，查找表被替换后重建
+        'store': store,
+        'file_names': None,  # 后台构建期间直接扫描用的文件名表
+        'built': False,
+        'building': False,   # 后台构建进行中：查询不等待，使用已发布的部分结果或直接扫描
+        'lock': threading.RLock(),       # 倒排索引和查找表的读写锁
+        'sync_lock': threading.RLock(),  # 串行化索引写入方（构建、同步、文件监听）
+    }
+
+
+HEADER_MAX_BYTES = 4096  # 文件头部最多读取的字节数
+
+
+def read_header(filepath: Path, max_bytes: int = HEADER_MAX_BYTES) -> List[str]:
+    """
+    读取文件头部：只读前 max_bytes 字节，截止到声明（第一行代码）之后的下一行代码
+    
+    包含文件开头的注释和空行、声明本身以及紧随其后的帮助注释，
+    用于列表和类型判断，避免为了一行简介读取整个文件。
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read(max_bytes)
+    count_io(len(data))
+    
+    lines = data.decode('utf-8', errors='ignore').split('\n')
+    if len(data) == max_bytes and len(lines) > 1:
+        lines.pop()  # 最后一行可能被截断
+    return header_lines(lines)
+
+
+def header_lines(lines: List[str]) -> List[str]:
+    """从源码行中截取文件头部：开头的注释和空行、声明以及其后的帮助注释，截止到下一行代码"""
+    header = []
+    seen_code = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped and not stripped.startswith('%'):
+            if seen_code:
+                break
+            seen_code = True
+        header.append(line.rstrip('\r'))
+    return header
+
+
+def summarize_header(header: List[str]) -> Tuple[str, str]:
+    """从文件头部判断类型（class/function/script）并提取第一行非空注释作为简介"""
+    kind = 'script'
+    summary = ''
+    for line in header:
+        stripped = line.strip()
+        if stripped.startswith('%'):
+            text = stripped.lstrip('%').strip()
+            if not summary and text not in ('', '{', '}'):
+                summary = text
+        elif stripped and kind == 'script':
+            if stripped.startswith('classdef'):
+                kind = 'class'
+            elif stripped.startswith('function'):
+                kind = 'function'
+    return kind, summary
+
+
+def qualified_name(mfile: Path, namespace_path: Path) -> str:
+    """由文件路径得到完整包名，如 +nirs/+modules/AR_IRLS.m -> nirs.modules.AR_IRLS"""
+    parts = [namespace_path.name] + list(mfile.relative_to(namespace_path).with_suffix('').parts)
+    return '.'.join(part.lstrip('+@') for part in parts)
+
+
+def module_location(mfile: Path, category: str, namespace_path: Path) -> Dict:
+    """索引记录中与文件位置相关的部分：名称、类别、路径、修改时间、大小"""
+    stat = mfile.stat()
+    return {
+        'name': mfile.stem,
+        'category': category,
+        'path': mfile,
+        'rel': mfile.relative_to(namespace_path).as_posix(),
+        'qualified': qualified_name(mfile, namespace_path),
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+    }
+
+
+def scan_module_file(mfile: Path, category: str, namespace_path: Path) -> Dict:
+    """生成单个模块的索引记录：名称、类别、路径、类型、简介、修改时间（只读文件头部）"""
+    record = module_location(mfile, category, namespace_path)
+    kind, summary = summarize_header(read_header(mfile))
+    record['kind'] = 'class' if kind == 'class' else 'function'
+    record['summary'] = summary
+    return record
+
+
+def scan_demo_file(demo_file: Path) -> Dict:
+    """生成单个示例脚本的索引记录：文件只读取一次，简介取自头部，另提取代码中的 nirs.* 引用"""
+    stat = demo_file.stat()
+    with open(demo_file, 'rb') as f:
+        raw = f.read()
+    count_io(len(raw))
+    content = decode_text(raw)
+    _, summary = summarize_header(header_lines(content.split('\n')))
+    return {
+        'name': demo_file.stem,
+        'path': demo_file,
+        'summary': summary,
+        'references': extract_references(content),
+        'workflows': extract_workflows(content),
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+    }
+
+
+# ------------------------------------------
+# 批量解析：多进程分块解析，结果合并进索引
+# ------------------------------------------
+
+PARSE_CHUNK_SIZE = 32     # 每个任务块的文件数
+PARALLEL_MIN_FILES = 64   # 文件数少于该值时进程池启动开销不划算，直接串行
+
+
+def analyze_module_file(mfile: Path, category: str, namespace_path: Path, raw: bytes = None) -> Tuple[Dict, Dict]:
+    """
+    解析单个模块文件，返回 (索引记录, 倒排索引字段)
+    
+    文件只读取一次，简介取自已读取的源码头部；raw 为调用方已读取的文件内容时不再读取。
+    """
+    record = module_location(mfile, category, namespace_path)
+    info = parse_matlab_file(mfile, raw)
+    # 类型以完整解析结果为准
+    record['kind'] = info['type']
+    _, record['summary'] = summarize_header(header_lines(info['full_code'].split('\n')))
+    record['sections'] = info['sections']
+    # 继承关系和成员名，供继承图查询使用，无需再次解析
+    record['parents'] = info.get('parent_classes', [])
+    record['property_names'] = [prop['name'] for prop in info.get('properties_detailed', [])]
+    record['method_names'] = list(info.get('methods', []))
+    record['references'] = info['references']
+    record['sha'] = info['sha']
+    
+    return record, module_document_fields(info)
+
+
+def _analyze_module_chunk(jobs: List[Tuple[Path, str, Path]]) -> List[Tuple[Dict, Dict]]:
+    """解析一组文件（进程池任务）；任务为 (文件, 类别, 命名空间路径[, 已读取的内容])，解析期间被删除的文件跳过"""
+    results = []
+    for job in jobs:
+        try:
+            results.append(analyze_module_file(*job))
+        except FileNotFoundError:
+            continue
+    return results
+
+
+def parse_pool_context():
+    """
+    进程池的启动方式：优先 forkserver，不支持时用 spawn
+    
+    解析时服务器已有 I/O 线程池、文件监听等线程，fork 会把其他线程持有的锁一并复制到子进程，
+    可能导致子进程死锁；forkserver / spawn 从干净的进程启动工作进程。
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if 'forkserver' not in methods:
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+def bulk_analyze_modules(jobs: List[Tuple[Path, str, Path]], workers: int = PARSE_WORKERS) -> List[Tuple[Dict, Dict]]:
+    """
+    批量解析模块文件：按块分发到进程池并行解析
+    
+    进程数不大于 1、文件较少或当前环境无法创建进程池时串行解析。
+    """
+    if workers <= 1 or len(jobs) < PARALLEL_MIN_FILES:
+        return _analyze_module_chunk(jobs)
+    
+    chunks = [jobs[i:i + PARSE_CHUNK_SIZE] for i in range(0, len(jobs), PARSE_CHUNK_SIZE)]
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=parse_pool_context()) as pool:
+            results = []
+            for chunk_results in pool.map(_analyze_module_chunk, chunks):
+                results.extend(chunk_results)
+            return results
+    except (OSError, NotImplementedError, BrokenProcessPool) as e:
+        print(f"⚠️  无法使用进程池并行解析，改为串行：{e}", file=sys.stderr)
+        return _analyze_module_chunk(jobs)
+
+
+# ------------------------------------------
+# 多工具箱去重：内容相同的文件只解析一次，记录中的解析结果在工具箱之间共享
+# ------------------------------------------
+
+# 只取决于文件内容的记录字段
+CONTENT_RECORD_KEYS = ('kind', 'summary', 'sections', 'parents', 'property_names',
+                       'method_names', 'references', 'sha')
+
+
+def read_file_bytes(filepath: Path) -> bytes:
+    """读取文件的全部字节"""
+    with open(filepath, 'rb') as f:
+        raw = f.read()
+    count_io(len(raw))
+    return raw
+
+
+def share_record_content(store: Dict, record: Dict, fields: Dict = None) -> Dict:
+    """
+    将记录中只取决于内容的字段登记到共享表，并替换为共享表中的同一批对象
+    
+    共享表：{内容哈希: (内容字段, 倒排索引字段或 None)}；从快照加载的记录没有倒排索引字段。
+    """
+    entry = store.get(record['sha'])
+    if entry is None or (entry[1] is None and fields is not None):
+        entry = store[record['sha']] = ({key: record[key] for key in CONTENT_RECORD_KEYS}, fields)
+    record.update(entry[0])
+    return entry[0]
+
+
+def prune_content_store(index: Dict, old_modules: Dict[str, Dict]):
+    """
+    同步后清理共享表：本工具箱中被修改或删除的文件的旧内容哈希，
+    如果已不被任何共享同一张表的工具箱引用，则从共享表中删除
+    """
+    store = index['store']
+    if store is None:
+        return
+    stale = {record.get('sha') for record in old_modules.values()}
+    stale -= {record.get('sha') for record in index['lookups']['modules'].values()}
+    if not stale:
+        return
+    for other in TOOLBOXES.values():
+        if other is not index and other['store'] is store:
+            stale -= {record.get('sha') for record in other['lookups']['modules'].values()}
+    for sha in stale:
+        store.pop(sha, None)
+
+
+def analyze_jobs(index: Dict, jobs: List[Tuple[Path, str, Path]]) -> List[Tuple[Dict, Dict]]:
+    """
+    解析新增或修改的文件
+    
+    只有一个工具箱时直接批量解析；多个工具箱时先按内容哈希查共享表，
+    其他工具箱已解析过的相同文件直接复用，只解析其余文件；
+    计算哈希时读取的内容随任务传给解析，每个文件只读取一次。
+    """
+    store = index['store']
+    if store is None:
+        return bulk_analyze_modules(jobs)
+    
+    results = []
+    pending = []
+    for job in jobs:
+        try:
+            raw = read_file_bytes(job[0])
+            entry = store.get(hashlib.sha1(raw).hexdigest())
+            if entry is None or entry[1] is None:
+                pending.append(tuple(job) + (raw,))
+                continue
+            record = module_location(*job)
+        except FileNotFoundError:
+            continue
+        record.update(entry[0])
+        results.append((record, entry[1]))
+    
+    for record, fields in bulk_analyze_modules(pending):
+        share_record_content(store, record, fields)
+        results.append((record, fields))
+    
+    return results
+
+
+def is_unchanged(record: Dict, stat: os.stat_result) -> bool:
+    """按修改时间和大小判断文件自索引后是否未变化"""
+    return record is not None and record['mtime'] == stat.st_mtime and record['size'] == stat.st_size
+
+
+def sync_index(index: Dict, categories=None) -> Dict[str, int]:
+    """
+    将索引与磁盘同步：只解析新增或修改过的文件，删除已移除的文件
+    
+    文件是否变化按 (修改时间, 大小) 判断，未变化的文件只需一次 stat。
+    遍历目录、stat 和解析都不持有索引锁（查询照常进行），只在写入倒排索引和
+    替换查找表时短暂加锁；多个写入方（后台构建、文件监听）由 sync_lock 串行。
+    categories 不为空时只同步这些类别（其余类别和示例保持不变），用于分阶段构建。
+    返回新增、更新、删除、未变化的文件数。
+    """
+    changes = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    
+    with index['sync_lock']:
+        lookups = index['lookups']
+        old_modules = lookups['modules']
+        modules = {}
+        jobs = []
+        if categories is not None:
+            modules = {rel: record for rel, record in old_modules.items() if record['category'] not in categories}
+        
+        for cat_name, files in get_namespace_files(index['ns']).items():
+            if categories is not None and cat_name not in categories:
+                continue
+            for mfile in files:
+                rel = mfile.relative_to(index['ns']).as_posix()
+                old = old_modules.get(rel)
+                if is_unchanged(old, mfile.stat()):
+                    modules[rel] = old
+                    changes['unchanged'] += 1
+                else:
+                    jobs.append((mfile, cat_name, index['ns']))
+        
+        # 只有新增或修改的文件需要解析
+        analyzed = analyze_jobs(index, jobs)
+        
+        old_demos = lookups['demos']
+        demos = {} if categories is None else old_demos
+        if categories is None and index['demos_path'].exists():
+            for demo_file in sorted(index['demos_path'].glob('*.m')):
+                old = old_demos.get(demo_file.stem)
+                if is_unchanged(old, demo_file.stat()):
+                    demos[demo_file.stem] = old
+                    changes['unchanged'] += 1
+                else:
+                    demos[demo_file.stem] = scan_demo_file(demo_file)
+                    changes['updated' if old else 'added'] += 1
+        changes['removed'] += len(old_demos.keys() - demos.keys())
+        
+        with index['lock']:
+            search = index['search']
+            for record, fields in analyzed:
+                add_document(search, record['rel'], fields)
+                modules[record['rel']] = record
+                changes['updated' if record['rel'] in old_modules else 'added'] += 1
+            
+            for rel in old_modules.keys() - modules.keys():
+                remove_document(search, rel)
+                changes['removed'] += 1
+            
+            update_lookups(index, modules, demos)
+        prune_content_store(index, old_modules)
+    
+    return changes
+
+
+def update_lookups(index: Dict, modules: Dict[str, Dict], demos: Dict[str, Dict]):
+    """
+    替换模块表和示例表，重建按名称、按类别的查找表、继承关系图、引用索引和工作流目录
+    
+    所有表建好后组成一个只读对象，以一次赋值替换 index['lookups']：读取方每次调用只取一次，
+    各表总是彼此一致，不需要加锁。与上一版相比只有少数文件变化时（文件监听事件），
+    不受影响的表直接沿用，引用索引按变化的文件增量更新。
+    """
+    old = index['lookups']
+    old_modules, old_demos = old['modules'], old['demos']
+    changed = [rel for rel in modules.keys() | old_modules.keys() if modules.get(rel) is not old_modules.get(rel)]
+    changed_demos = [name for name in demos.keys() | old_demos.keys() if demos.get(name) is not old_demos.get(name)]
+    
+    # 模块名、类别和完整包名都由相对路径决定：路径集合不变时名称查找表直接沿用
+    same_paths = modules.keys() == old_modules.keys()
+    if same_paths:
+        by_name, by_category, by_lower, trigrams = (old['by_name'], old['by_category'],
+                                                    old['by_lower'], old['name_trigrams'])
+    else:
+        # 浅层路径优先，保证同名模块的解析结果稳定
+        by_name = {}
+        by_category = {}
+        for rel in sorted(modules, key=lambda r: (r.count('/'), r)):
+            record = modules[rel]
+            by_name.setdefault(record['name'], []).append(rel)
+            by_category.setdefault(record['category'], []).append(rel)
+        by_lower = {}
+        for name in by_name:
+            by_lower.setdefault(name.lower(), []).append(name)
+        trigrams = build_name_trigrams(by_name)
+    
+    if same_paths and all(modules[rel].get('parents') == old_modules[rel].get('parents') for rel in changed):
+        graph = old['graph']
+    else:
+        graph = build_inheritance_graph(modules, by_name)
+    
+    sources = [('module', rel, old_modules.get(rel), modules.get(rel)) for rel in changed]
+    sources += [('demo', name, old_demos.get(name), demos.get(name)) for name in changed_demos]
+    if len(sources) * 4 <= len(modules) + len(demos):
+        references = update_reference_index(old['references'], sources)
+    else:
+        references = build_reference_index(modules, demos)
+    
+    # 工作流目录取决于示例、步骤模块的简介和完整包名
+    if same_paths and not changed_demos and all(
+            modules[rel].get('summary') == old_modules[rel].get('summary') for rel in changed):
+        workflows = old['workflows']
+    else:
+        workflows = build_workflow_catalog(modules, demos, graph['by_qualified'])
+    
+    index['lookups'] = MappingProxyType({
+        'modules': modules,
+        'by_name': by_name,
+        'by_category': by_category,
+        'by_lower': by_lower,
+        'name_trigrams': trigrams,
+        'demos': demos,
+        'graph': graph,
+        'references': references,
+        'workflows': workflows,
+    })
+
+
+def refresh_paths(index: Dict, paths) -> Dict[str, int]:
+    """
+    按文件路径增量更新索引（文件监听事件使用）
+    
+    只处理 +nirs 和 demos 下的 .m 文件：存在则在变化时重新解析，不存在则从索引删除。
+    与 sync_index 相同，解析时不持有索引锁。
+    """
+    changes = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    
+    with index['sync_lock']:
+        lookups = index['lookups']
+        old_modules = lookups['modules']
+        modules = dict(old_modules)
+        demos = dict(lookups['demos'])
+        removed = []
+        jobs = []
+        
+        for path in map(Path, paths):
+            if path.suffix != '.m':
+                continue
+            
+            if path.parent == index['demos_path']:
+                old = demos.get(path.stem)
+                if not path.exists():
+                    if demos.pop(path.stem, None):
+                        changes['removed'] += 1
+                elif is_unchanged(old, path.stat()):
+                    changes['unchanged'] += 1
+                else:
+                    demos[path.stem] = scan_demo_file(path)
+                    changes['updated' if old else 'added'] += 1
+                continue
+            
+            try:
+                parts = path.relative_to(index['ns']).parts
+            except ValueError:
+                continue
+            if len(parts) < 2 or not parts[0].startswith('+'):
+                continue
+            
+            rel = '/'.join(parts)
+            old = modules.get(rel)
+            if not path.exists():
+                if modules.pop(rel, None):
+                    removed.append(rel)
+                    changes['removed'] += 1
+            elif is_unchanged(old, path.stat()):
+                changes['unchanged'] += 1
+            else:
+                jobs.append((path, parts[0][1:], index['ns']))
+        
+        analyzed = analyze_jobs(index, jobs)
+        
+        with index['lock']:
+            search = index['search']
+            for rel in removed:
+                remove_document(search, rel)
+            for record, fields in analyzed:
+                add_document(search, record['rel'], fields)
+                changes['updated' if record['rel'] in modules else 'added'] += 1
+                modules[record['rel']] = record
+            
+            update_lookups(index, modules, demos)
+        prune_content_store(index, old_modules)
+    
+    return changes
+
+
+# 分阶段构建时优先解析的类别（最常查询的命名空间）
+HOT_CATEGORIES = ('modules', 'core', 'io')
+
+
+def load_index(index: Dict, staged: bool = False) -> Dict[str, int]:
+    """
+    启动时加载索引：先读取磁盘快照，再按修改时间增量校验，有变化时写回快照
+    
+    staged=True（后台构建）时每个阶段完成后立即发布查找表：快照内容先可用；
+    没有快照时先解析 HOT_CATEGORIES，其余类别和示例随后补齐。
+    """
+    loaded = load_index_snapshot(index)
+    
+    first = sync_index(index, HOT_CATEGORIES) if staged and not loaded else None
+    changes = sync_index(index)
+    if first:
+        changes = {key: n + first[key] for key, n in changes.items()}
+        changes['unchanged'] -= first['added'] + first['updated'] + first['unchanged']
+    if not loaded or changes['added'] or changes['updated'] or changes['removed']:
+        save_index_snapshot(index)
+    get_related_table(index)
+    
+    index['sync_stats'] = changes
+    index['built'] = True
+    index['file_names'] = None
+    return changes
+
+
+def select_index(toolbox: str = '') -> Dict:
+    """按名称选择工具箱的索引，留空为默认工具箱"""
+    if not toolbox:
+        if INDEX is None:
+            raise ValueError("未配置工具箱：请设置 NIRS_TOOLBOX_PATH 环境变量")
+        return INDEX
+    index = TOOLBOXES.get(toolbox)
+    if index is None:
+        raise ValueError(f"未知的工具箱 '{toolbox}'，可用：{', '.join(TOOLBOXES)}")
+    return index
+
+
+def get_index(toolbox: str = '') -> Dict:
+    """获取工具箱的模块索引（首次调用时构建；后台构建进行中时直接返回部分索引）"""
+    index = select_index(toolbox)
+    if not index['built'] and not index['building']:
+        with index['sync_lock']:
+            if not index['built']:
+                load_index(index)
+    return index
+
+
+def resolve_module(index: Dict, name: str, category: str = None) -> Dict:
+    """
+    按模块名 O(1) 查找索引记录，可选限定类别；未找到返回 None
+    
+    精确匹配失败时忽略大小写再查一次（如 BandpassFilter -> BandPassFilter）。
+    只查内存中的索引，可在事件循环中直接调用；后台构建期间请用 resolve_module_async。
+    """
+    lookups = index['lookups']
+    candidates = [name] + [other for other in lookups['by_lower'].get(name.lower(), []) if other != name]
+    modules = lookups['modules']
+    for candidate in candidates:
+        for rel in lookups['by_name'].get(candidate, []):
+            record = modules[rel]
+            if category is None or record['category'] == category:
+                return record
+    return None
+
+
+async def resolve_module_async(index: Dict, name: str, category: str = None) -> Dict:
+    """查找模块记录；后台构建期间索引中没有时在线程池中直接扫描磁盘（见 find_module_file）"""
+    record = resolve_module(index, name, category)
+    if record is None and not index['built']:
+        record = await run_blocking(find_module_file, index, name, category)
+    return record
+
+
+def namespace_file_names(index: Dict) -> Dict[str, List[Path]]:
+    """
+    直接扫描用的文件名表：模块名 -> 磁盘上的 .m 文件（浅层优先）
+    
+    后台构建期间第一次直接扫描时遍历一次命名空间，之后的查找（包括不存在的名称）不再访问磁盘；
+    构建完成后不再使用，由 load_index 清除。
+    """
+    names = index['file_names']
+    if names is None:
+        names = {}
+        if index['ns'].is_dir():
+            for mfile in sorted(index['ns'].rglob('*.m'), key=lambda path: (len(path.parts), path)):
+                names.setdefault(mfile.stem, []).append(mfile)
+        index['file_names'] = names
+    return names
+
+
+def find_module_file(index: Dict, name: str, category: str = None) -> Dict:
+    """直接扫描（后台构建期间使用）：在磁盘上查找尚未发布的模块文件并即时解析，不写入索引"""
+    for mfile in namespace_file_names(index).get(name, []):
+        parts = mfile.relative_to(index['ns']).parts
+        if len(parts) >= 2 and parts[0].startswith('+') and (category is None or parts[0] == f"+{category}"):
+            try:
+                record, _ = analyze_module_file(mfile, parts[0][1:], index['ns'])
+            except FileNotFoundError:
+                continue
+            return record
+    return None
+
+
+# ------------------------------------------
+# 模块名模糊匹配：三元组倒排表召回候选，编辑距离排序
+# ------------------------------------------
+
+FUZZY_MAX_CANDIDATES = 50  # 按共享三元组数取前 N 个候选再计算编辑距离
+
+
+def name_trigrams(name: str) -> set:
+    """名称（小写，首尾加边界符）的字符三元组"""
+    padded = f"${name.lower()}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_name_trigrams(names) -> Dict[str, List[str]]:
+    """三元组 -> 包含它的模块名"""
+    trigrams = {}
+    for name in sorted(names):
+        for gram in name_trigrams(name):
+            trigrams.setdefault(gram, []).append(name)
+    return trigrams
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein 编辑距离"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def suggest_module_names(index: Dict, name: str, limit: int = 5) -> List[Tuple[str, int]]:
+    """
+    为拼写有误的模块名给出"你是不是要找"候选 [(模块名, 编辑距离)]
+    
+    先用三元组倒排表按共享三元组数召回候选，再按忽略大小写的编辑距离排序；
+    距离超过名称长度三分之一（至少 2）的候选不返回。
+    """
+    trigrams = index['lookups']['name_trigrams']
+    overlap = {}
+    for gram in name_trigrams(name):
+        for candidate in trigrams.get(gram, []):
+            overlap[candidate] = overlap.get(candidate, 0) + 1
+    
+    lowered = name.lower()
+    max_distance = max(2, len(name) // 3)
+    ranked = []
+    for candidate in heapq.nlargest(FUZZY_MAX_CANDIDATES, overlap, key=overlap.get):
+        distance = edit_distance(lowered, candidate.lower())
+        if distance <= max_distance:
+            ranked.append((distance, -overlap[candidate], candidate))
+    
+    return [(candidate, distance) for distance, _, candidate in sorted(ranked)[:limit]]
+
+
+def module_not_found(index: Dict, name: str, as_json: bool = False) -> str | Dict:
+    """模块不存在时的提示，附带按编辑距离排序的候选模块名"""
+    suggestions = suggest_module_names(index, name)
+    if as_json:
+        return {'error': f"模块 '{name}' 不存在", 'suggestions': [candidate for candidate, _ in suggestions]}
+    if not suggestions:
+        return f"❌ 模块 '{name}' 不存在。使用 search_module() 搜索模块。"
+    names = ", ".join(f"`{candidate}`" for candidate, _ in suggestions)
+    return f"❌ 模块 '{name}' 不存在。你是不是要找：{names}"
+
+
+def namespace_categories(namespace_path: Path) -> List[str]:
+    """列出命名空间下的类别目录（包括没有 .m 文件的类别），只读一层目录"""
+    if not namespace_path.is_dir():
+        return []
+    return [d.name[1:] for d in namespace_path.iterdir() if d.is_dir() and d.name.startswith('+')]
+
+
+def category_records(index: Dict, category: str) -> List[Dict]:
+    """返回某个类别下的所有模块记录；后台构建期间该类别尚未发布时直接扫描文件头部"""
+    lookups = index['lookups']
+    if category in lookups['by_category'] or index['built']:
+        modules = lookups['modules']
+        return [modules[rel] for rel in lookups['by_category'].get(category, [])]
+    cat_dir = index['ns'] / f"+{category}"
+    if not cat_dir.is_dir():
+        return []
+    return [scan_module_file(mfile, category, index['ns']) for mfile in sorted(cat_dir.rglob('*.m'))]
+
+
+# ------------------------------------------
+# 继承关系图：索引更新时重建，祖先/子类/继承成员查询只遍历内存中的边
+# ------------------------------------------
+
+def build_inheritance_graph(modules: Dict[str, Dict], by_name: Dict[str, List[str]]) -> Dict:
+    """
+    由模块记录中的父类列表构建继承关系图
+    
+    父类按完整包名匹配；未限定包名的父类按模块名匹配；
+    工具箱之外的父类（如 handle）保留原名作为叶子节点。
+    """
+    by_qualified = {record['qualified']: rel for rel, record in modules.items()}
+    parents = {}
+    children = {}
+    
+    for rel, record in modules.items():
+        resolved = []
+        for parent in record.get('parents', []):
+            if parent not in by_qualified and '.' not in parent and parent in by_name:
+                parent = modules[by_name[parent][0]]['qualified']
+            resolved.append(parent)
+            children.setdefault(parent, []).append(record['qualified'])
+        if resolved:
+            parents[record['qualified']] = resolved
+    
+    for names in children.values():
+        names.sort()
+    
+    return {'by_qualified': by_qualified, 'parents': parents, 'children': children}
+
+
+def resolve_class(index: Dict, name: str) -> Dict:
+    """按完整包名（nirs.modules.AR_IRLS）或模块名查找记录；未找到返回 None"""
+    lookups = index['lookups']
+    rel = lookups['graph']['by_qualified'].get(name)
+    if rel is not None:
+        return lookups['modules'][rel]
+    return resolve_module(index, name)
+
+
+async def resolve_class_async(index: Dict, name: str) -> Dict:
+    """resolve_class 的异步版本：后台构建期间按模块名直接扫描尚未发布的文件"""
+    record = resolve_class(index, name)
+    if record is None and not index['built'] and '.' not in name:
+        record = await run_blocking(find_module_file, index, name)
+    return record
+
+
+def class_ancestors(index: Dict, qualified: str) -> List[Tuple[str, int]]:
+    """返回所有祖先类 [(完整包名, 层级)]，按深度优先、从左到右的顺序（即成员查找顺序）"""
+    parents = index['lookups']['graph']['parents']
+    result = []
+    seen = {qualified}
+    stack = [(parent, 1) for parent in reversed(parents.get(qualified, []))]
+    while stack:
+        name, depth = stack.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        result.append((name, depth))
+        stack.extend((parent, depth + 1) for parent in reversed(parents.get(name, [])))
+    return result
+
+
+def class_descendants(index: Dict, qualified: str) -> List[Tuple[str, int]]:
+    """返回所有子孙类 [(完整包名, 层级)]，按层级广度优先"""
+    children = index['lookups']['graph']['children']
+    result = []
+    seen = {qualified}
+    frontier = [qualified]
+    depth = 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for name in frontier:
+            for child in children.get(name, []):
+                if child not in seen:
+                    seen.add(child)
+                    result.append((child, depth))
+                    next_frontier.append(child)
+        frontier = next_frontier
+    return result
+
+
+def inherited_members(index: Dict, qualified: str) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    沿继承链解析全部属性和方法，返回 {'properties': [(名称, 定义所在类)], 'methods': [...]}
+    
+    子类中的同名成员覆盖父类成员；工具箱之外的父类没有成员信息。
+    """
+    lookups = index['lookups']
+    by_qualified = lookups['graph']['by_qualified']
+    members = {'properties': [], 'methods': []}
+    seen = {'properties': set(), 'methods': set()}
+    
+    for name in [qualified] + [name for name, _ in class_ancestors(index, qualified)]:
+        rel = by_qualified.get(name)
+        if rel is None:
+            continue
+        record = lookups['modules'][rel]
+        for kind, key in (('properties', 'property_names'), ('methods', 'method_names')):
+            for member in record.get(key, []):
+                if member not in seen[kind]:
+                    seen[kind].add(member)
+                    members[kind].append((member, name))
+    
+    return members
+
+
+# ------------------------------------------
+# 引用索引：nirs.* 限定名 -> 引用它的模块/示例及行号
+# ------------------------------------------
+
+def reference_prefixes(record: Dict) -> Dict[str, List[Tuple[int, str]]]:
+    """
+    一个文件中的引用按前缀展开：{前缀: [(行号, 原始限定名)]}
+    
+    每个限定名同时登记到它的所有前缀下（至少两段），
+    因此查询 nirs.core.Data 也能找到 nirs.core.Data.empty 的调用。
+    """
+    sites = {}
+    for symbol, lines in record.get('references', {}).items():
+        parts = symbol.split('.')
+        for n in range(2, len(parts) + 1):
+            sites.setdefault('.'.join(parts[:n]), []).extend((line, symbol) for line in lines)
+    for entries in sites.values():
+        entries.sort()
+    return sites
+
+
+def build_reference_index(modules: Dict[str, Dict], demos: Dict[str, Dict]) -> Dict:
+    """
+    由各文件记录中的引用构建反向索引
+    
+    结构：{限定名: {(来源类型, 键): [(行号, 原始限定名)]}}，来源类型为 'module' 或 'demo'。
+    """
+    references = {}
+    sources = [('module', rel, record) for rel, record in modules.items()]
+    sources += [('demo', name, record) for name, record in demos.items()]
+    
+    for kind, key, record in sources:
+        for prefix, entries in reference_prefixes(record).items():
+            references.setdefault(prefix, {})[(kind, key)] = entries
+    
+    return references
+
+
+def update_reference_index(references: Dict, changes: List[Tuple[str, str, Dict, Dict]]) -> Dict:
+    """
+    按变化的文件增量更新引用索引，返回新表（写时复制，原表不变）
+    
+    changes 为 [(来源类型, 键, 旧记录, 新记录)]，新增文件的旧记录、删除文件的新记录为 None。
+    """
+    references = dict(references)
+    copied = set()
+    
+    def sites_of(prefix: str) -> Dict:
+        if prefix not in copied:
+            references[prefix] = dict(references.get(prefix, {}))
+            copied.add(prefix)
+        return references[prefix]
+    
+    for kind, key, old, new in changes:
+        if old is not None:
+            for prefix in reference_prefixes(old):
+                sites_of(prefix).pop((kind, key), None)
+        if new is not None:
+            for prefix, entries in reference_prefixes(new).items():
+                sites_of(prefix)[(kind, key)] = entries
+    
+    for prefix in copied:
+        if not references[prefix]:
+            del references[prefix]
+    return references
+
+
+# ------------------------------------------
+# 工作流目录：示例中的流水线去重后按模块序列归并，建立词项倒排表
+# ------------------------------------------
+
+def build_workflow_catalog(modules: Dict[str, Dict], demos: Dict[str, Dict], by_qualified: Dict[str, str]) -> Dict:
+    """
+    合并所有示例中的流水线：相同模块序列只保留一条，记录出现在哪些示例中
+    
+    每条工作流的检索词来自示例名、示例简介、各步骤模块名及其简介。
+    """
+    entries = []
+    by_sequence = {}
+    for name in sorted(demos):
+        demo = demos[name]
+        for chain in demo.get('workflows', []):
+            sequence = tuple(step['module'] for step in chain['steps'])
+            entry = by_sequence.get(sequence)
+            if entry is None:
+                entry = by_sequence[sequence] = {'modules': list(sequence), 'steps': chain['steps'],
+                                                 'demos': [], 'terms': set()}
+                entries.append(entry)
+                for module in sequence:
+                    entry['terms'].update(tokenize(module.rsplit('.', 1)[-1]))
+                    rel = by_qualified.get(module)
+                    if rel is not None:
+                        entry['terms'].update(tokenize(modules[rel]['summary']))
+            entry['demos'].append((name, chain['line']))
+            entry['terms'].update(tokenize(name.replace('_', ' ')))
+            entry['terms'].update(tokenize(demo['summary']))
+    
+    postings = {}
+    for i, entry in enumerate(entries):
+        for term in entry['terms']:
+            postings.setdefault(term, []).append(i)
+    
+    return {'entries': entries, 'postings': postings, 'vocab': sorted(postings)}
+
+
+# 词干提取时去掉的英文词尾（按长度从长到短尝试）
+STEM_SUFFIXES = ('ing', 'ion', 'ed', 'es', 's')
+STEM_MIN_LENGTH = 4  # 词干短于该长度时不做前缀扩展（如 glm、hb 只做精确匹配）
+
+# 任务描述没有命中任何工作流时的回退：常见任务 -> 典型流水线中的模块（键为词干）
+WORKFLOW_TASK_MODULES = {
+    'preprocess': ('OpticalDensity', 'BeerLambertLaw', 'BandPassFilter'),
+    'glm': ('AR_IRLS', 'GLM', 'MixedEffects'),
+    'connectivity': ('Connectivity',),
+    'image': ('ImageReconMFX', 'Register'),
+    'reconstruct': ('ImageReconMFX', 'Register'),
+}
+
+
+def stem_term(term: str) -> str:
+    """粗略的英文词干：去掉一个常见词尾（preprocessing -> preprocess，filters -> filter）"""
+    for suffix in STEM_SUFFIXES:
+        if term.endswith(suffix) and len(term) - len(suffix) >= STEM_MIN_LENGTH:
+            if suffix == 's' and term.endswith(('ss', 'is', 'us')):
+                continue
+            return term[:-len(suffix)]
+    return term
+
+
+def expand_workflow_term(catalog: Dict, term: str) -> List[Tuple[str, float]]:
+    """
+    任务中的一个词 -> 命中的目录词及权重
+    
+    完全相同记 1；目录词以该词的词干开头（filtering -> filter、filtered，preprocess -> preprocessing）记 0.7。
+    """
+    matched = [(term, 1.0)] if term in catalog['postings'] else []
+    stem = stem_term(term)
+    if len(stem) >= STEM_MIN_LENGTH:
+        vocab = catalog['vocab']
+        i = bisect_left(vocab, stem)
+        while i < len(vocab) and vocab[i].startswith(stem):
+            if vocab[i] != term:
+                matched.append((vocab[i], 0.7))
+            i += 1
+    return matched
+
+
+def score_workflow_terms(catalog: Dict, terms) -> Dict[int, float]:
+    """按词项 IDF 之和为工作流打分；每个任务词只计一次（取命中目录词中权重最高的）"""
+    entries = catalog['entries']
+    scores = {}
+    for term in set(terms):
+        weights = {}
+        for vocab_term, weight in expand_workflow_term(catalog, term):
+            for i in catalog['postings'][vocab_term]:
+                weights[i] = max(weights.get(i, 0.0), weight)
+        if not weights:
+            continue
+        idf = math.log(1 + len(entries) / len(weights))
+        for i, weight in weights.items():
+            scores[i] = scores.get(i, 0.0) + weight * idf
+    return scores
+
+
+def match_workflows(index: Dict, task: str, limit: int = 3) -> List[Tuple[Dict, float]]:
+    """
+    在工作流目录中检索任务描述：按词项 IDF 之和排序，出现在多个示例中的工作流略微加分
+    
+    任务词按词干前缀匹配目录词；一个词都没有命中时，常见任务名（如 preprocessing、glm）
+    改用 WORKFLOW_TASK_MODULES 中的典型模块名检索。仍无命中时返回空列表。
+    """
+    catalog = index['lookups']['workflows']
+    entries = catalog['entries']
+    terms = tokenize(task)
+    scores = score_workflow_terms(catalog, terms)
+    if not scores:
+        modules = []
+        for stem in map(stem_term, terms):
+            for key, names in WORKFLOW_TASK_MODULES.items():
+                if key == stem or (len(stem) >= STEM_MIN_LENGTH and key.startswith(stem)):
+                    modules.extend(names)
+        scores = score_workflow_terms(catalog, tokenize(' '.join(modules)))
+    
+    ranked = sorted(((score + 0.1 * math.log(len(entries[i]['demos'])), i) for i, score in scores.items()),
+                    key=lambda item: (-item[0], item[1]))
+    return [(entries[i], score) for score, i in ranked[:max(limit, 0)]]
+
+
+# ------------------------------------------
+# 相关模块：示例流水线共现 + 共同父类 + 说明文本相似度，预计算 top-k 近邻表
+# ------------------------------------------
+
+RELATED_TOP_K = 5
+RELATED_WEIGHTS = {'demo': 0.5, 'parent': 0.2, 'text': 0.3}
+RELATED_MIN_SCORE = 0.05
+RELATED_MAX_DF = 50  # 出现在过多模块中的词对相似度贡献很小，跳过以避免平方级开销
+
+
+def demo_cooccurrence(lookups: Dict) -> Dict[Tuple[str, str], float]:
+    """
+    流水线共现相似度：同一条示例流水线（job = nirs.modules.X(job) 链）中的模块两两相关，
+    按流水线出现向量的余弦计分，{(rel_a, rel_b): 分数}
+    
+    只看流水线步骤，示例中的加载函数、数据类等其他 nirs.* 引用不计入。
+    """
+    by_qualified = lookups['graph']['by_qualified']
+    chain_count = {}
+    pair_count = {}
+    for demo in lookups['demos'].values():
+        for chain in demo.get('workflows', []):
+            used = sorted({by_qualified[step['module']] for step in chain['steps']
+                           if step['module'] in by_qualified})
+            for rel in used:
+                chain_count[rel] = chain_count.get(rel, 0) + 1
+            for i, a in enumerate(used):
+                for b in used[i + 1:]:
+                    pair_count[(a, b)] = pair_count.get((a, b), 0) + 1
+    
+    return {(a, b): n / math.sqrt(chain_count[a] * chain_count[b]) for (a, b), n in pair_count.items()}
+
+
+def parent_similarity(lookups: Dict) -> Dict[Tuple[str, str], float]:
+    """继承相似度：直接父子关系记 1；兄弟类按父类的子类数衰减"""
+    graph = lookups['graph']
+    by_qualified = graph['by_qualified']
+    scores = {}
+    for parent, children in graph['children'].items():
+        if parent not in by_qualified:
+            continue  # handle 等工具箱外的父类不提供信息
+        parent_rel = by_qualified[parent]
+        rels = sorted(by_qualified[child] for child in children if child in by_qualified)
+        sibling_score = 1.0 / (1.0 + math.log(len(rels)))
+        for i, a in enumerate(rels):
+            scores[tuple(sorted((a, parent_rel)))] = 1.0
+            for b in rels[i + 1:]:
+                scores[(a, b)] = max(scores.get((a, b), 0.0), sibling_score)
+    return scores
+
+
+def text_term_frequencies(search: Dict) -> List[List[Tuple[str, int]]]:
+    """
+    从倒排索引中取出文本相似度需要的词频：每个词 [(文档, 模块名和帮助注释中的词频)]
+    
+    倒排索引由写入方原地更新，需在索引锁内调用；只复制 RELATED_MAX_DF 以内的词。
+    """
+    term_docs = []
+    for docs in search['postings'].values():
+        tf_docs = [(doc, fields.get('name', 0) + fields.get('description', 0)) for doc, fields in docs.items()]
+        tf_docs = [(doc, tf) for doc, tf in tf_docs if tf]
+        if 2 <= len(tf_docs) <= RELATED_MAX_DF:
+            term_docs.append(tf_docs)
+    return term_docs
+
+
+def text_similarity(term_docs: List[List[Tuple[str, int]]], n_docs: int) -> Dict[Tuple[str, str], float]:
+    """说明文本相似度：模块名和帮助注释的 TF-IDF 向量余弦，基于 text_term_frequencies 的结果计算"""
+    n_docs = max(n_docs, 1)
+    weights = []  # 每个词 [(doc, 权重)]
+    norms = {}
+    for tf_docs in term_docs:
+        idf = math.log(n_docs / len(tf_docs))
+        entries = sorted((doc, (1 + math.log(tf)) * idf) for doc, tf in tf_docs)
+        weights.append(entries)
+        for doc, w in entries:
+            norms[doc] = norms.get(doc, 0.0) + w * w
+    
+    dots = {}
+    for entries in weights:
+        for i, (a, wa) in enumerate(entries):
+            for b, wb in entries[i + 1:]:
+                dots[(a, b)] = dots.get((a, b), 0.0) + wa * wb
+    
+    return {(a, b): dot / math.sqrt(norms[a] * norms[b]) for (a, b), dot in dots.items() if dot > 0}
+
+
+def build_related_table(lookups: Dict, term_docs: List[List[Tuple[str, int]]],
+                        k: int = RELATED_TOP_K) -> Dict[str, List[Tuple[str, float, List[str]]]]:
+    """合并三种相似度，为每个模块保留得分最高的 k 个近邻：{rel: [(rel, 分数, 依据)]}"""
+    modules = lookups['modules']
+    signals = {
+        'demo': demo_cooccurrence(lookups),
+        'parent': parent_similarity(lookups),
+        'text': text_similarity(term_docs, len(modules)),
+    }
+    combined = {}
+    for signal, scores in signals.items():
+        for pair, score in scores.items():
+            entry = combined.setdefault(pair, [0.0, []])
+            entry[0] += RELATED_WEIGHTS[signal] * score
+            entry[1].append(signal)
+    
+    neighbors = {}
+    for (a, b), (score, reasons) in combined.items():
+        if score < RELATED_MIN_SCORE or a not in modules or b not in modules:
+            continue
+        neighbors.setdefault(a, []).append((score, b, reasons))
+        neighbors.setdefault(b, []).append((score, a, reasons))
+    
+    return {rel: [(other, score, reasons) for score, other, reasons in heapq.nlargest(k, items)]
+            for rel, items in neighbors.items()}
+
+
+def get_related_table(index: Dict) -> Dict:
+    """
+    获取相关模块表；查找表更新后首次使用时重建
+    
+    只在索引锁内取出查找表和词频（短暂），相似度计算在锁外进行，查询不被阻塞；
+    建好的表与所依据的查找表一起保存，查找表被替换后自动失效。后台构建期间暂不推荐。
+    """
+    cached = index['related']
+    if cached is not None and cached[0] is index['lookups']:
+        return cached[1]
+    if index['building']:
+        return {}
+    
+    with index['lock']:
+        lookups = index['lookups']
+        term_docs = text_term_frequencies(index['search'])
+    table = build_related_table(lookups, term_docs)
+    index['related'] = (lookups, table)
+    return table
+
+
+# ------------------------------------------
+# 全文倒排索引：模块名、头部注释、属性名、方法名
+# ------------------------------------------
+
+SEARCH_FIELDS = ('name', 'description', 'properties', 'methods')
+
+# BM25F 字段权重：模块名命中远高于注释正文命中
+FIELD_WEIGHTS = {'name': 5.0, 'description': 1.0, 'properties': 1.5, 'methods': 1.5}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r'[A-Za-z0-9_]+')
+_SUBWORD_RE = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """分词：完整标识符（小写）+ 驼峰/下划线拆分后的子词"""
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        tokens.append(word.lower())
+        parts = _SUBWORD_RE.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+
+def query_terms(word: str) -> List[str]:
+    """查询词拆分：驼峰/下划线子词全部需要命中"""
+    parts = [part.lower() for part in _SUBWORD_RE.findall(word)]
+    return parts if len(parts) > 1 else [word.lower()]
+
+
+def new_search_index() -> Dict:
+    """创建空的倒排索引"""
+    return {
+        'postings': {},   # 词 -> {文档: {字段: 词频}}
+        'doc_terms': {},  # 文档 -> 词集合（用于删除）
+        'doc_len': {},    # 文档 -> {字段: 词数}
+        'field_total': {field: 0 for field in SEARCH_FIELDS},
+        'vocab': [],      # 排序后的词表（前缀匹配）
+        'vocab_dirty': False,
+    }
+
+
+def module_document_fields(info: Dict) -> Dict[str, List[str]]:
+    """从解析结果中提取需要索引的字段"""
+    prop_names = [p['name'] for p in info.get('properties_detailed', [])]
+    return {
+        'name': tokenize(info['name']),
+        'description': tokenize(info['description']),
+        'properties': tokenize(' '.join(prop_names)),
+        'methods': tokenize(' '.join(info.get('methods', []))),
+    }
+
+
+def add_document(search: Dict, doc_id: str, fields: Dict[str, List[str]]):
+    """将文档的各字段词频写入倒排索引"""
+    remove_document(search, doc_id)
+    postings = search['postings']
+    terms = set()
+    for field, tokens in fields.items():
+        for token in tokens:
+            field_tf = postings.setdefault(token, {}).setdefault(doc_id, {})
+            field_tf[field] = field_tf.get(field, 0) + 1
+            terms.add(token)
+    search['doc_terms'][doc_id] = terms
+    search['doc_len'][doc_id] = {field: len(tokens) for field, tokens in fields.items()}
+    for field, tokens in fields.items():
+        search['field_total'][field] = search['field_total'].get(field, 0) + len(tokens)
+    search['vocab_dirty'] = True
+
+
+def remove_document(search: Dict, doc_id: str):
+    """从倒排索引中删除文档"""
+    terms = search['doc_terms'].pop(doc_id, None)
+    for field, n in search['doc_len'].pop(doc_id, {}).items():
+        search['field_total'][field] -= n
+    if not terms:
+        return
+    postings = search['postings']
+    for term in terms:
+        docs = postings.get(term)
+        if docs is None:
+            continue
+        docs.pop(doc_id, None)
+        if not docs:
+            del postings[term]
+    search['vocab_dirty'] = True
+
+
+def expand_prefix(search: Dict, term: str) -> List[str]:
+    """在排序词表中查找以 term 为前缀的所有词"""
+    if search['vocab_dirty']:
+        search['vocab'] = sorted(search['postings'])
+        search['vocab_dirty'] = False
+    
+    vocab = search['vocab']
+    expanded = []
+    i = bisect_left(vocab, term)
+    while i < len(vocab) and vocab[i].startswith(term):
+        expanded.append(vocab[i])
+        i += 1
+    return expanded
+
 
-if not NIRS_TOOLBOX_PATH.exists():
-    print(f"❌ 错误：工具箱路径不存在: {NIRS_TOOLBOX_PATH}", file=sys.stderr)
-    sys.exit(1)
+def match_term(search: Dict, term: str) -> Dict[str, int]:
+    """前缀匹配单个词，返回 {文档: 命中次数}"""
+    hits = {}
+    for vocab_term in expand_prefix(search, term):
+        for doc_id, field_tf in search['postings'][vocab_term].items():
+            hits[doc_id] = hits.get(doc_id, 0) + sum(field_tf.values())
+    return hits
 
-print(f"✅ 工具箱路径：{NIRS_TOOLBOX_PATH}", file=sys.stderr)
 
-# 定义命名空间路径
-NIRS_NS = NIRS_TOOLBOX_PATH / "+nirs"
-DEMOS_PATH = NIRS_TOOLBOX_PATH / "demos"
+def parse_query(query: str, mode: str = 'and') -> Tuple[List[str], str]:
+    """拆分查询词；查询中出现 OR 或 | 时自动切换为 OR 模式"""
+    words = query.replace('|', ' OR ').split()
+    if 'OR' in words:
+        mode = 'or'
+    return [w for w in words if w not in ('AND', 'OR')], mode
 
-# ==========================================
-# 2. 辅助函数
-# ==========================================
 
-def parse_matlab_class(filepath: Path) -> Dict:
-    """解析MATLAB类文件 - 增强版"""
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-    
-    info = {
-        'name': filepath.stem,
-        'type': 'class',
-        'description': '',
-        'properties': [],
-        'properties_detailed': [],  # 新增：详细属性信息
-        'methods': [],
-        'methods_detailed': [],  # 新增：详细方法信息
-        'parent_class': '',
-        'full_code': content,
-        'file_path': str(filepath)
-    }
-    
-    lines = content.split('\n')
+def run_search_query(search: Dict, query: str, mode: str = 'and') -> Dict[str, int]:
+    """执行查询：倒排表求交集（AND）或并集（OR），返回 {文档: 命中次数}"""
+    words, mode = parse_query(query, mode)
     
-    # 提取类定义
-    class_match = re.search(r'classdef\s+(\w+)\s*(<\s*([\w.]+))?', content)
-    if class_match:
-        info['name'] = class_match.group(1)
-        if class_match.group(3):
-            info['parent_class'] = class_match.group(3)
+    result = None
+    for word in words:
+        # 同一个词的所有子词都必须命中
+        word_hits = None
+        for term in query_terms(word):
+            term_hits = match_term(search, term)
+            if word_hits is None:
+                word_hits = term_hits
+            else:
+                word_hits = {d: n + term_hits[d] for d, n in word_hits.items() if d in term_hits}
+        word_hits = word_hits or {}
+        
+        if result is None:
+            result = word_hits
+        elif mode == 'or':
+            for doc_id, n in word_hits.items():
+                result[doc_id] = result.get(doc_id, 0) + n
+        else:
+            result = {d: n + word_hits[d] for d, n in result.items() if d in word_hits}
     
-    # 提取类注释（%% 开头的注释）
-    comment_lines = []
-    for i, line in enumerate(lines[1:20]):  # 在前20行找注释
-        stripped = line.strip()
-        if stripped.startswith('%%') or stripped.startswith('%'):
-            comment_lines.append(stripped.lstrip('%').strip())
-        elif comment_lines and not stripped.startswith('%'):
-            break
+    return result or {}
+
+
+def bm25_scores(search: Dict, doc_ids, query: str) -> Dict[str, float]:
+    """按 BM25F 为候选文档打分（字段加权 + 字段长度归一化）"""
+    n_docs = max(len(search['doc_terms']), 1)
+    avg_len = {field: max(total / n_docs, 1.0) for field, total in search['field_total'].items()}
+    doc_ids = set(doc_ids)
+    scores = dict.fromkeys(doc_ids, 0.0)
     
-    info['description'] = '\n'.join(comment_lines)
-    
-    # 提取属性（增强版 - 包含默认值和注释）
-    props_match = re.search(r'properties(.*?)end', content, re.DOTALL)
-    if props_match:
-        props_text = props_match.group(1)
-        for line in props_text.split('\n'):
-            line_stripped = line.strip()
-            if line_stripped and not line_stripped.startswith('%'):
-                info['properties'].append(line_stripped)
-                
-                # 解析属性详情
-                prop_detail = parse_property_line(line_stripped)
-                if prop_detail:
-                    info['properties_detailed'].append(prop_detail)
-    
-    # 提取方法（增强版 - 包含签名和注释）
-    method_pattern = r'function\s+(.*?)\s*=\s*(\w+)\s*\((.*?)\)|function\s+(\w+)\s*\((.*?)\)'
-    for match in re.finditer(method_pattern, content):
-        if match.group(2):  # 有返回值的函数
-            method_name = match.group(2)
-            return_vals = match.group(1)
-            params = match.group(3)
-        else:  # 无返回值的函数
-            method_name = match.group(4)
-            return_vals = ''
-            params = match.group(5)
-        
-        if method_name and method_name != info['name']:
-            info['methods'].append(method_name)
-            
-            # 提取方法注释
-            method_comment = extract_method_comment(content, method_name)
-            
-            info['methods_detailed'].append({
-                'name': method_name,
-                'returns': return_vals,
-                'params': params,
-                'comment': method_comment
-            })
+    words, _ = parse_query(query)
+    for word in words:
+        for term in query_terms(word):
+            for vocab_term in expand_prefix(search, term):
+                docs = search['postings'][vocab_term]
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id in doc_ids.intersection(docs):
+                    doc_len = search['doc_len'][doc_id]
+                    tf = 0.0
+                    for field, count in docs[doc_id].items():
+                        norm = 1 - BM25_B + BM25_B * doc_len.get(field, 0) / avg_len[field]
+                        tf += FIELD_WEIGHTS.get(field, 1.0) * count / norm
+                    scores[doc_id] += idf * tf / (BM25_K1 + tf)
     
-    return info
+    return scores
 
 
-def parse_property_line(line: str) -> Dict:
-    """解析属性行，提取名称、默认值和注释"""
-    # 移除行内注释
-    if '%' in line:
-        code_part = line.split('%')[0].strip()
-        comment_part = line.split('%')[1].strip()
-    else:
-        code_part = line.strip()
-        comment_part = ''
-    
-    # 解析属性名和默认值
-    if '=' in code_part:
-        parts = code_part.split('=')
-        prop_name = parts[0].strip()
-        default_value = parts[1].strip().rstrip(';')
-    else:
-        prop_name = code_part.rstrip(';').strip()
-        default_value = ''
-    
-    return {
-        'name': prop_name,
-        'default': default_value,
-        'comment': comment_part
-    }
+# ------------------------------------------
+# 索引快照：冷启动时直接加载，避免重新解析整个工具箱
+# ------------------------------------------
+
+# 快照格式或解析结果结构变化时递增，旧快照自动失效
+INDEX_SNAPSHOT_VERSION = 11
 
 
-def extract_method_comment(content: str, method_name: str) -> str:
-    """提取方法的注释说明"""
-    # 查找方法定义位置
-    pattern = f'function\\s+.*?{method_name}\\s*\\('
-    match = re.search(pattern, content)
-    if not match:
-        return ''
+def snapshot_paths(toolbox_path: Path) -> List[Path]:
+    """快照候选路径：配置路径或工具箱目录旁，不可写时回退到用户缓存目录"""
+    if INDEX_SNAPSHOT_PATH.lower() == 'off':
+        return []
+    digest = hashlib.sha1(str(toolbox_path).encode('utf-8')).hexdigest()[:12]
+    if INDEX_SNAPSHOT_PATH:
+        path = Path(INDEX_SNAPSHOT_PATH).expanduser()
+        # 多个工具箱时每个工具箱一个快照文件
+        if len(TOOLBOX_PATHS) > 1:
+            path = path.with_name(f"{path.name}.{toolbox_path.name}-{digest}")
+        return [path]
     
-    # 提取方法后的注释
-    start_pos = match.end()
-    lines_after = content[start_pos:].split('\n')
+    return [
+        toolbox_path.parent / f".{toolbox_path.name}.huppert_index",
+        Path.home() / ".cache" / "huppert_mcp" / f"{toolbox_path.name}-{digest}.index",
+    ]
+
+
+def snapshot_record(record: Dict) -> Dict:
+    """快照中的记录不保存绝对路径，加载时由工具箱目录和相对路径还原"""
+    return {key: value for key, value in record.items() if key != 'path'}
+
+
+def save_index_snapshot(index: Dict) -> Path:
+    """将模块索引和倒排索引写入磁盘快照（JSON，原子替换），返回写入路径"""
+    lookups = index['lookups']
+    search = index['search']
+    payload = {
+        'version': INDEX_SNAPSHOT_VERSION,
+        'root': str(index['root']),
+        'modules': {rel: snapshot_record(record) for rel, record in lookups['modules'].items()},
+        'demos': {name: snapshot_record(demo) for name, demo in lookups['demos'].items()},
+        'postings': search['postings'],
+        'doc_len': search['doc_len'],
+    }
     
-    comments = []
-    for line in lines_after[:10]:  # 只看后面10行
-        stripped = line.strip()
-        if stripped.startswith('%'):
-            comments.append(stripped.lstrip('%').strip())
-        elif comments and not stripped.startswith('%'):
-            break
+    paths = snapshot_paths(index['root'])
+    for path in paths:
+        tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+            return path
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
     
-    return '\n'.join(comments)
+    if paths:
+        print("⚠️  索引快照写入失败，下次启动将重新解析", file=sys.stderr)
+    return None
 
 
-def parse_matlab_function(filepath: Path) -> Dict:
-    """解析MATLAB函数文件"""
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
+def restore_snapshot_records(index: Dict, payload: Dict) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+    """
+    由快照还原模块表和示例表：路径只由工具箱目录拼接，不信任快照中的路径
     
-    info = {
-        'name': filepath.stem,
-        'type': 'function',
-        'description': '',
-        'signature': '',
-        'full_code': content
-    }
+    Raises:
+        ValueError: 快照中的相对路径或示例名越出工具箱目录
+    """
+    modules = {}
+    for rel, record in payload['modules'].items():
+        parts = rel.split('/')
+        if rel != record['rel'] or any(part in ('', '.', '..') for part in parts):
+            raise ValueError(f"无效的模块路径 '{rel}'")
+        record['path'] = index['ns'].joinpath(*parts)
+        modules[rel] = record
     
-    lines = content.split('\n')
+    demos = {}
+    for name, demo in payload['demos'].items():
+        if name in ('', '.', '..') or '/' in name or os.sep in name:
+            raise ValueError(f"无效的示例名 '{name}'")
+        demo['path'] = index['demos_path'] / f"{name}.m"
+        demos[name] = demo
+    return modules, demos
+
+
+def load_index_snapshot(index: Dict) -> bool:
+    """读取磁盘快照（JSON，不执行任何代码）填充索引并发布查找表；版本或工具箱路径不一致时忽略"""
+    for path in snapshot_paths(index['root']):
+        if not path.exists():
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            if payload.get('version') != INDEX_SNAPSHOT_VERSION or payload.get('root') != str(index['root']):
+                continue
+            modules, demos = restore_snapshot_records(index, payload)
+        except Exception as e:
+            print(f"⚠️  索引快照读取失败，将重新构建：{path} ({e})", file=sys.stderr)
+            continue
+        
+        # 文档 -> 词集合可由倒排表还原，不写入快照
+        doc_terms = {}
+        for term, docs in payload['postings'].items():
+            for doc_id in docs:
+                doc_terms.setdefault(doc_id, set()).add(term)
+        
+        search = new_search_index()
+        search['postings'] = payload['postings']
+        search['doc_len'] = payload['doc_len']
+        search['doc_terms'] = doc_terms
+        search['vocab_dirty'] = True
+        for lengths in payload['doc_len'].values():
+            for field, n in lengths.items():
+                search['field_total'][field] = search['field_total'].get(field, 0) + n
+        
+        if index['store'] is not None:
+            for record in modules.values():
+                share_record_content(index['store'], record)
+        with index['lock']:
+            index['search'] = search
+            update_lookups(index, modules, demos)
+        return True
     
-    # 提取函数签名
-    for line in lines[:20]:
-        if line.strip().startswith('function'):
-            info['signature'] = line.strip()
-            break
+    return False
+
+
+# ------------------------------------------
+# 文件监听：工具箱更新（如 git pull）后增量刷新索引
+# ------------------------------------------
+
+def _report_changes(index: Dict, changes: Dict[str, int]):
+    """有变化时写回快照并输出日志"""
+    if changes['added'] or changes['updated'] or changes['removed']:
+        save_index_snapshot(index)
+        print(f"🔄 索引已更新：新增 {changes['added']}，更新 {changes['updated']}，"
+              f"删除 {changes['removed']}", file=sys.stderr)
+
+
+def _poll_loop(index: Dict, interval: float):
+    """轮询模式：定期按修改时间同步索引；间隔至少为上次同步耗时的 10 倍，大型工具箱上轮询开销不超过约 10%"""
+    delay = interval
+    while True:
+        time.sleep(delay)
+        started = time.perf_counter()
+        try:
+            _report_changes(index, sync_index(index))
+        except Exception as e:
+            print(f"⚠️  索引同步失败：{e}", file=sys.stderr)
+        delay = max(interval, 10 * (time.perf_counter() - started))
+
+
+def _start_event_watcher(index: Dict, interval: float) -> bool:
+    """事件模式：使用 watchdog（Linux 下为 inotify）监听文件变化，未安装时返回 False"""
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return False
     
-    # 提取注释
-    comment_lines = []
-    in_comment = False
-    for i, line in enumerate(lines[:50]):
-        stripped = line.strip()
-        if i == 0 and stripped.startswith('function'):
-            in_comment = True
-            continue
-        if in_comment and stripped.startswith('%'):
-            comment_lines.append(stripped.lstrip('%').strip())
-        elif in_comment and not stripped.startswith('%'):
-            break
+    pending = {'paths': set(), 'full': False}
+    pending_lock = threading.Lock()
+    wakeup = threading.Event()
     
-    info['description'] = '\n'.join(comment_lines)
+    class IndexEventHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            with pending_lock:
+                if event.is_directory and event.event_type in ('deleted', 'moved'):
+                    # 整个目录被删除或移动时无法逐个文件处理，回退到全量同步
+                    pending['full'] = True
+                elif not event.is_directory:
+                    pending['paths'].add(event.src_path)
+                    if getattr(event, 'dest_path', ''):
+                        pending['paths'].add(event.dest_path)
+            wakeup.set()
     
-    return info
+    def flush_loop():
+        while True:
+            wakeup.wait()
+            time.sleep(min(interval, 0.5))  # 合并短时间内的连续事件
+            wakeup.clear()
+            with pending_lock:
+                paths, full = pending['paths'], pending['full']
+                pending['paths'], pending['full'] = set(), False
+            try:
+                changes = sync_index(index) if full else refresh_paths(index, paths)
+                _report_changes(index, changes)
+            except Exception as e:
+                print(f"⚠️  索引更新失败：{e}", file=sys.stderr)
+    
+    observer = Observer()
+    handler = IndexEventHandler()
+    observer.schedule(handler, str(index['ns']), recursive=True)
+    if index['demos_path'].exists():
+        observer.schedule(handler, str(index['demos_path']), recursive=False)
+    observer.daemon = True
+    observer.start()
+    threading.Thread(target=flush_loop, name="index-watch-flush", daemon=True).start()
+    return True
 
 
-def get_namespace_files(namespace_path: Path) -> Dict[str, List[Path]]:
-    """获取命名空间下的所有文件，按子命名空间分类"""
-    categories = {}
+def start_index_watcher(index: Dict, mode: str = WATCH_MODE, interval: float = WATCH_INTERVAL) -> str:
+    """按配置启动文件监听，返回实际使用的模式（off / events / poll）"""
+    if mode in ('', 'off', '0', 'false'):
+        return 'off'
     
-    for subdir in namespace_path.iterdir():
-        if not subdir.is_dir():
-            continue
-        
-        # 跳过非命名空间目录
-        if not subdir.name.startswith('+'):
-            continue
-        
-        category_name = subdir.name[1:]  # 去掉 + 前缀
-        m_files = list(subdir.rglob('*.m'))
-        categories[category_name] = m_files
+    if mode != 'poll' and _start_event_watcher(index, interval):
+        return 'events'
     
-    return categories
+    threading.Thread(target=_poll_loop, args=(index, interval), name="index-watch-poll", daemon=True).start()
+    return 'poll'
 
 
-def format_module_info(info: Dict, namespace: str) -> str:
-    """格式化模块信息为markdown"""
-    output = f"# 📦 {info['name']}\n\n"
+# ------------------------------------------
+# 后台构建：服务器立即响应 initialize，索引分阶段发布
+# ------------------------------------------
+
+def _build_in_background(index: Dict, label: str):
+    try:
+        changes = load_index(index, staged=True)
+    except Exception as e:
+        print(f"❌ {label}索引构建失败：{e}", file=sys.stderr)
+        return
+    finally:
+        index['building'] = False
     
-    if info['type'] == 'class':
-        output += f"**类型**: MATLAB 类\n"
-        if info['parent_class']:
-            output += f"**继承自**: `{info['parent_class']}`\n"
-        output += "\n"
-        
-        if info['description']:
-            output += f"## 📄 说明\n\n{info['description']}\n\n"
-        
-        if info['properties']:
-            output += f"## ⚙️ 属性\n\n"
-            for prop in info['properties']:
-                output += f"- `{prop}`\n"
-            output += "\n"
-        
-        if info['methods']:
-            output += f"## 🔧 方法\n\n"
-            for method in info['methods'][:10]:  # 只显示前10个
-                output += f"- `{method}()`\n"
-            if len(info['methods']) > 10:
-                output += f"- ... 还有 {len(info['methods']) - 10} 个方法\n"
-            output += "\n"
-        
-        output += f"## 💻 使用方式\n\n"
-        output += f"```matlab\n"
-        output += f"% 创建实例\n"
-        output += f"obj = nirs.{namespace}.{info['name']}();\n"
-        output += f"```\n\n"
+    lookups = index['lookups']
+    print(f"🗂️  {label}已索引 {len(lookups['modules'])} 个模块、{len(lookups['demos'])} 个示例"
+          f"（新增 {changes['added']}，更新 {changes['updated']}，删除 {changes['removed']}，"
+          f"未变化 {changes['unchanged']}）", file=sys.stderr)
+    watch_mode = start_index_watcher(index)
+    if watch_mode != 'off':
+        print(f"👀 {label}文件监听：{watch_mode}（间隔 {WATCH_INTERVAL}s）", file=sys.stderr)
+
+
+def start_index_build(index: Dict, label: str = '') -> threading.Thread:
+    """在后台线程中构建索引，完成后按配置启动文件监听；构建期间的查询使用部分结果或直接扫描"""
+    index['building'] = True
+    thread = threading.Thread(target=_build_in_background, args=(index, label),
+                              name=f"index-build-{index['name']}", daemon=True)
+    thread.start()
+    return thread
+
+
+def scan_query(index: Dict, query: str, mode: str = 'and') -> Tuple[Dict[str, int], Dict[str, float], Dict[str, Dict]]:
+    """
+    直接扫描查询（后台构建期间使用）：在已发布的模块记录中逐个匹配
     
-    else:  # function
-        if info['signature']:
-            output += f"## 函数签名\n\n```matlab\n{info['signature']}\n```\n\n"
-        
-        if info['description']:
-            output += f"## 📄 说明\n\n{info['description']}\n\n"
-        
-        output += f"## 💻 使用方式\n\n"
-        output += f"```matlab\n"
-        output += f"result = nirs.{namespace}.{info['name']}(...);\n"
-        output += f"```\n\n"
+    只匹配模块名、简介、属性名和方法名（前缀匹配），相关度为命中次数。
+    """
+    words, mode = parse_query(query, mode)
+    modules = index['lookups']['modules']
+    hits = {}
+    for rel, record in modules.items():
+        tokens = tokenize(' '.join([record['name'], record['summary'],
+                                    *record.get('property_names', ()), *record.get('method_names', ())]))
+        counts = []
+        for word in words:
+            matched = [sum(token.startswith(term) for token in tokens) for term in query_terms(word)]
+            counts.append(sum(matched) if matched and all(matched) else 0)
+        if counts and (any(counts) if mode == 'or' else all(counts)):
+            hits[rel] = sum(counts)
+    return hits, {rel: float(n) for rel, n in hits.items()}, modules
+
+
+def query_index(index: Dict, query: str, mode: str = 'and') -> Tuple[Dict[str, int], Dict[str, float], Dict[str, Dict]]:
+    """执行搜索并打分，返回 (命中次数, 相关度, 模块表)"""
+    # 文件监听线程会原地更新倒排索引，查询期间持有索引锁（写入方在同一把锁内发布查找表，
+    # 命中的文档与返回的模块表一致）；后台构建正在占用锁时不等待，改为直接扫描已发布的记录
+    if not index['lock'].acquire(blocking=not index['building']):
+        return scan_query(index, query, mode)
+    try:
+        search = index['search']
+        hits = run_search_query(search, query, mode)
+        scores = bm25_scores(search, hits, query)
+        return hits, scores, index['lookups']['modules']
+    finally:
+        index['lock'].release()
+
+
+# 每个工具箱一个索引；多个工具箱时共享内容去重表
+_CONTENT_STORE = {} if len(TOOLBOX_PATHS) > 1 else None
+TOOLBOXES = {name: new_index(path, name, _CONTENT_STORE) for name, path in TOOLBOX_PATHS.items()}
+INDEX = next(iter(TOOLBOXES.values()), None)
+
+
+# ------------------------------------------
+# 异步执行：阻塞的文件读取和解析放到有界线程池，不占用事件循环
+# ------------------------------------------
+
+_IO_EXECUTOR = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="nirs-io")
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """在 I/O 线程池中执行阻塞函数（保留当前上下文变量）"""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_IO_EXECUTOR, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+async def get_index_async(toolbox: str = '') -> Dict:
+    """获取工具箱的模块索引；尚未构建时在线程池中构建，后台构建进行中时直接返回部分索引"""
+    index = select_index(toolbox)
+    if index['built'] or index['building']:
+        return index
+    return await run_blocking(get_index, toolbox)
+
+
+# ------------------------------------------
+# 请求统计：每个 Tool / Resource 的调用次数、延迟分位数、磁盘读取和响应大小
+# ------------------------------------------
+
+_SERVER_STARTED = time.time()
+_HANDLER_STATS = {}
+_HANDLER_STATS_LOCK = threading.Lock()
+
+
+def record_handler_call(name: str, kind: str, elapsed: float, counters: Dict, response_bytes: int, failed: bool):
+    """登记一次处理器调用"""
+    with _HANDLER_STATS_LOCK:
+        stats = _HANDLER_STATS.get(name)
+        if stats is None:
+            stats = _HANDLER_STATS[name] = {
+                'kind': kind, 'calls': 0, 'errors': 0, 'total_time': 0.0,
+                'latencies': deque(maxlen=max(STATS_WINDOW, 1)),
+                'bytes_read': 0, 'files_opened': 0, 'response_bytes': 0,
+            }
+        stats['calls'] += 1
+        stats['errors'] += failed
+        stats['total_time'] += elapsed
+        stats['latencies'].append(elapsed)
+        stats['bytes_read'] += counters['bytes_read']
+        stats['files_opened'] += counters['files_opened']
+        stats['response_bytes'] += response_bytes
+
+
+def instrumented(kind: str):
+    """
+    统计装饰器：记录处理器的耗时、读取的字节数和文件数、响应大小
     
-    output += f"## 📝 完整代码\n\n"
-    output += f"```matlab\n{info['full_code']}\n```\n\n"
+    放在 @mcp.tool() / @mcp.resource() 下面；保留原函数签名，FastMCP 生成的参数模式不变。
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            counters = {'bytes_read': 0, 'files_opened': 0}
+            token = _IO_COUNTERS.set(counters)
+            start = time.perf_counter()
+            result, failed = None, True
+            try:
+                result = await fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                _IO_COUNTERS.reset(token)
+                if isinstance(result, str):
+                    size = len(result.encode('utf-8'))
+                elif isinstance(result, dict):
+                    size = len(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+                else:
+                    size = 0
+                record_handler_call(fn.__name__, kind, elapsed, counters, size, failed)
+        return wrapper
+    return decorator
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """已排序样本的分位数（最近秩）"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def server_stats_snapshot() -> Dict:
+    """当前统计的快照：{'uptime_s', 'handlers': {名称: {calls, errors, p50_ms, ...}}}"""
+    with _HANDLER_STATS_LOCK:
+        items = [(name, dict(stats, latencies=sorted(stats['latencies']))) for name, stats in _HANDLER_STATS.items()]
     
-    return output
+    handlers = {}
+    for name, stats in items:
+        ordered = stats['latencies']
+        handlers[name] = {
+            'kind': stats['kind'],
+            'calls': stats['calls'],
+            'errors': stats['errors'],
+            'total_ms': round(stats['total_time'] * 1000, 3),
+            'mean_ms': round(stats['total_time'] * 1000 / stats['calls'], 3),
+            'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+            'bytes_read': stats['bytes_read'],
+            'files_opened': stats['files_opened'],
+            'response_bytes': stats['response_bytes'],
+        }
+    return {'time': time.time(), 'uptime_s': round(time.time() - _SERVER_STARTED, 1), 'handlers': handlers}
+
+
+def _stats_dump_loop(interval: float, path: str):
+    """定期将统计快照以 JSON Lines 格式追加到文件（未配置文件时输出到 stderr）"""
+    while True:
+        time.sleep(interval)
+        line = json.dumps(server_stats_snapshot(), ensure_ascii=False)
+        try:
+            if path:
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            else:
+                print(f"📈 {line}", file=sys.stderr)
+        except OSError as e:
+            print(f"⚠️  统计输出失败：{e}", file=sys.stderr)
+
+
+def start_stats_dump(interval: float = STATS_INTERVAL, path: str = STATS_FILE) -> bool:
+    """按配置启动定期统计输出线程；间隔为 0 时不启动"""
+    if interval <= 0:
+        return False
+    threading.Thread(target=_stats_dump_loop, args=(interval, path), name="nirs-stats", daemon=True).start()
+    return True
+
+
+def read_text_file(filepath: Path) -> str:
+    """读取整个文本文件"""
+    with open(filepath, 'rb') as f:
+        raw = f.read()
+    count_io(len(raw))
+    return decode_text(raw)
 
 
 # ==========================================
-# 3. Resources: 暴露工具箱内容
+# 4. Resources: 暴露工具箱内容
 # ==========================================
 
 @mcp.resource("list://categories")
-def list_categories() -> str:
+@instrumented("resource")
+async def list_categories() -> str:
     """列出所有命名空间类别"""
-    categories = get_namespace_files(NIRS_NS)
+    index = await get_index_async()
+    categories = index['lookups']['by_category']
+    if not index['built']:
+        # 后台构建期间直接列出命名空间目录（只读目录，不读文件）
+        categories = await run_blocking(get_namespace_files, index['ns'])
     
     output = "# 🧠 NIRS-Toolbox 模块分类\n\n"
     output += f"工具箱共包含 **{len(categories)}** 个主要类别：\n\n"
@@ -316,12 +2776,15 @@ def list_categories() -> str:
 
 
 @mcp.resource("category://{category}")
-def get_category(category: str) -> str:
+@instrumented("resource")
+async def get_category(category: str) -> str:
     """获取指定类别的所有模块"""
-    category_path = NIRS_NS / f"+{category}"
+    index = await get_index_async()
+    records = await run_blocking(category_records, index, category)
     
-    if not category_path.exists():
-        available = [d.name[1:] for d in NIRS_NS.iterdir() if d.is_dir() and d.name.startswith('+')]
+    # 索引只收录有 .m 文件的类别，类别是否存在以目录为准
+    if not records and not await run_blocking((index['ns'] / f"+{category}").is_dir):
+        available = await run_blocking(namespace_categories, index['ns'])
         return f"""
 ❌ 类别 '{category}' 不存在
 
@@ -333,17 +2796,21 @@ def get_category(category: str) -> str:
     
     output = f"# 📂 nirs.{category}\n\n"
     
-    # 列出所有.m文件
-    m_files = sorted(category_path.glob('*.m'))
+    # 按相对路径区分直属文件和子目录文件
+    m_files = sorted((r for r in records if r['rel'].count('/') == 1), key=lambda r: r['path'])
     
     if not m_files:
         # 可能是包含子目录的类别
-        subdirs = [d for d in category_path.iterdir() if d.is_dir()]
+        subdirs = {}
+        for record in records:
+            parts = record['rel'].split('/')
+            subfiles = subdirs.setdefault(parts[1], [])
+            if len(parts) == 3:
+                subfiles.append(record['path'])
         if subdirs:
             output += "## 子模块\n\n"
-            for subdir in sorted(subdirs):
-                subfiles = list(subdir.glob('*.m'))
-                output += f"### {subdir.name} ({len(subfiles)} 个文件)\n"
+            for subdir_name, subfiles in sorted(subdirs.items()):
+                output += f"### {subdir_name} ({len(subfiles)} 个文件)\n"
                 for f in sorted(subfiles)[:5]:
                     output += f"- `{f.stem}` - `module://{category}/{f.stem}`\n"
                 if len(subfiles) > 5:
@@ -354,59 +2821,46 @@ def get_category(category: str) -> str:
     else:
         output += f"共 **{len(m_files)}** 个模块/函数：\n\n"
         
-        for mfile in m_files:
-            # 快速提取第一行注释
-            with open(mfile, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-                first_comment = ""
-                for line in lines[1:10]:
-                    if line.strip().startswith('%'):
-                        first_comment = line.strip().lstrip('%').strip()
-                        break
-            
-            output += f"### {mfile.stem}\n"
-            if first_comment:
-                output += f"{first_comment}\n"
-            output += f"- 查看详情：`module://{category}/{mfile.stem}`\n\n"
+        for record in m_files:
+            # 简介在建索引时从文件头部提取
+            output += f"### {record['name']}\n"
+            if record['summary']:
+                output += f"{record['summary']}\n"
+            output += f"- 查看详情：`module://{category}/{record['name']}`\n\n"
     
     return output
 
 
 @mcp.resource("module://{category}/{name}")
-def get_module(category: str, name: str) -> str:
-    """获取指定模块的详细信息"""
-    # 尝试在类别目录下查找
-    module_path = NIRS_NS / f"+{category}" / f"{name}.m"
-    
-    if not module_path.exists():
-        # 尝试在子目录中查找
-        category_path = NIRS_NS / f"+{category}"
-        found_files = list(category_path.rglob(f"{name}.m"))
-        if found_files:
-            module_path = found_files[0]
-        else:
-            return f"❌ 模块 '{category}/{name}' 不存在"
-    
-    # 判断是类还是函数
-    with open(module_path, 'r', encoding='utf-8', errors='ignore') as f:
-        first_line = f.readline()
+@instrumented("resource")
+async def get_module(category: str, name: str) -> str:
+    """获取指定模块的详细信息；`module://{category}/{name}#{section}` 只返回某个方法或代码块"""
+    name, _, section = name.partition('#')
+    # 在索引中查找（类别目录及其子目录）
+    index = await get_index_async()
+    record = await resolve_module_async(index, name, category)
+    if not record:
+        return module_not_found(index, name)
     
-    if 'classdef' in first_line:
-        info = parse_matlab_class(module_path)
-    else:
-        info = parse_matlab_function(module_path)
+    if section:
+        return await format_module_section(record, section)
     
-    return format_module_info(info, category)
+    info, chunk = await asyncio.gather(
+        run_blocking(load_module_info, record),
+        run_blocking(read_source_chunk, record),
+    )
+    return format_module_info(info, category, chunk)
 
 
 @mcp.resource("demo://{demo_name}")
-def get_demo(demo_name: str) -> str:
+@instrumented("resource")
+async def get_demo(demo_name: str) -> str:
     """获取示例脚本"""
-    demo_path = DEMOS_PATH / f"{demo_name}.m"
+    demos = (await get_index_async())['lookups']['demos']
     
-    if not demo_path.exists():
+    if demo_name not in demos:
         # 列出可用demo
-        available = [f.stem for f in DEMOS_PATH.glob('*.m')]
+        available = list(demos)
         return f"""
 ❌ 示例 '{demo_name}' 不存在
 
@@ -416,8 +2870,8 @@ def get_demo(demo_name: str) -> str:
 💡 使用方式：demo://示例名
 """
     
-    with open(demo_path, 'r', encoding='utf-8', errors='ignore') as f:
-        code = f.read()
+    demo_path = demos[demo_name]['path']
+    code = await run_blocking(read_text_file, demo_path)
     
     output = f"# 💡 {demo_name}\n\n"
     output += "## 完整代码\n\n"
@@ -430,230 +2884,672 @@ def get_demo(demo_name: str) -> str:
 
 
 @mcp.resource("list://demos")
-def list_demos() -> str:
+@instrumented("resource")
+async def list_demos() -> str:
     """列出所有示例"""
-    demo_files = sorted(DEMOS_PATH.glob('*.m'))
+    demos = list((await get_index_async())['lookups']['demos'].values())
     
     output = "# 💡 NIRS-Toolbox 示例脚本\n\n"
-    output += f"共 **{len(demo_files)}** 个示例：\n\n"
-    
-    for demo_file in demo_files:
-        with open(demo_file, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-            # 提取第一行注释
-            first_comment = ""
-            for line in lines[:10]:
-                if line.strip().startswith('%'):
-                    first_comment = line.strip().lstrip('%').strip()
-                    break
-        
-        output += f"### {demo_file.stem}\n"
-        if first_comment:
-            output += f"{first_comment}\n"
-        output += f"- 查看代码：`demo://{demo_file.stem}`\n\n"
+    output += f"共 **{len(demos)}** 个示例：\n\n"
+    
+    for demo in demos:
+        # 简介在建索引时从文件头部提取
+        output += f"### {demo['name']}\n"
+        if demo['summary']:
+            output += f"{demo['summary']}\n"
+        output += f"- 查看代码：`demo://{demo['name']}`\n\n"
     
     return output
 
 
-# ==========================================
-# 4. Tools: 搜索和查询功能
-# ==========================================
+# ==========================================
+# 5. Tools: 搜索和查询功能
+# ==========================================
+
+# ------------------------------------------
+# 结构化结果类型：output_format=json 时工具返回的对象，FastMCP 据此发布 outputSchema
+# （pydantic 在 Python 3.12 以下要求使用 typing_extensions.TypedDict）
+# ------------------------------------------
+
+class ErrorResult(TypedDict):
+    error: str
+    suggestions: NotRequired[List[str]]  # 模块不存在时按编辑距离排序的候选模块名
+    sections: NotRequired[List[str]]     # 分段不存在时的可用分段
+    symbol: NotRequired[str]
+
+
+class ModuleRef(TypedDict):
+    name: str
+    qualified: str
+    category: str
+    kind: str
+    summary: str
+    uri: str
+
+
+class PropertyInfo(TypedDict):
+    name: str
+    default: str
+    comment: str
+    validation: str
+    attributes: str
+
+
+class MethodInfo(TypedDict):
+    name: str
+    returns: str
+    params: str
+    comment: str
+    attributes: str
+    signature: str
+
+
+class SourceChunk(TypedDict):
+    text: str
+    start_line: int
+    end_line: int
+    offset: int
+    next_offset: int
+    total_bytes: int
+    remaining_bytes: int
+    next_cursor: str
+
+
+class RelatedModule(TypedDict):
+    name: str
+    qualified: str
+    description: str
+    score: float
+    reasons: List[str]
+
+
+class ModuleResult(ModuleRef):
+    path: str
+    parent_classes: NotRequired[List[str]]
+    signature: NotRequired[str]
+    description: NotRequired[str]
+    properties: NotRequired[List[PropertyInfo]]
+    methods: NotRequired[List[MethodInfo]]
+    source: NotRequired[SourceChunk]
+    related: NotRequired[List[RelatedModule]]
+
+
+class SearchMatch(ModuleRef):
+    score: float
+    hits: int
+
+
+class SearchResult(TypedDict):
+    query: str
+    partial: bool
+    total: int
+    offset: int
+    matches: List[SearchMatch]
+    next_offset: Optional[int]
+
+
+class WorkflowStep(TypedDict):
+    qualified: str
+    options: List[str]
+    # 工具箱中存在的模块另有 ModuleRef 的其余字段
+    name: NotRequired[str]
+    category: NotRequired[str]
+    kind: NotRequired[str]
+    summary: NotRequired[str]
+    uri: NotRequired[str]
+
+
+class WorkflowDemo(TypedDict):
+    name: str
+    line: int
+
+
+class Workflow(TypedDict):
+    score: float
+    demos: List[WorkflowDemo]
+    steps: List[WorkflowStep]
+
+
+class WorkflowResult(TypedDict):
+    task: str
+    workflows: List[Workflow]
+
+
+class MissingModule(TypedDict):
+    name: str
+    suggestions: List[str]
+
+
+class BatchResult(TypedDict):
+    modules: List[ModuleResult]
+    missing: List[MissingModule]
+    source_omitted: NotRequired[List[str]]  # 超出源代码总预算、未包含源代码的模块
+
+
+class MemberText(TypedDict):
+    name: str
+    text: str
+
+
+class MemberChange(TypedDict):
+    name: str
+    before: str
+    after: str
+
+
+class MemberDiff(TypedDict):
+    only1: List[MemberText]
+    only2: List[MemberText]
+    changed: List[MemberChange]
+    same: List[str]
+
+
+class ComparedModule(ModuleRef):
+    toolbox: str
+
+
+class SubclassRelation(TypedDict):
+    child: str
+    ancestor: str
+
+
+class CompareResult(TypedDict):
+    modules: List[ComparedModule]
+    subclass: Optional[SubclassRelation]
+    shared_ancestors: List[str]
+    signatures: Optional[List[str]]
+    properties: MemberDiff
+    methods: MemberDiff
+    help_diff: List[str]
+
+
+class SourceResult(TypedDict):
+    module: ModuleRef
+    source: SourceChunk
+
+
+class SectionResult(SourceResult):
+    section: str
+    kind: str
+
+
+class ClassRef(TypedDict):
+    qualified: str
+    external: bool  # 工具箱外的类只有 qualified 和 external
+    name: NotRequired[str]
+    category: NotRequired[str]
+    kind: NotRequired[str]
+    summary: NotRequired[str]
+    uri: NotRequired[str]
+
+
+class ClassDepth(ClassRef):
+    depth: int
+
+
+class InheritedMember(TypedDict):
+    name: str
+    defined_in: str
+
+
+# 'class' 是关键字，以下类型使用函数式写法
+AncestorsResult = TypedDict('AncestorsResult', {'class': str, 'ancestors': List[ClassDepth]})
+DescendantsResult = TypedDict('DescendantsResult', {'class': str, 'total': int, 'descendants': List[ClassDepth]})
+InheritedMembersResult = TypedDict('InheritedMembersResult', {
+    'class': str,
+    'external_ancestors': List[str],
+    'properties': List[InheritedMember],
+    'methods': List[InheritedMember],
+})
+
+
+class ReferenceSite(TypedDict):
+    line: int
+    name: str
+
+
+class ReferenceFile(TypedDict):
+    kind: str  # 'demo' 或 'module'
+    demo: NotRequired[str]
+    module: NotRequired[str]
+    sites: List[ReferenceSite]
+
+
+class ReferencesResult(TypedDict):
+    symbol: str
+    total_files: int
+    total: int
+    files: List[ReferenceFile]
+
+
+class ToolboxInfo(TypedDict):
+    name: str
+    default: bool
+    path: str
+    built: bool
+    building: bool
+    modules: Optional[int]
+    demos: Optional[int]
+
+
+class ToolboxesResult(TypedDict):
+    toolboxes: List[ToolboxInfo]
+    shared_files: Optional[int]
+
+
+class CacheStats(TypedDict):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    capacity: int
+    hit_rate: float
+
+
+class HandlerStats(TypedDict):
+    kind: str
+    calls: int
+    errors: int
+    total_ms: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    bytes_read: int
+    files_opened: int
+    response_bytes: int
+
+
+class ServerStats(TypedDict):
+    time: float
+    uptime_s: float
+    handlers: Dict[str, HandlerStats]
+
+
+def structured(output_format: str) -> bool:
+    """本次调用是否返回结构化结果；参数留空时使用 NIRS_MCP_OUTPUT"""
+    return (output_format or OUTPUT_FORMAT).strip().lower() == 'json'
+
+
+def error_result(message: str, as_json: bool, **details) -> str | ErrorResult:
+    """错误结果：markdown 模式为 ❌ 提示，结构化模式为 {'error': ..., ...}"""
+    return {'error': message, **details} if as_json else f"❌ {message}"
+
+
+def module_ref(record: Dict) -> ModuleRef:
+    """模块的结构化摘要（搜索结果、批量查询、推荐等共用）"""
+    return {
+        'name': record['name'],
+        'qualified': record['qualified'],
+        'category': record['category'],
+        'kind': record['kind'],
+        'summary': record['summary'],
+        'uri': f"module://{record['category']}/{record['name']}",
+    }
+
+
+def class_ref(index: Dict, qualified: str) -> ClassRef:
+    """继承图中类的结构化表示；工具箱外的类只有 qualified"""
+    lookups = index['lookups']
+    rel = lookups['graph']['by_qualified'].get(qualified)
+    if rel is None:
+        return {'qualified': qualified, 'external': True}
+    return {**module_ref(lookups['modules'][rel]), 'external': False}
+
+
+def source_object(chunk: Dict) -> SourceChunk:
+    """源代码分段的结构化表示，附带剩余字节数和续读 cursor"""
+    limit = chunk.get('limit_offset', chunk['total_bytes'])
+    return {
+        'text': chunk['text'],
+        'start_line': chunk['start_line'],
+        'end_line': chunk['end_line'],
+        'offset': chunk['offset'],
+        'next_offset': chunk['next_offset'],
+        'total_bytes': chunk['total_bytes'],
+        'remaining_bytes': max(limit - chunk['next_offset'], 0) if chunk['next_cursor'] else 0,
+        'next_cursor': chunk['next_cursor'],
+    }
+
+
+BATCH_FIELDS = ('description', 'properties', 'methods', 'source')
+BATCH_DEFAULT_FIELDS = ('description', 'properties', 'methods')
+BATCH_MIN_SOURCE_BYTES = 256  # 每个模块至少分到的源代码字节数（read_source_chunk 的下限）
+
+
+def module_object(record: Dict, info: Dict, fields=BATCH_FIELDS, source_chunk: Dict = None) -> ModuleResult:
+    """由索引记录和缓存的解析结果构建模块对象，只包含选定的字段"""
+    result = module_ref(record)
+    result['path'] = str(record['path'])
+    if info['type'] == 'class':
+        result['parent_classes'] = info.get('parent_classes', [])
+    else:
+        result['signature'] = info.get('signature', '')
+    if 'description' in fields:
+        result['description'] = info['description']
+    if 'properties' in fields and info['type'] == 'class':
+        result['properties'] = [dict(prop) for prop in info.get('properties_detailed', [])]
+    if 'methods' in fields and info['type'] == 'class':
+        result['methods'] = [dict(method, signature=method_signature(method))
+                             for method in info.get('methods_detailed', [])]
+    if source_chunk:
+        result['source'] = source_object(source_chunk)
+    return result
+
 
 @mcp.tool()
-def search_module(keyword: str) -> str:
+@instrumented("tool")
+async def search_module(keyword: str, mode: str = "and", limit: int = 20, offset: int = 0,
+                        toolbox: str = "", output_format: str = "") -> str | SearchResult | ErrorResult:
     """
-    搜索包含关键词的模块
+    搜索包含关键词的模块（倒排索引 + BM25 相关度排序，模块名命中优先）
     
     Args:
-        keyword: 搜索关键词（如 "filter", "glm", "connectivity"）
+        keyword: 搜索关键词（如 "filter", "glm", "band pass"），多个词默认全部命中；
+                 使用 "OR" 或 "|" 连接表示任一命中（如 "wavelet OR bandpass"）
+        mode: 多词组合方式，"and"（默认）或 "or"
+        limit: 返回结果数量（默认 20）
+        offset: 跳过前 N 个结果，用于翻页（默认 0）
+        toolbox: 工具箱名称（配置了多个工具箱时使用，留空为默认工具箱）
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
     
     Returns:
-        匹配的模块列表
+        按相关度排序的匹配模块列表
     """
-    categories = get_namespace_files(NIRS_NS)
-    results = []
+    index = await get_index_async(toolbox)
+    hits, scores, modules = await run_blocking(query_index, index, keyword, mode.lower())
+    as_json = structured(output_format)
     
-    for cat_name, files in categories.items():
-        for mfile in files:
-            with open(mfile, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            # 搜索关键词（不区分大小写）
-            if keyword.lower() in content.lower() or keyword.lower() in mfile.stem.lower():
-                # 提取简介
-                lines = content.split('\n')
-                description = ""
-                for line in lines[1:10]:
-                    if line.strip().startswith('%'):
-                        description = line.strip().lstrip('%').strip()
-                        break
-                
-                results.append({
-                    'name': mfile.stem,
-                    'category': cat_name,
-                    'description': description,
-                    'path': f"module://{cat_name}/{mfile.stem}"
-                })
-    
-    if not results:
-        return f"❌ 未找到包含 '{keyword}' 的模块"
+    # 只对 top-k 结果排序和格式化
+    limit = max(limit, 1)
+    offset = max(offset, 0)
+    ranked = heapq.nlargest(offset + limit, hits, key=lambda rel: (scores[rel], hits[rel], rel))
+    page = ranked[offset:]
+    
+    if as_json:
+        return {
+            'query': keyword,
+            'partial': not index['built'],
+            'total': len(hits),
+            'offset': offset,
+            'matches': [{**module_ref(modules[rel]), 'score': round(scores[rel], 4), 'hits': hits[rel]}
+                        for rel in page],
+            'next_offset': offset + len(page) if offset + len(page) < len(hits) else None,
+        }
+    
+    if not hits:
+        message = f"❌ 未找到包含 '{keyword}' 的模块"
+        if not index['built']:
+            message += "（索引构建中，结果可能不完整）"
+        return message
     
     output = f"# 🔍 搜索结果：'{keyword}'\n\n"
-    output += f"找到 **{len(results)}** 个匹配的模块：\n\n"
-    
-    # 按类别分组
-    by_category = {}
-    for r in results:
-        if r['category'] not in by_category:
-            by_category[r['category']] = []
-        by_category[r['category']].append(r)
-    
-    for cat, items in sorted(by_category.items()):
-        output += f"## nirs.{cat}\n\n"
-        for item in items[:10]:  # 每个类别最多显示10个
-            output += f"### {item['name']}\n"
-            if item['description']:
-                output += f"{item['description']}\n"
-            output += f"- 查看详情：`{item['path']}`\n\n"
+    if not index['built']:
+        output += "⏳ 索引构建中，以下为已完成部分的结果\n\n"
+    output += f"找到 **{len(hits)}** 个匹配的模块"
+    if page:
+        output += f"，按相关度显示第 {offset + 1}-{offset + len(page)} 个：\n\n"
+    else:
+        output += f"，offset={offset} 超出结果范围\n\n"
+    
+    for rank, rel in enumerate(page, offset + 1):
+        record = modules[rel]
+        output += f"### {rank}. {record['name']}（nirs.{record['category']}，"
+        output += f"相关度 {scores[rel]:.2f}，命中 {hits[rel]} 次）\n"
+        if record.get('summary'):
+            output += f"{record['summary']}\n"
+        output += f"- 查看详情：`module://{record['category']}/{record['name']}`\n\n"
+    
+    if offset + len(page) < len(hits):
+        output += f"*... 还有 {len(hits) - offset - len(page)} 个结果，"
+        output += f"使用 `search_module(\"{keyword}\", offset={offset + len(page)})` 查看*\n"
     
     return output
 
 
 @mcp.tool()
-def find_workflow(task: str) -> str:
+@instrumented("tool")
+async def find_workflow(task: str, limit: int = 3, toolbox: str = "", output_format: str = "") -> str | WorkflowResult:
     """
-    查找适合特定任务的工作流
+    查找适合特定任务的工作流（从 demos 中的流水线提取）
     
     Args:
         task: 任务描述（如 "preprocessing", "glm analysis", "connectivity"）
+        limit: 最多返回的工作流数
+        toolbox: 工具箱名称（配置了多个工具箱时使用，留空为默认工具箱）
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
     
     Returns:
         推荐的模块和工作流
     """
-    # 定义常见工作流
-    workflows = {
-        'preprocessing': {
-            'description': 'fNIRS数据预处理流程',
-            'modules': [
-                ('modules', 'BandPassFilter', '带通滤波'),
-                ('modules', 'OpticalDensity', '转换为光密度'),
-                ('modules', 'BeerLambertLaw', '转换为HbO/HbR'),
-                ('modules', 'AR_IRLS', 'AR-IRLS统计分析'),
-            ]
-        },
-        'glm': {
-            'description': 'GLM一般线性模型分析',
-            'modules': [
-                ('modules', 'OpticalDensity', '转换为光密度'),
-                ('modules', 'BeerLambertLaw', '转换为HbO/HbR'),
-                ('modules', 'AR_IRLS', 'AR-IRLS回归'),
-                ('modules', 'MixedEffects', '混合效应模型（组分析）'),
-            ]
-        },
-        'connectivity': {
-            'description': '功能连接性分析',
-            'modules': [
-                ('modules', 'BandPassFilter', '带通滤波（0.01-0.1Hz）'),
-                ('modules', 'OpticalDensity', '转换为光密度'),
-                ('modules', 'BeerLambertLaw', '转换为HbO/HbR'),
-                ('modules', 'Connectivity', '计算功能连接'),
-            ]
-        },
-        'image_reconstruction': {
-            'description': '图像重建/源定位',
-            'modules': [
-                ('modules', 'OpticalDensity', '转换为光密度'),
-                ('registration', 'Register', '配准到标准空间'),
-                ('modules', 'ImageReconMFX', 'MFX图像重建'),
-            ]
+    index = await get_index_async(toolbox)
+    lookups = index['lookups']
+    catalog = lookups['workflows']
+    by_qualified = lookups['graph']['by_qualified']
+    matches = match_workflows(index, task, limit)
+    
+    if structured(output_format):
+        def step_object(step: Dict) -> Dict:
+            rel = by_qualified.get(step['module'])
+            module = module_ref(lookups['modules'][rel]) if rel else {'qualified': step['module']}
+            return {**module, 'options': step['options']}
+        
+        return {
+            'task': task,
+            'workflows': [{
+                'score': round(score, 4),
+                'demos': [{'name': demo, 'line': line} for demo, line in entry['demos']],
+                'steps': [step_object(step) for step in entry['steps']],
+            } for entry, score in matches],
         }
-    }
     
-    # 查找匹配的工作流
-    task_lower = task.lower()
-    matched = None
-    for key, workflow in workflows.items():
-        if key in task_lower or any(keyword in task_lower for keyword in key.split('_')):
-            matched = workflow
-            break
+    if not matches:
+        output = f"❌ 未找到匹配 '{task}' 的工作流\n\n"
+        if not catalog['entries']:
+            return output + "示例目录中没有找到 `job = nirs.modules.X(job)` 形式的流水线。\n"
+        output += "💡 示例中的工作流：\n"
+        for entry in catalog['entries'][:10]:
+            demo, _ = entry['demos'][0]
+            names = ' → '.join(module.rsplit('.', 1)[-1] for module in entry['modules'])
+            output += f"- `{demo}`：{names}\n"
+        return output + "\n请尝试使用模块名或示例中的关键词搜索。\n"
     
-    if not matched:
-        return f"""
-❌ 未找到匹配 '{task}' 的工作流
+    output = ""
+    for rank, (entry, _) in enumerate(matches, 1):
+        demo, line = entry['demos'][0]
+        summary = lookups['demos'][demo]['summary'] if demo in lookups['demos'] else ''
+        output += f"# 🔄 工作流 {rank}：{summary or demo}\n\n"
+        output += f"*来源：`demos/{demo}.m` 第 {line} 行"
+        if len(entry['demos']) > 1:
+            output += f"，共 {len(entry['demos'])} 个示例使用"
+        output += "*\n\n## 推荐的处理流程\n\n"
+        
+        for i, step in enumerate(entry['steps'], 1):
+            module = step['module']
+            rel = by_qualified.get(module)
+            record = lookups['modules'][rel] if rel else None
+            desc = record['summary'] if record and record['summary'] else ''
+            output += f"{i}. **{module.rsplit('.', 1)[-1]}**" + (f" - {desc}" if desc else "") + "\n"
+            if record:
+                output += f"   - 查看详情：`module://{record['category']}/{record['name']}`\n"
+            output += "\n"
+        
+        output += "## 💻 示例代码\n\n"
+        output += "```matlab\n"
+        output += "% 创建处理流水线\n"
+        for i, step in enumerate(entry['steps']):
+            output += f"job = {step['module']}(job);\n" if i else f"job = {step['module']}();\n"
+            for option in step['options']:
+                output += f"{option};\n"
+        output += "\n% 运行流水线\n"
+        output += "data = job.run(raw_data);\n"
+        output += "```\n\n"
+    
+    return output
 
-💡 可用的工作流关键词：
-- preprocessing - 预处理
-- glm - GLM统计分析
-- connectivity - 功能连接
-- image_reconstruction - 图像重建
 
-请尝试使用这些关键词搜索。
-"""
+def format_batch_entry(record: Dict, info: Dict, fields: List[str], source_chunk: Dict = None) -> str:
+    """格式化批量查询中单个模块的精简信息，只包含选定的字段"""
+    kind = "类" if info['type'] == 'class' else "函数"
+    output = f"## 📦 {record['qualified']}（{kind}）\n\n"
+    if info.get('parent_class'):
+        output += f"**继承自**: `{info['parent_class']}`\n\n"
+    if info.get('signature'):
+        output += f"**签名**: `{info['signature']}`\n\n"
+    
+    if 'description' in fields and info['description']:
+        output += f"{info['description']}\n\n"
+    
+    if 'properties' in fields and info.get('properties_detailed'):
+        output += "**属性**：\n"
+        for prop in info['properties_detailed']:
+            output += f"- `{prop['name']}`"
+            if prop['default']:
+                output += f" = `{prop['default']}`"
+            if prop['comment']:
+                output += f" - {prop['comment']}"
+            output += "\n"
+        output += "\n"
+    
+    if 'methods' in fields and info.get('methods_detailed'):
+        output += "**方法**：\n"
+        for method in info['methods_detailed']:
+            output += f"- `{method_signature(method)}`"
+            if method['comment']:
+                output += f" - {method['comment'].splitlines()[0]}"
+            output += "\n"
+        output += "\n"
+    
+    if source_chunk:
+        output += format_source_chunk(source_chunk, record['name'])
+    
+    return output
+
+
+@mcp.tool()
+@instrumented("tool")
+async def get_modules_batch(names: List[str], fields: Optional[List[str]] = None,
+                            max_bytes: int = SOURCE_MAX_BYTES, toolbox: str = "",
+                            output_format: str = "") -> str | BatchResult | ErrorResult:
+    """
+    一次查询多个模块（如一条流水线中的全部模块），只返回选定的字段
+    
+    Args:
+        names: 模块名列表（如 ["OpticalDensity", "BeerLambertLaw", "AR_IRLS"]）
+        fields: 要包含的字段：description、properties、methods、source，留空为前三项
+        max_bytes: 源代码总字节预算，平均分配给各模块（仅 fields 包含 source 时生效）；
+                   每个模块至少分到 256 字节，预算不足时排在后面的模块不包含源代码
+        toolbox: 工具箱名称（配置了多个工具箱时使用，留空为默认工具箱）
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
+    
+    Returns:
+        各模块的精简信息，以及未找到的模块名
+    """
+    as_json = structured(output_format)
+    fields = BATCH_DEFAULT_FIELDS if fields is None else fields
+    unknown = [field for field in fields if field not in BATCH_FIELDS]
+    if unknown:
+        return error_result(f"未知字段：{', '.join(unknown)}。可选字段：{', '.join(BATCH_FIELDS)}", as_json)
+    
+    # 一次性在索引中解析全部模块名（去重并保持顺序）
+    index = await get_index_async(toolbox)
+    unique = list(dict.fromkeys(names))
+    resolved = await asyncio.gather(*(resolve_module_async(index, name) for name in unique))
+    records = [record for record in resolved if record]
+    missing = [name for name, record in zip(unique, resolved) if not record]
+    
+    # 源代码总预算：平均分配；每个模块分不到下限时只给前面的模块
+    with_source = []
+    if 'source' in fields and records:
+        with_source = records[:min(len(records), max(max_bytes, 0) // BATCH_MIN_SOURCE_BYTES)]
+    per_module = max_bytes // len(with_source) if with_source else 0
     
-    output = f"# 🔄 工作流：{matched['description']}\n\n"
-    output += "## 推荐的处理流程\n\n"
+    # 并发读取和解析
+    infos = await asyncio.gather(*(run_blocking(load_module_info, record) for record in records))
+    chunks = await asyncio.gather(*(run_blocking(read_source_chunk, record, max_bytes=per_module)
+                                    for record in with_source))
+    chunks += [None] * (len(records) - len(chunks))
+    omitted = [record['name'] for record in records[len(with_source):]] if 'source' in fields else []
     
-    for i, (cat, module, desc) in enumerate(matched['modules'], 1):
-        output += f"{i}. **{module}** - {desc}\n"
-        output += f"   - 查看详情：`module://{cat}/{module}`\n\n"
+    if as_json:
+        result = {
+            'modules': [module_object(record, info, fields, chunk)
+                        for record, info, chunk in zip(records, infos, chunks)],
+            'missing': [{'name': name, 'suggestions': [c for c, _ in suggest_module_names(index, name)]}
+                        for name in missing],
+        }
+        if 'source' in fields:
+            result['source_omitted'] = omitted
+        return result
+    
+    output = f"# 📚 批量查询（{len(records)}/{len(unique)} 个模块）\n\n"
+    for record, info, chunk in zip(records, infos, chunks):
+        output += format_batch_entry(record, info, fields, chunk)
     
-    output += "## 💻 示例代码\n\n"
-    output += "```matlab\n"
-    output += "% 创建处理流水线\n"
-    for cat, module, _ in matched['modules']:
-        output += f"job = nirs.{cat}.{module}(job);\n"
-    output += "\n% 运行流水线\n"
-    output += "data = job.run(raw_data);\n"
-    output += "```\n"
+    if omitted:
+        output += f"*源代码超出 {max_bytes} 字节预算，未包含：" + ", ".join(f"`{name}`" for name in omitted)
+        output += "。使用 `get_module_source` 单独读取*\n\n"
     
+    if missing:
+        output += "## ❌ 未找到\n\n"
+        for name in missing:
+            suggestions = suggest_module_names(index, name)
+            output += f"- `{name}`"
+            if suggestions:
+                output += "：你是不是要找 " + ", ".join(f"`{candidate}`" for candidate, _ in suggestions)
+            output += "\n"
     return output
 
 
 @mcp.tool()
-def get_module_details(module_name: str, include_source: bool = False) -> str:
+@instrumented("tool")
+async def get_module_details(module_name: str, include_source: bool = False,
+                             max_bytes: int = SOURCE_MAX_BYTES, toolbox: str = "",
+                             output_format: str = "") -> str | ModuleResult | ErrorResult:
     """
     获取模块的完整详细信息
     
     Args:
         module_name: 模块名（如 BandPassFilter）
-        include_source: 是否包含完整源代码（默认 False）
+        include_source: 是否包含源代码（默认 False）
+        max_bytes: 源代码最多返回的字节数，超出部分用 get_module_source 按 cursor 续读
+        toolbox: 工具箱名称（配置了多个工具箱时使用，留空为默认工具箱）
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
     
     Returns:
         模块的完整文档，包括属性、方法、使用示例
     """
-    # 在所有类别中搜索模块
-    categories = get_namespace_files(NIRS_NS)
-    
-    module_path = None
-    category = None
+    # 在索引中查找模块
+    index = await get_index_async(toolbox)
+    record = await resolve_module_async(index, module_name)
+    as_json = structured(output_format)
     
-    for cat_name, files in categories.items():
-        for mfile in files:
-            if mfile.stem == module_name:
-                module_path = mfile
-                category = cat_name
-                break
-        if module_path:
-            break
+    if not record:
+        return module_not_found(index, module_name, as_json)
     
-    if not module_path:
-        return f"❌ 模块 '{module_name}' 不存在。使用 search_module() 搜索模块。"
-    
-    # 判断是类还是函数
-    with open(module_path, 'r', encoding='utf-8', errors='ignore') as f:
-        first_line = f.readline()
-        content = f.read()
-        full_content = first_line + content
+    category = record['category']
+    if include_source:
+        info, chunk = await asyncio.gather(
+            run_blocking(load_module_info, record),
+            run_blocking(read_source_chunk, record, max_bytes=max_bytes),
+        )
+    else:
+        info, chunk = await run_blocking(load_module_info, record), None
     
-    if 'classdef' in first_line:
-        info = parse_matlab_class(module_path)
-        return format_class_details(info, category, include_source)
+    if record['kind'] == 'class':
+        related = await run_blocking(suggest_related_modules, index, record)
+        if as_json:
+            result = module_object(record, info, source_chunk=chunk)
+            result['related'] = related
+            return result
+        return format_class_details(info, category, chunk, related)
+    elif as_json:
+        return module_object(record, info, source_chunk=chunk)
     else:
-        info = parse_matlab_function(module_path)
-        return format_function_details(info, category, include_source)
+        return format_function_details(info, category, chunk)
 
 
-def format_class_details(info: Dict, category: str, include_source: bool) -> str:
+def format_class_details(info: Dict, category: str, source_chunk: Dict = None, related: List[Dict] = None) -> str:
     """格式化类的详细信息"""
     output = f"# 📦 nirs.{category}.{info['name']}\n\n"
     
@@ -737,7 +3633,6 @@ def format_class_details(info: Dict, category: str, include_source: bool) -> str
     
     # 相关模块推荐
     output += f"## 🔗 相关模块\n\n"
-    related = suggest_related_modules(info['name'], category)
     if related:
         for rel in related:
             output += f"- `{rel['name']}` - {rel['description']}\n"
@@ -745,10 +3640,9 @@ def format_class_details(info: Dict, category: str, include_source: bool) -> str
         output += f"*使用 `search_module()` 查找相关模块*\n"
     output += "\n"
     
-    # 完整源代码（可选）
-    if include_source:
-        output += f"## 📝 完整源代码\n\n"
-        output += f"```matlab\n{info['full_code']}\n```\n\n"
+    # 源代码（可选，按字节预算分段）
+    if source_chunk:
+        output += format_source_chunk(source_chunk, info['name'])
     else:
         output += f"## 📝 源代码\n\n"
         output += f"*使用 `get_module_details(\"{info['name']}\", include_source=True)` 查看完整源代码*\n\n"
@@ -762,7 +3656,7 @@ def format_class_details(info: Dict, category: str, include_source: bool) -> str
     return output
 
 
-def format_function_details(info: Dict, category: str, include_source: bool) -> str:
+def format_function_details(info: Dict, category: str, source_chunk: Dict = None) -> str:
     """格式化函数的详细信息"""
     output = f"# 🔧 nirs.{category}.{info['name']}\n\n"
     
@@ -785,102 +3679,593 @@ def format_function_details(info: Dict, category: str, include_source: bool) ->
     output += f"result = nirs.{category}.{info['name']}(...);\n"
     output += f"```\n\n"
     
-    # 完整源代码
-    if include_source:
-        output += f"## 📝 完整源代码\n\n"
-        output += f"```matlab\n{info['full_code']}\n```\n\n"
+    # 源代码（按字节预算分段）
+    if source_chunk:
+        output += format_source_chunk(source_chunk, info['name'])
     
     return output
 
 
-def suggest_related_modules(module_name: str, category: str) -> List[Dict]:
-    """根据模块名推荐相关模块"""
-    # 预定义的相关模块映射
-    related_map = {
-        'BandPassFilter': [
-            {'name': 'WaveletFilter', 'description': '小波滤波（适合运动伪迹）'},
-            {'name': 'BaselinePCAFilter', 'description': 'PCA基线滤波'},
-            {'name': 'OpticalDensity', 'description': '光密度转换（滤波前必需）'},
-        ],
-        'OpticalDensity': [
-            {'name': 'BandPassFilter', 'description': '带通滤波（下一步）'},
-            {'name': 'BeerLambertLaw', 'description': 'Beer-Lambert转换'},
-        ],
-        'BeerLambertLaw': [
-            {'name': 'OpticalDensity', 'description': '光密度转换（前一步）'},
-            {'name': 'AR_IRLS', 'description': 'GLM统计分析（下一步）'},
-        ],
-        'AR_IRLS': [
-            {'name': 'MixedEffects', 'description': '组水平分析'},
-            {'name': 'GLM', 'description': 'GLM模型'},
-        ],
-        'WaveletFilter': [
-            {'name': 'BandPassFilter', 'description': '带通滤波'},
-            {'name': 'TDDR', 'description': '时域导数分布修正'},
-        ],
-    }
+RELATED_REASONS = {'demo': '示例流水线中前后使用', 'parent': '继承关系相近', 'text': '说明文本相似'}
+
+
+def suggest_related_modules(index: Dict, record: Dict) -> List[Dict]:
+    """从预计算的近邻表中取相关模块（示例流水线共现、共同父类、说明文本相似度）"""
+    modules = index['lookups']['modules']
+    related = []
+    for rel, score, reasons in get_related_table(index).get(record['rel'], []):
+        other = modules.get(rel)
+        if other is None:
+            continue
+        reason = '、'.join(RELATED_REASONS[r] for r in reasons)
+        description = f"{other['summary']}（{reason}）" if other['summary'] else reason
+        related.append({'name': other['name'], 'qualified': other['qualified'], 'description': description,
+                        'score': score, 'reasons': list(reasons)})
+    return related
+
+
+HELP_DIFF_MAX_LINES = 60  # 帮助注释 diff 最多显示的行数
+
+
+def method_signature(method: Dict) -> str:
+    """方法签名文本：[返回值] = 名称(参数)"""
+    returns = f"{method['returns']} = " if method['returns'] else ""
+    return f"{returns}{method['name']}({method['params']})"
+
+
+def diff_modules(index: Dict, record1: Dict, info1: Dict, record2: Dict, info2: Dict,
+                 index2: Dict = None) -> Dict:
+    """
+    由解析结果计算两个模块的结构差异；index2 为第二个模块所在工具箱的索引（默认与 index 相同）
+    
+    Returns:
+        {'properties': {'only1', 'only2', 'changed', 'same'}, 'methods': {...},
+         'signatures': (签名1, 签名2) 或 None, 'shared_ancestors': [...],
+         'subclass': (子类, 祖先类) 或 None, 'help_diff': [...]}
+    """
+    def members(info: Dict, key: str, describe) -> Dict[str, str]:
+        return {item['name']: describe(item) for item in info.get(key, [])}
+    
+    def compare(left: Dict[str, str], right: Dict[str, str]) -> Dict:
+        common = [name for name in left if name in right]
+        return {
+            'only1': [(name, left[name]) for name in left if name not in right],
+            'only2': [(name, right[name]) for name in right if name not in left],
+            'changed': [(name, left[name], right[name]) for name in common if left[name] != right[name]],
+            'same': [name for name in common if left[name] == right[name]],
+        }
+    
+    def describe_property(prop: Dict) -> str:
+        text = prop['name']
+        if prop['validation']:
+            text += f" {prop['validation']}"
+        if prop['default']:
+            text += f" = {prop['default']}"
+        return text
     
-    return related_map.get(module_name, [])
+    ancestors1 = [name for name, _ in class_ancestors(index, record1['qualified'])]
+    ancestors2 = [name for name, _ in class_ancestors(index2 or index, record2['qualified'])]
+    shared = [name for name in ancestors1 if name in ancestors2]
+    if record2['qualified'] in ancestors1:
+        relation = (record1['qualified'], record2['qualified'])
+    elif record1['qualified'] in ancestors2:
+        relation = (record2['qualified'], record1['qualified'])
+    else:
+        relation = None
+    
+    label1, label2 = record1['qualified'], record2['qualified']
+    if index2 is not None and index2 is not index:
+        label1, label2 = f"{label1} ({index['name']})", f"{label2} ({index2['name']})"
+    help_diff = list(difflib.unified_diff(
+        info1['description'].splitlines(), info2['description'].splitlines(),
+        fromfile=label1, tofile=label2, lineterm='', n=1))
+    
+    signatures = None
+    if info1['type'] == 'function' or info2['type'] == 'function':
+        signatures = (info1.get('signature', ''), info2.get('signature', ''))
+    
+    return {
+        'properties': compare(members(info1, 'properties_detailed', describe_property),
+                              members(info2, 'properties_detailed', describe_property)),
+        'methods': compare(members(info1, 'methods_detailed', method_signature),
+                           members(info2, 'methods_detailed', method_signature)),
+        'signatures': signatures,
+        'shared_ancestors': shared,
+        'subclass': relation,
+        'help_diff': help_diff,
+    }
+
+
+def format_member_diff(title: str, diff: Dict, name1: str, name2: str) -> str:
+    """格式化属性或方法的差异；两边都没有成员时返回空字符串"""
+    if not (diff['only1'] or diff['only2'] or diff['changed'] or diff['same']):
+        return ""
+    output = f"## {title}\n\n"
+    if diff['only1']:
+        output += f"**仅 {name1}**：" + ", ".join(f"`{text}`" for _, text in diff['only1']) + "\n\n"
+    if diff['only2']:
+        output += f"**仅 {name2}**：" + ", ".join(f"`{text}`" for _, text in diff['only2']) + "\n\n"
+    if diff['changed']:
+        output += "**不同**：\n"
+        for _, left, right in diff['changed']:
+            output += f"- `{left}` → `{right}`\n"
+        output += "\n"
+    if diff['same']:
+        output += f"**相同**（{len(diff['same'])} 个）：" + ", ".join(f"`{name}`" for name in diff['same']) + "\n\n"
+    return output
 
 
 @mcp.tool()
-def compare_modules(name1: str, name2: str) -> str:
+@instrumented("tool")
+async def compare_modules(name1: str, name2: str, toolbox: str = "", toolbox2: str = "",
+                          output_format: str = "") -> str | CompareResult | ErrorResult:
     """
-    对比两个模块
+    对比两个模块的结构差异
     
     Args:
         name1: 第一个模块名
         name2: 第二个模块名
+        toolbox: 工具箱名称（配置了多个工具箱时使用，留空为默认工具箱）
+        toolbox2: 第二个模块所在的工具箱，留空时与 toolbox 相同（可对比不同版本中的同名模块）
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
     
     Returns:
-        两个模块的对比分析
-    """
-    # 在所有类别中搜索
-    categories = get_namespace_files(NIRS_NS)
-    
-    module1_path = None
-    module2_path = None
-    cat1 = None
-    cat2 = None
-    
-    for cat_name, files in categories.items():
-        for mfile in files:
-            if mfile.stem == name1:
-                module1_path = mfile
-                cat1 = cat_name
-            if mfile.stem == name2:
-                module2_path = mfile
-                cat2 = cat_name
-    
-    if not module1_path:
-        return f"❌ 模块 '{name1}' 不存在"
-    if not module2_path:
-        return f"❌ 模块 '{name2}' 不存在"
-    
-    # 解析两个模块
-    with open(module1_path, 'r', encoding='utf-8', errors='ignore') as f:
-        code1 = f.read()
-    with open(module2_path, 'r', encoding='utf-8', errors='ignore') as f:
-        code2 = f.read()
+        属性（含默认值）和方法签名的差异、共同祖先类、帮助注释的 unified diff
+    """
+    # 在索引中查找
+    index = await get_index_async(toolbox)
+    index2 = await get_index_async(toolbox2) if toolbox2 else index
+    record1 = await resolve_module_async(index, name1)
+    record2 = await resolve_module_async(index2, name2)
+    as_json = structured(output_format)
+    
+    if not record1:
+        return module_not_found(index, name1, as_json)
+    if not record2:
+        return module_not_found(index2, name2, as_json)
+    
+    # 并发解析两个模块（命中缓存时不读文件）
+    info1, info2 = await asyncio.gather(
+        run_blocking(load_module_info, record1),
+        run_blocking(load_module_info, record2),
+    )
+    diff = diff_modules(index, record1, info1, record2, info2, index2)
+    
+    if as_json:
+        def members(member_diff: Dict) -> Dict:
+            return {
+                'only1': [{'name': name, 'text': text} for name, text in member_diff['only1']],
+                'only2': [{'name': name, 'text': text} for name, text in member_diff['only2']],
+                'changed': [{'name': name, 'before': left, 'after': right}
+                            for name, left, right in member_diff['changed']],
+                'same': member_diff['same'],
+            }
+        
+        subclass = diff['subclass']
+        return {
+            'modules': [{**module_ref(record), 'toolbox': idx['name']}
+                        for idx, record in ((index, record1), (index2, record2))],
+            'subclass': {'child': subclass[0], 'ancestor': subclass[1]} if subclass else None,
+            'shared_ancestors': diff['shared_ancestors'],
+            'signatures': list(diff['signatures']) if diff['signatures'] else None,
+            'properties': members(diff['properties']),
+            'methods': members(diff['methods']),
+            'help_diff': diff['help_diff'],
+        }
     
     output = f"# 🔄 模块对比：{name1} vs {name2}\n\n"
-    output += f"## 模块 1: nirs.{cat1}.{name1}\n\n"
-    output += f"```matlab\n{code1[:500]}...\n```\n\n"
-    output += f"## 模块 2: nirs.{cat2}.{name2}\n\n"
-    output += f"```matlab\n{code2[:500]}...\n```\n\n"
-    output += "## 💡 请AI分析\n\n"
-    output += "请帮我对比这两个模块的：\n"
-    output += "1. 功能差异\n"
-    output += "2. 适用场景\n"
-    output += "3. 参数设置\n"
-    output += "4. 优缺点\n"
-    output += "5. 使用建议\n"
+    for i, (idx, record, info) in enumerate(((index, record1, info1), (index2, record2, info2)), 1):
+        kind = "类" if info['type'] == 'class' else "函数"
+        if index2 is not index:
+            kind += f"，工具箱 {idx['name']}"
+        output += f"- **模块 {i}**: `{record['qualified']}`（{kind}）"
+        if record['summary']:
+            output += f" - {record['summary']}"
+        output += "\n"
+    output += "\n"
+    
+    if diff['subclass'] or diff['shared_ancestors']:
+        output += "## 🧬 继承关系\n\n"
+        if diff['subclass']:
+            output += f"`{diff['subclass'][0]}` 继承自 `{diff['subclass'][1]}`\n\n"
+        if diff['shared_ancestors']:
+            output += "共同祖先类：" + ", ".join(f"`{name}`" for name in diff['shared_ancestors']) + "\n\n"
+    
+    if diff['signatures']:
+        output += "## ✍️ 函数签名\n\n"
+        output += f"- {name1}: `{diff['signatures'][0] or '（无）'}`\n"
+        output += f"- {name2}: `{diff['signatures'][1] or '（无）'}`\n\n"
+    
+    output += format_member_diff("⚙️ 属性", diff['properties'], name1, name2)
+    output += format_member_diff("🔧 方法", diff['methods'], name1, name2)
+    
+    output += "## 📄 说明差异\n\n"
+    if not diff['help_diff']:
+        output += "帮助注释相同。\n"
+    else:
+        lines = diff['help_diff'][:HELP_DIFF_MAX_LINES]
+        output += "```diff\n" + "\n".join(lines) + "\n```\n"
+        if len(diff['help_diff']) > HELP_DIFF_MAX_LINES:
+            output += f"\n*diff 共 {len(diff['help_diff'])} 行，仅显示前 {HELP_DIFF_MAX_LINES} 行*\n"
+    
+    return output
+
+
+@mcp.tool()
+@instrumented("tool")
+async def get_module_source(module_name: str, cursor: str = "", start_line: int = 0, end_line: int = 0,
+                            max_bytes: int = SOURCE_MAX_BYTES, toolbox: str = "",
+                            output_format: str = "") -> str | SourceResult | ErrorResult:
+    """
+    分段读取模块源代码（适合大文件，避免一次返回全部代码）
+    
+    Args:
+        module_name: 模块名（如 AR_IRLS）
+        cursor: 上一次返回的续读 cursor，留空表示从头（或 start_line）开始
+        start_line: 起始行号（1 起始，0 表示从第 1 行开始）
+        end_line: 结束行号（包含，0 表示读到文件末尾或字节上限）
+        max_bytes: 本次最多返回的字节数
+        toolbox: 工具箱名称（配置了多个工具箱时使用，留空为默认工具箱）
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
+    
+    Returns:
+        源代码片段，以及继续读取所需的 cursor
+    """
+    index = await get_index_async(toolbox)
+    record = await resolve_module_async(index, module_name)
+    as_json = structured(output_format)
+    if not record:
+        return module_not_found(index, module_name, as_json)
+    
+    try:
+        chunk = await run_blocking(read_source_chunk, record, cursor, start_line, end_line, max_bytes)
+    except ValueError as e:
+        return error_result(str(e), as_json)
+    
+    if as_json:
+        return {'module': module_ref(record), 'source': source_object(chunk)}
+    
+    output = f"# 📝 nirs.{record['category']}.{record['name']}\n\n"
+    output += format_source_chunk(chunk, record['name'])
+    return output
+
+
+async def format_module_section(record: Dict, section: str, max_bytes: int = SOURCE_MAX_BYTES,
+                                as_json: bool = False) -> str | SectionResult | ErrorResult:
+    """读取并格式化模块的单个分段；分段不存在时列出可用分段"""
+    sections, stat = await run_blocking(current_sections, record)
+    name, span = find_section(sections, section)
+    if span is None:
+        if as_json:
+            return {'error': f"模块 '{record['name']}' 中没有分段 '{section}'", 'sections': list(sections)}
+        available = ', '.join(f"`{n}`" for n in sections) or '无'
+        return f"❌ 模块 '{record['name']}' 中没有分段 '{section}'。可用分段：{available}"
+    
+    try:
+        chunk = await run_blocking(read_section_chunk, record, span, stat, max_bytes)
+    except ValueError as e:
+        return error_result(str(e), as_json)
+    
+    if as_json:
+        return {'module': module_ref(record), 'section': name, 'kind': span['kind'],
+                'source': source_object(chunk)}
+    
+    output = f"# 📝 nirs.{record['category']}.{record['name']}#{name}\n\n"
+    output += format_source_chunk(chunk, record['name'], title=f"{span['kind']} `{name}`")
+    return output
+
+
+@mcp.tool()
+@instrumented("tool")
+async def get_module_section(module_name: str, section: str, max_bytes: int = SOURCE_MAX_BYTES,
+                             toolbox: str = "", output_format: str = "") -> str | SectionResult | ErrorResult:
+    """
+    只读取模块源码中的一个分段（如某个方法体），不返回整个文件
+    
+    Args:
+        module_name: 模块名（如 AR_IRLS）
+        section: 分段名：方法/函数名（如 runThis），`help`（帮助注释），
+                 `properties`、`properties_2` ...（属性块），`events`、`enumeration`
+        max_bytes: 本次最多返回的字节数，超出时返回续读 cursor
+        toolbox: 工具箱名称（配置了多个工具箱时使用，留空为默认工具箱）
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
+    
+    Returns:
+        分段源代码；分段不存在时列出可用分段
+    """
+    index = await get_index_async(toolbox)
+    record = await resolve_module_async(index, module_name)
+    as_json = structured(output_format)
+    if not record:
+        return module_not_found(index, module_name, as_json)
+    
+    return await format_module_section(record, section, max_bytes, as_json)
+
+
+def format_class_ref(index: Dict, qualified: str) -> str:
+    """格式化继承图中的类名：工具箱内的类附带简介，外部类标注"""
+    lookups = index['lookups']
+    rel = lookups['graph']['by_qualified'].get(qualified)
+    if rel is None:
+        return f"`{qualified}`（工具箱外）"
+    summary = lookups['modules'][rel]['summary']
+    return f"`{qualified}`" + (f" - {summary}" if summary else "")
+
+
+@mcp.tool()
+@instrumented("tool")
+async def get_ancestors(module_name: str, toolbox: str = "", output_format: str = "") -> str | AncestorsResult | ErrorResult:
+    """
+    查询类的全部祖先类（沿继承链向上）
+    
+    Args:
+        module_name: 模块名（如 AR_IRLS）或完整包名（如 nirs.modules.AR_IRLS）
+        toolbox: 工具箱名称（配置了多个工具箱时使用，留空为默认工具箱）
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
+    
+    Returns:
+        按成员查找顺序排列的祖先类及层级
+    """
+    index = await get_index_async(toolbox)
+    record = await resolve_class_async(index, module_name)
+    as_json = structured(output_format)
+    if not record:
+        return module_not_found(index, module_name, as_json)
+    
+    ancestors = class_ancestors(index, record['qualified'])
+    if as_json:
+        return {'class': record['qualified'],
+                'ancestors': [{**class_ref(index, name), 'depth': depth} for name, depth in ancestors]}
+    output = f"# ⬆️ {record['qualified']} 的祖先类\n\n"
+    if not ancestors:
+        return output + "没有父类。\n"
+    for name, depth in ancestors:
+        output += f"{'  ' * (depth - 1)}- {format_class_ref(index, name)}\n"
+    return output
+
+
+@mcp.tool()
+@instrumented("tool")
+async def get_descendants(module_name: str, limit: int = 100, toolbox: str = "",
+                          output_format: str = "") -> str | DescendantsResult | ErrorResult:
+    """
+    查询类的全部子类（沿继承链向下，包括间接子类）
+    
+    Args:
+        module_name: 模块名（如 AbstractModule）或完整包名（如 nirs.modules.AbstractModule）
+        limit: 最多返回的子类数
+        toolbox: 工具箱名称（配置了多个工具箱时使用，留空为默认工具箱）
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
+    
+    Returns:
+        按层级排列的子类列表
+    """
+    index = await get_index_async(toolbox)
+    record = await resolve_class_async(index, module_name)
+    qualified = record['qualified'] if record else module_name
+    as_json = structured(output_format)
+    if not record and qualified not in index['lookups']['graph']['children']:
+        return module_not_found(index, module_name, as_json)
+    
+    descendants = class_descendants(index, qualified)
+    if as_json:
+        return {'class': qualified, 'total': len(descendants),
+                'descendants': [{**class_ref(index, name), 'depth': depth}
+                                for name, depth in descendants[:max(limit, 0)]]}
+    output = f"# ⬇️ {qualified} 的子类（共 {len(descendants)} 个）\n\n"
+    if not descendants:
+        return output + "没有子类。\n"
+    for name, depth in descendants[:max(limit, 0)]:
+        output += f"- [{depth}] {format_class_ref(index, name)}\n"
+    if len(descendants) > limit:
+        output += f"\n*还有 {len(descendants) - limit} 个子类未显示，增大 `limit` 查看*\n"
+    return output
+
+
+@mcp.tool()
+@instrumented("tool")
+async def get_inherited_members(module_name: str, toolbox: str = "", output_format: str = "") -> str | InheritedMembersResult | ErrorResult:
+    """
+    沿继承链解析类的全部属性和方法（含继承自父类的成员）
+    
+    Args:
+        module_name: 模块名（如 AR_IRLS）或完整包名
+        toolbox: 工具箱名称（配置了多个工具箱时使用，留空为默认工具箱）
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
+    
+    Returns:
+        属性和方法列表，标明各成员定义所在的类
+    """
+    index = await get_index_async(toolbox)
+    record = await resolve_class_async(index, module_name)
+    as_json = structured(output_format)
+    if not record:
+        return module_not_found(index, module_name, as_json)
+    
+    qualified = record['qualified']
+    members = inherited_members(index, qualified)
+    external = [name for name, _ in class_ancestors(index, qualified)
+                if name not in index['lookups']['graph']['by_qualified']]
+    if as_json:
+        result = {'class': qualified, 'external_ancestors': external}
+        for kind in ('properties', 'methods'):
+            result[kind] = [{'name': name, 'defined_in': owner} for name, owner in members[kind]]
+        return result
+    
+    output = f"# 🧬 {qualified} 的全部成员\n\n"
+    for title, kind in (("⚙️ 属性", 'properties'), ("🔧 方法", 'methods')):
+        output += f"## {title}（{len(members[kind])} 个）\n\n"
+        for name, owner in members[kind]:
+            output += f"- `{name}`" + ("" if owner == qualified else f" ← `{owner}`") + "\n"
+        output += "\n"
+    
+    if external:
+        output += "*工具箱外的父类成员未列出：" + ", ".join(f"`{n}`" for n in external) + "*\n"
+    return output
+
+
+@mcp.tool()
+@instrumented("tool")
+async def find_references(symbol: str, limit: int = 50, toolbox: str = "",
+                          output_format: str = "") -> str | ReferencesResult | ErrorResult:
+    """
+    查找引用某个 nirs.* 符号的模块和示例（只统计代码，不含注释和字符串）
+    
+    Args:
+        symbol: 完整限定名（如 nirs.modules.BeerLambertLaw、nirs.core.Data）或模块名
+        limit: 最多列出的文件数
+        toolbox: 工具箱名称（配置了多个工具箱时使用，留空为默认工具箱）
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
+    
+    Returns:
+        引用所在的文件和行号，示例脚本在前
+    """
+    index = await get_index_async(toolbox)
+    if '.' not in symbol:
+        record = await resolve_class_async(index, symbol)
+        if record:
+            symbol = record['qualified']
+    
+    lookups = index['lookups']
+    sites = lookups['references'].get(symbol)
+    as_json = structured(output_format)
+    if not sites:
+        return error_result(f"没有找到对 '{symbol}' 的引用。请使用完整限定名，如 `nirs.modules.BeerLambertLaw`。",
+                            as_json, symbol=symbol)
+    
+    total = sum(len(entries) for entries in sites.values())
+    ordered = sorted(sites.items(), key=lambda item: (item[0][0] != 'demo', item[0][1]))
+    if as_json:
+        files = []
+        for (kind, key), entries in ordered[:max(limit, 0)]:
+            target = {'demo': key} if kind == 'demo' else {'module': lookups['modules'][key]['qualified']}
+            files.append({'kind': kind, **target,
+                          'sites': [{'line': line, 'name': name} for line, name in entries]})
+        return {'symbol': symbol, 'total_files': len(sites), 'total': total, 'files': files}
+    
+    output = f"# 🔗 {symbol} 的引用（{len(sites)} 个文件，共 {total} 处）\n\n"
+    
+    for (kind, key), entries in ordered[:max(limit, 0)]:
+        if kind == 'demo':
+            output += f"### 📓 demos/{key}.m\n"
+        else:
+            output += f"### 📦 {lookups['modules'][key]['qualified']}\n"
+        for line, name in entries:
+            output += f"- 第 {line} 行" + ("" if name == symbol else f"：`{name}`") + "\n"
+        output += "\n"
+    
+    if len(sites) > limit:
+        output += f"*还有 {len(sites) - limit} 个文件未显示，增大 `limit` 查看*\n"
+    return output
+
+
+@mcp.tool()
+@instrumented("tool")
+async def list_toolboxes(output_format: str = "") -> str | ToolboxesResult:
+    """
+    列出服务器加载的所有工具箱（各工具工具的 toolbox 参数取这里的名称）
+    
+    Args:
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
+    
+    Returns:
+        工具箱名称、路径、模块数和示例数
+    """
+    if structured(output_format):
+        return {
+            'toolboxes': [{
+                'name': name,
+                'default': i == 0,
+                'path': str(index['root']),
+                'built': index['built'],
+                'building': index['building'],
+                'modules': len(index['lookups']['modules']) if index['built'] else None,
+                'demos': len(index['lookups']['demos']) if index['built'] else None,
+            } for i, (name, index) in enumerate(TOOLBOXES.items())],
+            'shared_files': len(_CONTENT_STORE) if _CONTENT_STORE is not None else None,
+        }
+    
+    output = "# 🧰 已配置的工具箱\n\n"
+    for i, (name, index) in enumerate(TOOLBOXES.items()):
+        output += f"## {name}" + ("（默认）" if i == 0 else "") + "\n\n"
+        output += f"- 路径：`{index['root']}`\n"
+        lookups = index['lookups']
+        if index['built']:
+            output += f"- 模块：{len(lookups['modules'])} 个，示例：{len(lookups['demos'])} 个\n"
+        elif index['building']:
+            output += f"- 索引构建中（已发布 {len(lookups['modules'])} 个模块）\n"
+        else:
+            output += "- 索引尚未构建（首次使用时构建）\n"
+        output += "\n"
+    
+    if _CONTENT_STORE is not None:
+        output += f"*内容去重：{len(_CONTENT_STORE)} 个不同文件在工具箱之间共享解析结果*\n"
+    return output
+
+
+@mcp.tool()
+@instrumented("tool")
+async def get_cache_stats(output_format: str = "") -> str | CacheStats:
+    """
+    查看模块解析缓存的命中情况
+    
+    Args:
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
+    
+    Returns:
+        缓存容量、当前条目数、命中/未命中/淘汰次数
+    """
+    stats = parse_cache_stats()
+    if structured(output_format):
+        return stats
+    
+    output = "# 📊 解析缓存统计\n\n"
+    output += f"- 容量：{stats['capacity']}（环境变量 `NIRS_MCP_PARSE_CACHE_SIZE`）\n"
+    output += f"- 当前条目：{stats['size']}\n"
+    output += f"- 命中：{stats['hits']}\n"
+    output += f"- 未命中：{stats['misses']}\n"
+    output += f"- 淘汰：{stats['evictions']}\n"
+    output += f"- 命中率：{stats['hit_rate']:.1%}\n"
+    
+    return output
+
+
+@mcp.tool()
+@instrumented("tool")
+async def get_server_stats(output_format: str = "") -> str | ServerStats:
+    """
+    查看各 Tool / Resource 的调用统计，定位耗时的请求
+    
+    Args:
+        output_format: 输出格式：markdown 或 json（结构化结果），留空时使用 NIRS_MCP_OUTPUT
+    
+    Returns:
+        每个处理器的调用次数、错误数、延迟分位数（p50/p95/p99）、读取的字节数和文件数、平均响应大小
+    """
+    snapshot = server_stats_snapshot()
+    if structured(output_format):
+        return snapshot
+    handlers = sorted(snapshot['handlers'].items(), key=lambda item: -item[1]['total_ms'])
+    
+    output = "# 📈 服务器统计\n\n"
+    output += f"- 运行时间：{snapshot['uptime_s']} 秒\n"
+    output += f"- 延迟分位数按每个处理器最近 {STATS_WINDOW} 次调用计算（`NIRS_MCP_STATS_WINDOW`）\n\n"
+    if not handlers:
+        return output + "暂无调用记录。\n"
+    
+    output += "| 处理器 | 类型 | 调用 | 错误 | p50 ms | p95 ms | p99 ms | 总耗时 ms | 读取字节 | 打开文件 | 平均响应字节 |\n"
+    output += "|--------|------|------|------|--------|--------|--------|-----------|----------|----------|--------------|\n"
+    for name, stats in handlers:
+        output += (f"| `{name}` | {stats['kind']} | {stats['calls']} | {stats['errors']} | "
+                   f"{stats['p50_ms']} | {stats['p95_ms']} | {stats['p99_ms']} | {stats['total_ms']} | "
+                   f"{stats['bytes_read']} | {stats['files_opened']} | "
+                   f"{stats['response_bytes'] // stats['calls']} |\n")
     
     return output
 
 
 # ==========================================
-# 5. Prompts: 常见问题模板
+# 6. Prompts: 常见问题模板
 # ==========================================
 
 @mcp.prompt()
@@ -964,17 +4349,137 @@ def build_pipeline(task: str = "group analysis") -> str:
 
 
 # ==========================================
-# 6. 运行服务器
+# 7. 守护进程模式：多个客户端共享同一份已预热的索引和缓存
+# ==========================================
+
+# 探测和转发的每个 HTTP 请求都会输出 httpx 的 INFO 日志，对客户端没有意义
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def daemon_base_url() -> str:
+    """守护进程的 HTTP 地址；Unix socket 模式下主机名只用于 Host 头"""
+    if DAEMON_SOCKET:
+        return "http://localhost"
+    host = f"[{DAEMON_HOST}]" if ':' in DAEMON_HOST else DAEMON_HOST
+    return f"http://{host}:{DAEMON_PORT}"
+
+
+def daemon_toolboxes() -> Dict[str, str]:
+    """当前配置的工具箱（名称 → 绝对路径），用于确认守护进程与本地配置一致"""
+    return {name: str(path.resolve()) for name, path in TOOLBOX_PATHS.items()}
+
+
+@mcp.custom_route("/health", methods=["GET"])
+async def daemon_health(request: Request) -> JSONResponse:
+    """守护进程健康检查：stdio 转发端据此判断能否复用"""
+    return JSONResponse({
+        'server': mcp.name,
+        'pid': os.getpid(),
+        'uptime_s': round(time.time() - _SERVER_STARTED, 1),
+        'toolboxes': daemon_toolboxes(),
+    })
+
+
+def probe_daemon(timeout: float = 0.5) -> Dict:
+    """探测守护进程；未运行或无响应时返回 None"""
+    transport = httpx.HTTPTransport(uds=DAEMON_SOCKET) if DAEMON_SOCKET else None
+    try:
+        with httpx.Client(transport=transport, timeout=timeout, trust_env=False) as client:
+            response = client.get(daemon_base_url() + "/health")
+            response.raise_for_status()
+            return response.json()
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+async def forward_stdio_to_daemon():
+    """stdio 转发：把客户端的 JSON-RPC 消息原样转发给守护进程，并把响应写回 stdout"""
+    from mcp.client.streamable_http import streamable_http_client
+    from mcp.server.stdio import stdio_server
+    
+    transport = httpx.AsyncHTTPTransport(uds=DAEMON_SOCKET) if DAEMON_SOCKET else None
+    # 读超时与 MCP 客户端默认值一致：服务器推送流可能长时间保持打开
+    timeout = httpx.Timeout(30, read=300)
+    
+    async def pump(source, sink, direction: str):
+        async for message in source:
+            if isinstance(message, Exception):
+                print(f"⚠️  转发{direction}出错：{message}", file=sys.stderr)
+                continue
+            await sink.send(message)
+    
+    async with httpx.AsyncClient(transport=transport, timeout=timeout, trust_env=False) as client, \
+            stdio_server() as (stdin_read, stdout_write), \
+            streamable_http_client(daemon_base_url() + "/mcp", http_client=client) as (daemon_read, daemon_write, _):
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(pump, daemon_read, stdout_write, "（守护进程 → 客户端）")
+            await pump(stdin_read, daemon_write, "（客户端 → 守护进程）")
+            # 客户端关闭 stdin 后结束会话
+            tg.cancel_scope.cancel()
+
+
+def run_daemon():
+    """以守护进程方式运行：streamable HTTP 挂在 /mcp，健康检查在 /health"""
+    import uvicorn
+    
+    # DNS 重绑定防护只放行本机地址：补上实际监听地址（Unix socket 下 Host 头不带端口）
+    security = mcp.settings.transport_security
+    host_header = daemon_base_url().split('//', 1)[1]
+    if security is not None and host_header not in security.allowed_hosts:
+        security.allowed_hosts.append(host_header)
+    
+    if DAEMON_SOCKET:
+        socket_path = Path(DAEMON_SOCKET)
+        if socket_path.exists():
+            if probe_daemon():
+                print(f"❌ 守护进程已在运行：{socket_path}", file=sys.stderr)
+                sys.exit(1)
+            # 上次异常退出留下的 socket 文件
+            socket_path.unlink()
+        config = uvicorn.Config(mcp.streamable_http_app(), uds=DAEMON_SOCKET, log_level="warning")
+    else:
+        config = uvicorn.Config(mcp.streamable_http_app(), host=DAEMON_HOST, port=DAEMON_PORT,
+                                log_level="warning")
+    uvicorn.Server(config).run()
+
+
+# ==========================================
+# 8. 运行服务器
 # ==========================================
 
 if __name__ == "__main__":
+    daemon_mode = "--daemon" in sys.argv[1:]
+    
+    if not daemon_mode and SHIM_MODE not in ('off', '0', 'false'):
+        health = probe_daemon()
+        if health is not None:
+            if health.get('toolboxes') == daemon_toolboxes():
+                print(f"🔗 检测到守护进程（pid {health.get('pid')}），转发到 {daemon_base_url()}/mcp",
+                      file=sys.stderr)
+                anyio.run(forward_stdio_to_daemon)
+                sys.exit(0)
+            print(f"⚠️  守护进程的工具箱配置与当前不一致，改为本地运行", file=sys.stderr)
+    
     print("="*70, file=sys.stderr)
     print("🧠 NIRS-Toolbox MCP Server", file=sys.stderr)
     print("="*70, file=sys.stderr)
-    print(f"📁 工具箱路径: {NIRS_TOOLBOX_PATH}", file=sys.stderr)
-    print(f"📊 命名空间: {NIRS_NS}", file=sys.stderr)
-    print(f"💡 示例目录: {DEMOS_PATH}", file=sys.stderr)
-    print(f"✅ 服务器已启动", file=sys.stderr)
-    print("="*70, file=sys.stderr)
-    
-    mcp.run(transport="stdio")
+    if NIRS_TOOLBOX_PATH:
+        print(f"📁 工具箱路径: {NIRS_TOOLBOX_PATH}", file=sys.stderr)
+        print(f"📊 命名空间: {NIRS_NS}", file=sys.stderr)
+        print(f"💡 示例目录: {DEMOS_PATH}", file=sys.stderr)
+        
+        # 索引在后台构建（常用命名空间优先），不阻塞 initialize；完成后启动文件监听
+        for name, index in TOOLBOXES.items():
+            start_index_build(index, f"[{name}] " if len(TOOLBOXES) > 1 else "")
+        print(f"⏳ 索引后台构建中（优先：{', '.join(HOT_CATEGORIES)}）", file=sys.stderr)
+    if start_stats_dump():
+        print(f"📈 统计输出：每 {STATS_INTERVAL}s → {STATS_FILE or 'stderr'}", file=sys.stderr)
+    if daemon_mode:
+        where = f"unix:{DAEMON_SOCKET}" if DAEMON_SOCKET else f"{daemon_base_url()}/mcp"
+        print(f"✅ 守护进程已启动：{where}", file=sys.stderr)
+        print("="*70, file=sys.stderr)
+        run_daemon()
+    else:
+        print(f"✅ 服务器已启动", file=sys.stderr)
+        print("="*70, file=sys.stderr)
+        mcp.run(transport="stdio")
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+NIRS-Toolbox MCP Server 性能基准
+
+生成合成的 +nirs 工具箱目录（类别数、类数、方法数、文件大小可配置），
+在 1x/10x/100x 规模下计时 get_namespace_files、parse_matlab_class、
+search_module、get_module_details、get_category，结果输出为 JSON，
+可与上一次的结果对比以发现性能回退。
+
+用法：
+    python tests/bench_nirs_mcp.py                        # 默认 1x/10x/100x
+    python tests/bench_nirs_mcp.py --scales 1,10 -o bench.json
+    python tests/bench_nirs_mcp.py --baseline bench.json  # 与基线对比，回退时退出码为 1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+WORDS = [
+    'filter', 'band', 'pass', 'optical', 'density', 'hemoglobin', 'motion', 'artifact',
+    'correction', 'wavelet', 'regression', 'glm', 'mixed', 'effects', 'channel', 'probe',
+    'stimulus', 'design', 'basis', 'canonical', 'resample', 'trim', 'baseline', 'pca',
+    'connectivity', 'image', 'reconstruction', 'register', 'atlas', 'export', 'table',
+    'statistics', 'contrast', 'group', 'subject', 'level', 'signal', 'quality', 'spectra',
+]
+
+
+# ==========================================
+# 合成工具箱生成
+# ==========================================
+
+def sentence(rng: random.Random, n: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def camel(rng: random.Random, n: int) -> str:
+    return ''.join(rng.choice(WORDS).capitalize() for _ in range(n))
+
+
+def make_class(rng: random.Random, name: str, category: str, n_props: int, n_methods: int,
+               target_bytes: int) -> str:
+    """生成一个类文件：帮助注释、带注释的属性块、若干方法；用注释行补足到目标大小"""
+    lines = [f"classdef {name} < nirs.{category}.AbstractModule"]
+    lines.append(f"    %% {name} - {sentence(rng, 8)}")
+    lines.append("    %")
+    lines.append("    % Options:")
+    for _ in range(3):
+        lines.append(f"    %     {rng.choice(WORDS):<10} - {sentence(rng, 6)}")
+    lines.append("")
+
+    lines.append("    properties")
+    for i in range(n_props):
+        default = rng.choice(["[]", "true", "false", str(rng.randint(0, 100)), f"'{rng.choice(WORDS)}'"])
+        lines.append(f"        {rng.choice(WORDS)}{i} = {default};  % {sentence(rng, 5)}")
+    lines.append("    end")
+    lines.append("")
+
+    lines.append("    methods")
+    lines.append(f"        function obj = {name}( prevJob )")
+    lines.append(f"            obj.name = '{name}';")
+    lines.append("            if nargin > 0")
+    lines.append("                obj.prevJob = prevJob;")
+    lines.append("            end")
+    lines.append("        end")
+    for i in range(n_methods):
+        method = f"{rng.choice(WORDS)}{camel(rng, 1)}{i}"
+        lines.append(f"        function data = {method}( obj, data )")
+        lines.append(f"            % {sentence(rng, 7)}")
+        lines.append("            for i = 1:numel(data)")
+        lines.append(f"                d = data(i).data;  % {sentence(rng, 3)}")
+        lines.append(f"                data(i).data = nirs.math.{rng.choice(WORDS)}( d, '{rng.choice(WORDS)}' );")
+        lines.append("            end")
+        lines.append("        end")
+    lines.append("    end")
+    lines.append("end")
+
+    content = '\n'.join(lines) + '\n'
+    padding = []
+    while len(content) + sum(len(p) + 1 for p in padding) < target_bytes:
+        padding.append(f"% {sentence(rng, 10)}")
+    return content + '\n'.join(padding) + ('\n' if padding else '')
+
+
+def make_function(rng: random.Random, name: str) -> str:
+    return (f"function out = {name}( data, varargin )\n"
+            f"% {name} - {sentence(rng, 8)}\n"
+            f"%\n"
+            f"% Args:\n"
+            f"%     data - {sentence(rng, 5)}\n"
+            f"    out = nirs.core.Data.empty;\n"
+            f"end\n")
+
+
+def generate_toolbox(root: Path, categories: int, classes: int, functions: int, properties: int,
+                     methods: int, file_bytes: int, seed: int = 0) -> int:
+    """在 root 下生成 +nirs 和 demos，返回生成的 .m 文件数"""
+    rng = random.Random(seed)
+    ns = root / "+nirs"
+    count = 0
+    names = []
+
+    for c in range(categories):
+        category = f"cat{c}"
+        cat_dir = ns / f"+{category}"
+        cat_dir.mkdir(parents=True, exist_ok=True)
+        (cat_dir / "AbstractModule.m").write_text(
+            "classdef AbstractModule < handle\n"
+            "    % Abstract base class for all pipeline modules.\n"
+            "    properties\n        name;\n        prevJob;\n    end\n"
+            "    methods\n        function data = run( obj, data )\n        end\n    end\n"
+            "end\n")
+        count += 1
+        for i in range(classes):
+            name = f"{camel(rng, 2)}{i}"
+            (cat_dir / f"{name}.m").write_text(
+                make_class(rng, name, category, properties, methods, file_bytes))
+            names.append((category, name))
+            count += 1
+        for i in range(functions):
+            name = f"{rng.choice(WORDS)}{camel(rng, 1)}{i}"
+            (cat_dir / f"{name}.m").write_text(make_function(rng, name))
+            count += 1
+
+    demos = root / "demos"
+    demos.mkdir(parents=True, exist_ok=True)
+    for d in range(max(1, categories // 2)):
+        chain = rng.sample(names, min(4, len(names)))
+        lines = [f"% Demo {d}: {sentence(rng, 6)}", "raw = nirs.io.loadNIRx('data');"]
+        for i, (category, name) in enumerate(chain):
+            lines.append(f"job = nirs.{category}.{name}({'job' if i else ''});")
+        lines.append("SubjStats = job.run(raw);")
+        (demos / f"demo_{d}.m").write_text('\n'.join(lines) + '\n')
+
+    return count
+
+
+# ==========================================
+# 计时
+# ==========================================
+
+def summarize(samples: list) -> dict:
+    """毫秒统计：中位数、p95、最小值、样本数"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'median_ms': round(statistics.median(ordered) * 1000, 4),
+        'p95_ms': round(p95 * 1000, 4),
+        'min_ms': round(ordered[0] * 1000, 4),
+        'n': len(ordered),
+    }
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_scale(server, root: Path, repeat: int, sample: int, rng: random.Random) -> dict:
+    """在一个已生成的工具箱上计时各项操作"""
+    loop = asyncio.new_event_loop()
+    run = loop.run_until_complete
+    timings = {}
+
+    ns = root / "+nirs"
+    timings['get_namespace_files'] = summarize([timed(server.get_namespace_files, ns) for _ in range(repeat)])
+
+    # 冷启动建索引（不使用快照）
+    build_samples = []
+    for _ in range(repeat):
+        index = server.new_index(root)
+        build_samples.append(timed(server.load_index, index))
+    timings['index_build'] = summarize(build_samples)
+
+    # 工具通过全局索引访问，替换为当前规模的索引
+    server.INDEX = index
+    server.TOOLBOXES = {index['name']: index}
+
+    records = [r for r in index['lookups']['modules'].values() if r['kind'] == 'class']
+    picked = rng.sample(records, min(sample, len(records)))
+    timings['parse_matlab_class'] = summarize([timed(server.parse_matlab_class, r['path']) for r in picked])
+
+    queries = [rng.choice(WORDS) for _ in range(sample)]
+    queries += [f"{rng.choice(WORDS)} {rng.choice(WORDS)}" for _ in range(sample)]
+    timings['search_module'] = summarize([timed(run, server.search_module(q)) for q in queries])
+
+    server._PARSE_CACHE.clear()
+    timings['get_module_details_cold'] = summarize(
+        [timed(run, server.get_module_details(r['name'])) for r in picked])
+    timings['get_module_details_warm'] = summarize(
+        [timed(run, server.get_module_details(r['name'])) for r in picked])
+
+    categories = list(index['lookups']['by_category'])
+    timings['get_category'] = summarize(
+        [timed(run, server.get_category(c)) for c in categories for _ in range(repeat)])
+
+    loop.close()
+    return {'files': len(index['lookups']['modules']), 'demos': len(index['lookups']['demos']), 'timings': timings}
+
+
+def compare_with_baseline(results: dict, baseline: dict, threshold: float) -> list:
+    """对比中位数，返回超过阈值倍数的回退项"""
+    regressions = []
+    old_by_scale = {entry['scale']: entry for entry in baseline.get('results', [])}
+    for entry in results['results']:
+        old = old_by_scale.get(entry['scale'])
+        if not old:
+            continue
+        for name, stats in entry['timings'].items():
+            before = old['timings'].get(name, {}).get('median_ms')
+            if before and stats['median_ms'] > before * threshold:
+                regressions.append((entry['scale'], name, before, stats['median_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NIRS-Toolbox MCP Server 性能基准")
+    parser.add_argument('--scales', default='1,10,100', help="规模倍数，逗号分隔（默认 1,10,100）")
+    parser.add_argument('--categories', type=int, default=4, help="1x 规模下的类别数")
+    parser.add_argument('--classes', type=int, default=10, help="1x 规模下每个类别的类数")
+    parser.add_argument('--functions', type=int, default=3, help="1x 规模下每个类别的函数文件数")
+    parser.add_argument('--properties', type=int, default=8, help="每个类的属性数")
+    parser.add_argument('--methods', type=int, default=6, help="每个类的方法数")
+    parser.add_argument('--file-bytes', type=int, default=4096, help="类文件的目标大小（字节）")
+    parser.add_argument('--repeat', type=int, default=3, help="整体操作（遍历、建索引）的重复次数")
+    parser.add_argument('--sample', type=int, default=30, help="逐个模块计时的抽样数")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="结果 JSON 路径（默认输出到 stdout）")
+    parser.add_argument('--baseline', help="上一次的结果 JSON，用于检测性能回退")
+    parser.add_argument('--threshold', type=float, default=1.5, help="中位数超过基线多少倍视为回退")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    workdir = Path(tempfile.mkdtemp(prefix="nirs_bench_"))
+
+    try:
+        # 服务器模块在导入时读取配置，需要先生成一个工具箱
+        roots = {}
+        for scale in scales:
+            root = workdir / f"x{scale}" / "nirs-toolbox"
+            # 规模按类别数放大，每个类别的文件数不变
+            files = generate_toolbox(root, args.categories * scale, args.classes, args.functions,
+                                     args.properties, args.methods, args.file_bytes, args.seed)
+            roots[scale] = root
+            print(f"📁 {scale}x：生成 {files} 个文件", file=sys.stderr)
+
+        os.environ['NIRS_TOOLBOX_PATH'] = str(roots[scales[0]])
+        os.environ['NIRS_MCP_INDEX_PATH'] = 'off'
+        os.environ.setdefault('NIRS_MCP_WATCH', 'off')
+        sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+        import nirs_toolbox_mcp as server
+
+        results = {
+            'meta': {
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+            },
+            'results': [],
+        }
+        rng = random.Random(args.seed)
+        for scale in scales:
+            entry = bench_scale(server, roots[scale], args.repeat, args.sample, rng)
+            entry['scale'] = scale
+            results['results'].append(entry)
+            summary = ', '.join(f"{name} {stats['median_ms']}ms" for name, stats in entry['timings'].items())
+            print(f"⏱️  {scale}x（{entry['files']} 个模块）：{summary}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+        print(f"✅ 结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        for scale, name, before, after in regressions:
+            print(f"❌ 性能回退：{scale}x {name} {before}ms -> {after}ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"✅ 与基线相比没有超过 {args.threshold}x 的回退", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
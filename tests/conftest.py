@@ -0,0 +1,165 @@
+"""pytest 公共配置：生成小型合成工具箱，导入服务器模块前设置环境变量"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# 合成工具箱：覆盖类继承、抽象方法、函数文件和示例流水线
+TOOLBOX_FILES = {
+    '+nirs/+modules/AbstractModule.m': """\
+classdef AbstractModule < handle
+    % 所有处理模块的基类
+    properties
+        name = '';  % 模块名称
+        prevJob     % 上一步模块
+    end
+    methods (Abstract)
+        out = runThis(obj, data)
+    end
+    methods
+        function out = run(obj, data)
+            % 依次执行流水线中的各步
+            out = obj.runThis(data);
+        end
+    end
+end
+""",
+    '+nirs/+modules/BandPassFilter.m': """\
+classdef BandPassFilter < nirs.modules.AbstractModule
+    % Bandpass filter for raw optical data
+    properties
+        highpass = 0.01;  % high-pass cutoff (Hz)
+        lowpass = 0.5;    % low-pass cutoff (Hz)
+    end
+    methods
+        function obj = BandPassFilter(prevJob)
+            obj.name = 'Bandpass Filter';
+        end
+        function data = runThis(obj, data)
+            % Apply the filter
+            for i = 1:numel(data)
+                if obj.highpass > 0
+                    data(i).data = data(i).data';
+                end
+            end
+        end
+    end
+end
+""",
+    '+nirs/+modules/OpticalDensity.m': """\
+classdef OpticalDensity < nirs.modules.AbstractModule
+    % Convert raw intensity to optical density
+    methods
+        function data = runThis(obj, data)
+            data = -log(data);
+        end
+    end
+end
+""",
+    '+nirs/+modules/BeerLambertLaw.m': """\
+classdef BeerLambertLaw < nirs.modules.AbstractModule
+    % Convert optical density to hemoglobin concentration
+    methods
+        function data = runThis(obj, data)
+            data = data * 2;
+        end
+    end
+end
+""",
+    '+nirs/+modules/GLM.m': """\
+classdef GLM < nirs.modules.AbstractModule
+    % General linear model regression of hemoglobin data
+    properties
+        basis   % regression basis set
+    end
+    methods
+        function S = runThis(obj, data)
+            S = data;
+        end
+    end
+end
+""",
+    '+nirs/+core/Data.m': """\
+classdef Data
+    % Holds time series data for one scan
+    properties
+        data
+        time
+    end
+end
+""",
+    '+nirs/+io/loadNIRx.m': """\
+function raw = loadNIRx(folder)
+% Load NIRx data files from a folder
+raw = nirs.core.Data();
+end
+""",
+    'demos/preprocessing_demo.m': """\
+% Preprocessing demo: filter raw data and convert to hemoglobin
+raw = nirs.io.loadNIRx('data');
+job = nirs.modules.OpticalDensity();
+job = nirs.modules.BandPassFilter(job);
+job.lowpass = 0.3;
+job = nirs.modules.BeerLambertLaw(job);
+hb = job.run(raw);
+""",
+    'demos/glm_demo.m': """\
+% Group GLM regression demo
+job = nirs.modules.OpticalDensity();
+job = nirs.modules.BeerLambertLaw(job);
+job = nirs.modules.GLM(job);
+stats = job.run(raw);
+""",
+}
+
+
+def write_toolbox(root: Path, files: dict) -> Path:
+    """将 {相对路径: 内容} 写入 root，返回 root"""
+    for rel, content in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding='utf-8')
+    return root
+
+
+# 服务器模块在导入时读取环境变量：先指向合成工具箱，关闭快照和文件监听
+_DEFAULT_ROOT = write_toolbox(Path(tempfile.mkdtemp(prefix='nirs-mcp-test-')) / 'nirs-toolbox', TOOLBOX_FILES)
+os.environ['NIRS_TOOLBOX_PATH'] = str(_DEFAULT_ROOT)
+os.environ['NIRS_MCP_INDEX_PATH'] = 'off'
+os.environ['NIRS_MCP_WATCH'] = 'off'
+os.environ['NIRS_MCP_SHIM'] = 'off'
+sys.path.insert(0, str(REPO_ROOT))
+
+
+@pytest.fixture(scope='session')
+def server():
+    """服务器模块"""
+    import nirs_toolbox_mcp
+    return nirs_toolbox_mcp
+
+
+@pytest.fixture
+def make_index(server, tmp_path):
+    """在临时目录中生成工具箱并构建索引；files 覆盖或追加默认文件，值为 None 时删除该文件"""
+    def build(files: dict = None) -> dict:
+        merged = dict(TOOLBOX_FILES)
+        merged.update(files or {})
+        root = write_toolbox(tmp_path / 'nirs-toolbox', {rel: text for rel, text in merged.items() if text is not None})
+        index = server.new_index(root)
+        server.load_index(index)
+        return index
+    return build
+
+
+@pytest.fixture
+def default_index(server, make_index, monkeypatch):
+    """将合成工具箱设为服务器的默认（也是唯一的）工具箱，供直接调用工具函数的测试使用"""
+    index = make_index()
+    monkeypatch.setattr(server, 'INDEX', index)
+    monkeypatch.setattr(server, 'TOOLBOXES', {'nirs-toolbox': index})
+    return index
@@ -0,0 +1,58 @@
+"""异步工具：阻塞的文件访问在 I/O 线程池中执行，并发调用互不阻塞"""
+
+import asyncio
+import pathlib
+import threading
+import time
+
+SLOW = 0.3
+
+
+def test_concurrent_calls_overlap_off_the_event_loop(server, default_index, monkeypatch):
+    threads = []
+    category_records = server.category_records
+
+    def slow_category_records(index, category):
+        threads.append(threading.current_thread())
+        time.sleep(SLOW)
+        return category_records(index, category)
+
+    monkeypatch.setattr(server, 'category_records', slow_category_records)
+
+    async def main():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        beat = asyncio.create_task(heartbeat())
+        started = time.perf_counter()
+        results = await asyncio.gather(server.get_category('modules'), server.get_category('io'))
+        elapsed = time.perf_counter() - started
+        beat.cancel()
+        return results, elapsed, ticks
+
+    (modules, io), elapsed, ticks = asyncio.run(main())
+    assert '### GLM' in modules and '### loadNIRx' in io
+    # 两次慢调用重叠执行，且期间事件循环仍在运转
+    assert elapsed < 2 * SLOW
+    assert ticks >= 10
+    assert threading.main_thread() not in threads
+
+
+def test_missing_category_checks_directory_in_thread_pool(server, default_index, monkeypatch):
+    stat_threads = []
+    is_dir = pathlib.Path.is_dir
+
+    def recording_is_dir(path, *args, **kwargs):
+        stat_threads.append(threading.current_thread())
+        return is_dir(path, *args, **kwargs)
+
+    monkeypatch.setattr(pathlib.Path, 'is_dir', recording_is_dir)
+    result = asyncio.run(server.get_category('nope'))
+    assert result.strip().startswith("❌ 类别 'nope' 不存在")
+    assert '  - modules' in result
+    assert stat_threads and threading.main_thread() not in stat_threads
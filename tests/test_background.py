@@ -0,0 +1,52 @@
+"""同步构建与后台构建期间的直接扫描"""
+
+import asyncio
+
+from conftest import TOOLBOX_FILES, write_toolbox
+
+
+def unbuilt_index(server, tmp_path, monkeypatch, building=False):
+    index = server.new_index(write_toolbox(tmp_path / 'nirs-toolbox', TOOLBOX_FILES))
+    index['building'] = building
+    monkeypatch.setattr(server, 'INDEX', index)
+    return index
+
+
+def test_get_index_builds_synchronously_without_background_build(server, tmp_path, monkeypatch):
+    index = unbuilt_index(server, tmp_path, monkeypatch)
+    assert server.get_index() is index
+    assert index['built']
+    assert '+modules/GLM.m' in index['lookups']['modules']
+
+
+def test_get_index_returns_partial_index_while_building(server, tmp_path, monkeypatch):
+    index = unbuilt_index(server, tmp_path, monkeypatch, building=True)
+    assert server.get_index() is index
+    assert not index['built'] and not index['lookups']['modules']
+
+
+def test_direct_scan_finds_unpublished_modules(server, tmp_path, monkeypatch):
+    index = unbuilt_index(server, tmp_path, monkeypatch, building=True)
+    # 同步查找只查内存中的索引
+    assert server.resolve_module(index, 'GLM') is None
+
+    record = asyncio.run(server.resolve_module_async(index, 'GLM'))
+    assert record['name'] == 'GLM' and record['category'] == 'modules'
+    assert asyncio.run(server.resolve_module_async(index, 'GLM', 'io')) is None
+    assert asyncio.run(server.resolve_class_async(index, 'loadNIRx'))['category'] == 'io'
+    assert not index['lookups']['modules']
+
+
+def test_direct_scan_reuses_file_listing_for_misses(server, tmp_path, monkeypatch):
+    index = unbuilt_index(server, tmp_path, monkeypatch, building=True)
+    assert asyncio.run(server.resolve_module_async(index, 'Missing')) is None
+    listing = index['file_names']
+    assert 'GLM' in listing and 'Missing' not in listing
+
+    write_toolbox(tmp_path / 'nirs-toolbox', {'+nirs/+modules/Missing.m': 'function Missing()\nend\n'})
+    assert asyncio.run(server.resolve_module_async(index, 'Missing')) is None
+    assert index['file_names'] is listing
+
+    server.load_index(index)
+    assert index['file_names'] is None
+    assert asyncio.run(server.resolve_module_async(index, 'Missing'))['name'] == 'Missing'
@@ -0,0 +1,43 @@
+"""批量查询：字段选择、源代码总预算、未找到的模块"""
+
+import asyncio
+
+
+def batch(server, names, **kwargs):
+    return asyncio.run(server.get_modules_batch(names, output_format='json', **kwargs))
+
+
+def test_default_fields_exclude_source(server, default_index):
+    result = batch(server, ['GLM'])
+    module = result['modules'][0]
+    assert module['description'] and module['properties'][0]['name'] == 'basis'
+    assert 'source' not in module and 'source_omitted' not in result
+
+
+def test_names_deduplicated_in_order_and_missing_reported(server, default_index):
+    result = batch(server, ['GLM', 'loadNIRx', 'GLM', 'BandPasFilter'], fields=['description'])
+    assert [module['name'] for module in result['modules']] == ['GLM', 'loadNIRx']
+    assert result['missing'] == [{'name': 'BandPasFilter', 'suggestions': ['BandPassFilter']}]
+
+
+def test_unknown_field_is_an_error(server, default_index):
+    assert 'error' in batch(server, ['GLM'], fields=['source', 'body'])
+
+
+def test_source_stays_within_total_budget(server, default_index):
+    names = ['AbstractModule', 'BandPassFilter', 'OpticalDensity', 'BeerLambertLaw', 'GLM']
+    result = batch(server, names, fields=['source'], max_bytes=600)
+    sources = [module['source'] for module in result['modules'] if 'source' in module]
+    # 600 字节只够两个模块各分到下限 256 字节以上
+    assert len(sources) == 2
+    assert sum(len(source['text'].encode('utf-8')) for source in sources) <= 600
+    assert result['source_omitted'] == ['OpticalDensity', 'BeerLambertLaw', 'GLM']
+    
+    result = batch(server, names, fields=['source'], max_bytes=100_000)
+    assert result['source_omitted'] == []
+    assert all(module['source']['next_cursor'] == '' for module in result['modules'])
+
+
+def test_markdown_lists_modules_without_source(server, default_index):
+    output = asyncio.run(server.get_modules_batch(['GLM', 'BandPassFilter'], fields=['source'], max_bytes=300))
+    assert '未包含：`BandPassFilter`' in output
@@ -0,0 +1,15 @@
+"""多进程批量解析"""
+
+
+def test_pool_does_not_fork(server):
+    assert server.parse_pool_context().get_start_method() in ('forkserver', 'spawn')
+
+
+def test_parallel_results_match_serial(make_index, server, monkeypatch):
+    index = make_index()
+    jobs = [(record['path'], record['category'], index['ns']) for record in index['lookups']['modules'].values()]
+    serial = server.bulk_analyze_modules(jobs, workers=1)
+    monkeypatch.setattr(server, 'PARALLEL_MIN_FILES', 1)
+    monkeypatch.setattr(server, 'PARSE_CHUNK_SIZE', 2)
+    parallel = server.bulk_analyze_modules(jobs, workers=2)
+    assert sorted(parallel, key=lambda r: r[0]['rel']) == sorted(serial, key=lambda r: r[0]['rel'])
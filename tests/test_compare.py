@@ -0,0 +1,69 @@
+"""模块结构对比"""
+
+import asyncio
+
+FILES = {
+    '+nirs/+modules/TrendFilter.m': """\
+classdef TrendFilter < nirs.modules.BandPassFilter
+    % Detrend before filtering
+    properties
+        lowpass = 0.2;
+        order = 1;
+    end
+    methods
+        function out = detrend(obj, data)
+        end
+        function data = runThis(obj, data, opts)
+        end
+    end
+end
+""",
+    '+nirs/+io/loadSNIRF.m': """\
+function raw = loadSNIRF(filename, verbose)
+% Load SNIRF files
+end
+""",
+}
+
+
+def compare(server, index, name1, name2):
+    record1 = server.resolve_module(index, name1)
+    record2 = server.resolve_module(index, name2)
+    return server.diff_modules(index, record1, server.load_module_info(record1),
+                               record2, server.load_module_info(record2))
+
+
+def test_added_removed_and_changed_members(make_index, server):
+    diff = compare(server, make_index(FILES), 'TrendFilter', 'BandPassFilter')
+    props = diff['properties']
+    assert props['only1'] == [('order', 'order = 1')]
+    assert props['only2'] == [('highpass', 'highpass = 0.01')]
+    assert props['changed'] == [('lowpass', 'lowpass = 0.2', 'lowpass = 0.5')]
+
+    methods = diff['methods']
+    assert methods['only1'] == [('detrend', 'out = detrend(obj, data)')]
+    assert methods['only2'] == []
+    assert methods['changed'] == [('runThis', 'data = runThis(obj, data, opts)', 'data = runThis(obj, data)')]
+    assert diff['signatures'] is None
+
+
+def test_inheritance_relation_and_help_diff(make_index, server):
+    diff = compare(server, make_index(FILES), 'TrendFilter', 'BandPassFilter')
+    assert diff['subclass'] == ('nirs.modules.TrendFilter', 'nirs.modules.BandPassFilter')
+    assert diff['shared_ancestors'] == ['nirs.modules.AbstractModule', 'handle']
+    assert '-Detrend before filtering' in diff['help_diff']
+    assert '+Bandpass filter for raw optical data' in diff['help_diff']
+
+
+def test_function_signatures(make_index, server):
+    diff = compare(server, make_index(FILES), 'loadNIRx', 'loadSNIRF')
+    assert diff['signatures'] == ('function raw = loadNIRx(folder)',
+                                 'function raw = loadSNIRF(filename, verbose)')
+    assert diff['subclass'] is None and diff['shared_ancestors'] == []
+
+
+def test_unknown_module_name(server, default_index):
+    result = asyncio.run(server.compare_modules('GLM', 'BandPasFilter', output_format='json'))
+    assert result['error'] == "模块 'BandPasFilter' 不存在"
+    assert result['suggestions'][0] == 'BandPassFilter'
+    assert asyncio.run(server.compare_modules('Nope', 'GLM')).startswith("❌ 模块 'Nope' 不存在")
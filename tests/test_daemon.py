@@ -0,0 +1,90 @@
+"""守护进程模式：stdio 转发端复用守护进程，无守护进程时回退为本地 stdio 服务器"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+from mcp import ClientSession
+from mcp.client.stdio import StdioServerParameters, stdio_client
+
+from conftest import REPO_ROOT
+
+SCRIPT = str(REPO_ROOT / 'nirs_toolbox_mcp.py')
+
+
+def free_port() -> int:
+    """向系统申请一个临时端口"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_env(port: int, shim: str = 'auto') -> dict:
+    env = dict(os.environ)
+    env.update({'NIRS_MCP_DAEMON_HOST': '127.0.0.1', 'NIRS_MCP_DAEMON_PORT': str(port), 'NIRS_MCP_SHIM': shim})
+    return env
+
+
+@pytest.fixture
+def daemon():
+    """在临时端口上启动守护进程，等待 /health 可用"""
+    port = free_port()
+    process = subprocess.Popen([sys.executable, SCRIPT, '--daemon'], env=server_env(port, 'off'),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 20
+    try:
+        while True:
+            try:
+                health = httpx.get(f'http://127.0.0.1:{port}/health', timeout=0.5, trust_env=False).json()
+                break
+            except httpx.HTTPError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    pytest.fail('守护进程未能启动')
+                time.sleep(0.1)
+        yield port, health
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def call_through_stdio(port: int, errlog) -> tuple:
+    """以 stdio 方式启动服务器脚本，完成一次 initialize 和一次工具调用"""
+    async def session():
+        params = StdioServerParameters(command=sys.executable, args=[SCRIPT], env=server_env(port))
+        async with stdio_client(params, errlog=errlog) as (read, write), ClientSession(read, write) as client:
+            init = await client.initialize()
+            result = await client.call_tool('get_module_details', {'module_name': 'GLM'})
+            return init.serverInfo.name, result.content[0].text
+    return asyncio.run(asyncio.wait_for(session(), 60))
+
+
+def test_shim_forwards_to_daemon(daemon, tmp_path):
+    port, health = daemon
+    assert health['pid'] != os.getpid()
+
+    with open(tmp_path / 'stderr.log', 'w+', encoding='utf-8') as errlog:
+        name, text = call_through_stdio(port, errlog)
+        errlog.seek(0)
+        log = errlog.read()
+    assert name == health['server']
+    assert 'nirs.modules.GLM' in text
+    assert f"守护进程（pid {health['pid']}）" in log
+    assert '服务器已启动' not in log
+
+
+def test_falls_back_to_stdio_without_daemon(tmp_path):
+    # 临时端口上没有进程监听
+    port = free_port()
+
+    with open(tmp_path / 'stderr.log', 'w+', encoding='utf-8') as errlog:
+        name, text = call_through_stdio(port, errlog)
+        errlog.seek(0)
+        log = errlog.read()
+    assert 'nirs.modules.GLM' in text
+    assert '检测到守护进程' not in log
+    assert '服务器已启动' in log
@@ -0,0 +1,52 @@
+"""文件头部读取与类型判断"""
+
+
+LEADING_COMMENT_CLASS = """\
+% Copyright notice
+
+classdef Resample < nirs.modules.AbstractModule
+    % Resample data to a new sampling rate
+    properties
+        Fs = 4;
+    end
+end
+"""
+
+
+def test_blank_line_after_leading_comment_does_not_end_header(server, tmp_path):
+    path = tmp_path / 'Resample.m'
+    path.write_text(LEADING_COMMENT_CLASS)
+    assert server.summarize_header(server.read_header(path)) == ('class', 'Copyright notice')
+
+
+def test_help_after_function_declaration(server, tmp_path):
+    path = tmp_path / 'f.m'
+    path.write_text("function out = f(x)\n% Doubles x\nout = 2 * x;\n% not help\n")
+    header = server.read_header(path)
+    assert header[-1] == '% Doubles x'
+    assert server.summarize_header(header) == ('function', 'Doubles x')
+
+
+def test_kind_comes_from_full_parse(make_index, server):
+    # 文件头部被截断在声明之前时，类型仍以完整解析结果为准
+    padding = '%\n' * (server.HEADER_MAX_BYTES // 2)
+    index = make_index({'+nirs/+modules/Resample.m': padding + LEADING_COMMENT_CLASS})
+    record = index['lookups']['modules']['+modules/Resample.m']
+    assert record['kind'] == 'class'
+    assert record['parents'] == ['nirs.modules.AbstractModule']
+    assert server.load_module_info(record)['type'] == 'class'
+
+
+def test_analyze_reads_each_file_once(server, tmp_path):
+    ns = tmp_path / '+nirs'
+    path = ns / '+modules' / 'Resample.m'
+    path.parent.mkdir(parents=True)
+    path.write_text(LEADING_COMMENT_CLASS)
+    counters = {'files_opened': 0, 'bytes_read': 0}
+    token = server._IO_COUNTERS.set(counters)
+    try:
+        record, _ = server.analyze_module_file(path, 'modules', ns)
+    finally:
+        server._IO_COUNTERS.reset(token)
+    assert (record['kind'], record['summary']) == ('class', 'Copyright notice')
+    assert counters == {'files_opened': 1, 'bytes_read': path.stat().st_size}
@@ -0,0 +1,65 @@
+"""类继承关系图"""
+
+CHAIN = {
+    '+nirs/+modules/TrendFilter.m': """\
+classdef TrendFilter < nirs.modules.BandPassFilter & Mixin
+    % Detrend before filtering
+    properties
+        lowpass = 0.2;
+        order = 1;
+    end
+    methods
+        function out = detrend(obj, data)
+        end
+    end
+end
+""",
+    '+nirs/+modules/Mixin.m': """\
+classdef Mixin < handle
+    properties
+        tag
+    end
+end
+""",
+}
+
+
+def test_ancestors_in_member_lookup_order(make_index, server):
+    index = make_index(CHAIN)
+    ancestors = server.class_ancestors(index, 'nirs.modules.TrendFilter')
+    # 深度优先、从左到右；未限定包名的父类按模块名解析
+    assert ancestors == [
+        ('nirs.modules.BandPassFilter', 1),
+        ('nirs.modules.AbstractModule', 2),
+        ('handle', 3),
+        ('nirs.modules.Mixin', 1),
+    ]
+
+
+def test_descendants_breadth_first(make_index, server):
+    index = make_index(CHAIN)
+    descendants = dict(server.class_descendants(index, 'nirs.modules.AbstractModule'))
+    assert descendants['nirs.modules.BandPassFilter'] == 1
+    assert descendants['nirs.modules.GLM'] == 1
+    assert descendants['nirs.modules.TrendFilter'] == 2
+    assert 'nirs.core.Data' not in descendants
+
+
+def test_inherited_members_are_overridden_by_subclass(make_index, server):
+    index = make_index(CHAIN)
+    members = server.inherited_members(index, 'nirs.modules.TrendFilter')
+    props = dict(members['properties'])
+    assert props['lowpass'] == 'nirs.modules.TrendFilter'
+    assert props['highpass'] == 'nirs.modules.BandPassFilter'
+    assert props['prevJob'] == 'nirs.modules.AbstractModule'
+    assert props['tag'] == 'nirs.modules.Mixin'
+    methods = dict(members['methods'])
+    assert methods['runThis'] == 'nirs.modules.BandPassFilter'
+    assert methods['run'] == 'nirs.modules.AbstractModule'
+
+
+def test_resolve_class_by_short_or_qualified_name(make_index, server):
+    index = make_index()
+    assert server.resolve_class(index, 'nirs.modules.GLM')['rel'] == '+modules/GLM.m'
+    assert server.resolve_class(index, 'GLM')['rel'] == '+modules/GLM.m'
+    assert server.resolve_class(index, 'handle') is None
@@ -0,0 +1,77 @@
+"""多工具箱：内容去重与共享解析结果"""
+
+import os
+
+import pytest
+
+from conftest import TOOLBOX_FILES, write_toolbox
+
+
+@pytest.fixture
+def toolboxes(server, tmp_path, monkeypatch):
+    """两个内容相同的工具箱，共享内容去重表"""
+    store = {}
+    indexes = {}
+    for name in ('release', 'lab'):
+        root = write_toolbox(tmp_path / name / 'nirs-toolbox', TOOLBOX_FILES)
+        indexes[name] = server.new_index(root, name, store)
+    monkeypatch.setattr(server, 'TOOLBOXES', indexes)
+    for index in indexes.values():
+        server.load_index(index)
+    return indexes
+
+
+def edit(path, old, new):
+    path.write_text(path.read_text().replace(old, new, 1))
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10**9,) * 2)
+
+
+def test_identical_files_parse_once(toolboxes, server):
+    release = toolboxes['release']['lookups']['modules']['+modules/GLM.m']
+    lab = toolboxes['lab']['lookups']['modules']['+modules/GLM.m']
+    assert release['sections'] is lab['sections']
+    
+    first = server.load_module_info(release)
+    hits = server.parse_cache_stats()['hits']
+    second = server.load_module_info(lab)
+    assert server.parse_cache_stats()['hits'] == hits + 1
+    assert second['sections'] is first['sections']
+    assert (first['file_path'], second['file_path']) == (str(release['path']), str(lab['path']))
+
+
+def test_store_pruned_when_no_toolbox_uses_content(toolboxes, server):
+    store = toolboxes['release']['store']
+    old_sha = toolboxes['release']['lookups']['modules']['+modules/GLM.m']['sha']
+    
+    edit(toolboxes['release']['lookups']['modules']['+modules/GLM.m']['path'], 'basis', 'contrasts')
+    server.sync_index(toolboxes['release'])
+    assert old_sha in store  # 另一个工具箱仍在使用
+    
+    edit(toolboxes['lab']['lookups']['modules']['+modules/GLM.m']['path'], 'basis', 'contrasts')
+    server.sync_index(toolboxes['lab'])
+    assert old_sha not in store
+    new_sha = toolboxes['lab']['lookups']['modules']['+modules/GLM.m']['sha']
+    assert new_sha == toolboxes['release']['lookups']['modules']['+modules/GLM.m']['sha'] and new_sha in store
+    
+    # 删除文件后同样清理
+    for index in toolboxes.values():
+        (index['ns'] / '+io' / 'loadNIRx.m').unlink()
+    removed_sha = toolboxes['lab']['lookups']['modules']['+io/loadNIRx.m']['sha']
+    for index in toolboxes.values():
+        server.sync_index(index)
+    assert removed_sha not in store
+
+
+def test_shared_build_reads_each_file_once(server, tmp_path):
+    root = write_toolbox(tmp_path / 'nirs-toolbox', TOOLBOX_FILES)
+    index = server.new_index(root, 'solo', {})
+    jobs = [(path, path.parent.name[1:], index['ns']) for path in sorted(index['ns'].rglob('*.m'))]
+    counters = {'files_opened': 0, 'bytes_read': 0}
+    token = server._IO_COUNTERS.set(counters)
+    try:
+        results = server.analyze_jobs(index, jobs)
+    finally:
+        server._IO_COUNTERS.reset(token)
+    assert len(results) == len(jobs)
+    # 计算哈希读取的内容直接用于解析
+    assert counters == {'files_opened': len(jobs), 'bytes_read': sum(job[0].stat().st_size for job in jobs)}
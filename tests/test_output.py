@@ -0,0 +1,75 @@
+"""结构化输出（NIRS_MCP_OUTPUT=json）"""
+
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.fixture
+def json_server(server, default_index, monkeypatch):
+    """默认输出 json，默认工具箱为合成工具箱"""
+    monkeypatch.setattr(server, 'OUTPUT_FORMAT', 'json')
+    return server
+
+
+def call(server, name: str, **arguments):
+    """通过 FastMCP 调用工具，返回 (文本内容解析出的原始结果, 按 outputSchema 校验后的结构化结果)"""
+    content, structured = asyncio.run(server.mcp.call_tool(name, arguments))
+    return json.loads(content[0].text), structured['result']
+
+
+TOOL_CALLS = [
+    ('search_module', {'keyword': 'filter'}),
+    ('find_workflow', {'task': 'glm'}),
+    ('get_modules_batch', {'names': ['GLM', 'loadNIRx', 'Nope'], 'fields': ['description', 'methods', 'source']}),
+    ('get_module_details', {'module_name': 'BandPassFilter', 'include_source': True}),
+    ('get_module_details', {'module_name': 'BandPasFilter'}),
+    ('compare_modules', {'name1': 'GLM', 'name2': 'BandPassFilter'}),
+    ('get_module_source', {'module_name': 'GLM', 'max_bytes': 64}),
+    ('get_module_section', {'module_name': 'GLM', 'section': 'runThis'}),
+    ('get_module_section', {'module_name': 'GLM', 'section': 'missing'}),
+    ('get_ancestors', {'module_name': 'GLM'}),
+    ('get_descendants', {'module_name': 'AbstractModule'}),
+    ('get_inherited_members', {'module_name': 'GLM'}),
+    ('find_references', {'symbol': 'nirs.modules.GLM'}),
+    ('list_toolboxes', {}),
+    ('get_cache_stats', {}),
+]
+
+
+@pytest.mark.parametrize('name, arguments', TOOL_CALLS)
+def test_results_match_published_schema(json_server, name, arguments):
+    # 校验后的结构化结果与原始结果一致：没有字段被类型定义遗漏
+    raw, validated = call(json_server, name, **arguments)
+    assert validated == raw
+
+
+def test_output_schema_is_typed(json_server):
+    tools = {tool.name: tool for tool in asyncio.run(json_server.mcp.list_tools())}
+    schema = tools['search_module'].outputSchema
+    assert {'SearchResult', 'SearchMatch', 'ErrorResult'} <= set(schema['$defs'])
+    assert schema['$defs']['SearchMatch']['properties']['score']['type'] == 'number'
+
+
+def test_search_returns_typed_matches(json_server):
+    _, result = call(json_server, 'search_module', keyword='filter')
+    assert result['matches'][0]['qualified'] == 'nirs.modules.BandPassFilter'
+    assert result['total'] == len(result['matches'])
+
+
+def test_search_without_hits_is_an_empty_result(json_server):
+    _, result = call(json_server, 'search_module', keyword='zzzz')
+    assert result['total'] == 0 and result['matches'] == []
+    assert 'error' not in result
+
+
+def test_unknown_module_returns_error_with_suggestions(json_server):
+    _, result = call(json_server, 'get_module_details', module_name='BandPasFilter')
+    assert result['suggestions'][0] == 'BandPassFilter'
+
+
+def test_markdown_still_available_per_call(json_server):
+    content, _ = asyncio.run(json_server.mcp.call_tool('search_module', {'keyword': 'filter',
+                                                                          'output_format': 'markdown'}))
+    assert content[0].text.startswith('# 🔍')
@@ -0,0 +1,21 @@
+"""解析结果缓存"""
+
+import os
+
+
+def test_cache_key_follows_file_not_index_record(make_index, server):
+    index = make_index()
+    record = index['lookups']['modules']['+modules/GLM.m']
+    assert 'basis' in [p['name'] for p in server.load_module_info(record)['properties_detailed']]
+    
+    # 索引尚未同步：缓存键取自文件当前的 stat，不能返回旧的解析结果
+    record['path'].write_text(record['path'].read_text().replace('basis', 'contrasts'))
+    os.utime(record['path'], (record['mtime'] + 5, record['mtime'] + 5))
+    names = [p['name'] for p in server.load_module_info(record)['properties_detailed']]
+    assert names == ['contrasts']
+
+
+def test_cache_hit_on_unchanged_file(make_index, server):
+    record = make_index()['lookups']['modules']['+io/loadNIRx.m']
+    first = server.load_module_info(record)
+    assert server.load_module_info(record) is first
@@ -0,0 +1,152 @@
+"""单遍 MATLAB 词法和语法解析"""
+
+import textwrap
+
+
+def parse(server, source: str) -> dict:
+    return server.parse_matlab_source(textwrap.dedent(source))
+
+
+def functions(parsed: dict) -> dict:
+    return {func['name']: func for func in parsed['functions']}
+
+
+def test_nested_end_closes_the_right_block(server):
+    parsed = parse(server, """\
+        classdef Filter < nirs.modules.AbstractModule
+            methods
+                function data = runThis(obj, data)
+                    for i = 1:numel(data)
+                        if i > 1
+                            while true, break; end
+                        end
+                        x = data(i).data(:, end);
+                    end
+                end
+                function out = other(obj)
+                    out = 1;
+                end
+            end
+        end
+        """)
+    funcs = functions(parsed)
+    assert (funcs['runThis']['line'], funcs['runThis']['end_line']) == (2, 9)
+    assert (funcs['other']['line'], funcs['other']['end_line']) == (10, 12)
+    assert [(b['kind'], b['line'], b['end_line']) for b in parsed['blocks']] == [('methods', 1, 13)]
+
+
+def test_transpose_is_not_a_string(server):
+    code, masked, comment, continued = server.scan_matlab_line("y = x' * b'; s = 'it''s % not'; % real")
+    assert code.rstrip() == "y = x' * b'; s = 'it''s % not';"
+    assert comment == 'real'
+    assert not continued
+    # 字符串内容被屏蔽，转置运算符保留
+    assert "x' * b'" in masked and 'not' not in masked
+
+    _, _, comment, _ = server.scan_matlab_line("a = [b' c'] % tail")
+    assert comment == 'tail'
+
+
+def test_keywords_inside_strings_and_block_comments_are_ignored(server):
+    parsed = parse(server, """\
+        function out = main(x)
+        % Main help
+        %{
+          function fake(y)
+          end
+        %}
+        s = 'if while end';
+        out = x;
+        end
+        function helper()
+        end
+        """)
+    funcs = functions(parsed)
+    assert set(funcs) == {'main', 'helper'}
+    assert funcs['main']['end_line'] == 8
+    assert funcs['main']['comment'][0] == 'Main help'
+
+
+def test_block_comment_lines_are_comment_events(server):
+    events = list(server.lex_matlab("%{\nfunction fake()\n%}\nx = 1;"))
+    assert events[0] == ('comment', 1, 'function fake()')
+    assert events[1][0] == 'code' and events[1][1] == 3
+
+
+def test_continuation_joins_lines(server):
+    parsed = parse(server, """\
+        classdef C
+            properties
+                cache = struct('a', 1, ...
+                               'b', 2);  % cached values
+                order (1,1) double = 4
+            end
+            methods
+                function obj = run(obj, ...
+                                   data)
+                end
+            end
+        end
+        """)
+    props = {prop['name']: prop for prop in parsed['properties']}
+    assert props['cache']['default'] == "struct('a', 1, 'b', 2)"
+    assert props['cache']['comment'] == 'cached values'
+    assert props['order']['validation'] == '(1,1) double'
+    run = functions(parsed)['run']
+    assert run['params'] == 'obj, data'
+    assert (run['line'], run['end_line']) == (7, 9)
+
+
+def test_abstract_method_declarations(server):
+    parsed = parse(server, """\
+        classdef (Abstract) Base < handle & matlab.mixin.Copyable
+            methods (Abstract)
+                out = runThis(obj, data)
+                [a, b] = pair(obj)
+            end
+            methods (Static, Access = protected)
+                function helper()
+                end
+            end
+        end
+        """)
+    assert parsed['classdef']['name'] == 'Base'
+    assert parsed['classdef']['parents'] == ['handle', 'matlab.mixin.Copyable']
+    funcs = functions(parsed)
+    assert funcs['runThis']['returns'] == 'out'
+    assert funcs['runThis']['params'] == 'obj, data'
+    assert funcs['pair']['returns'] == '[a, b]'
+    assert 'Abstract' in funcs['runThis']['attributes']
+    assert 'Static' in funcs['helper']['attributes']
+    assert all(func['in_methods'] for func in funcs.values())
+
+
+def test_open_brackets_join_lines(server):
+    parsed = parse(server, """\
+        classdef C
+            properties
+                A = [1 2
+                     3 4];  % matrix
+                B = {'a', 'b'
+                     'c'}
+                C = 5
+            end
+        end
+        """)
+    props = {prop['name']: prop for prop in parsed['properties']}
+    assert set(props) == {'A', 'B', 'C'}
+    assert props['A']['default'] == '[1 2; 3 4]'
+    assert props['A']['comment'] == 'matrix'
+    assert props['B']['default'] == "{'a', 'b'; 'c'}"
+    assert props['C']['line'] == 6
+
+
+def test_unclosed_bracket_stops_at_function(server):
+    parsed = parse(server, """\
+        function a()
+        x = foo(1,
+        end
+        function b()
+        end
+        """)
+    assert set(functions(parsed)) == {'a', 'b'}
@@ -0,0 +1,51 @@
+"""相关模块推荐"""
+
+import threading
+
+
+def test_cooccurrence_counts_pipeline_steps_only(make_index, server):
+    lookups = make_index()['lookups']
+    scores = server.demo_cooccurrence(lookups)
+    # OpticalDensity 和 BeerLambertLaw 在两条流水线中都出现
+    assert scores[('+modules/BeerLambertLaw.m', '+modules/OpticalDensity.m')] == 1.0
+    assert ('+modules/BandPassFilter.m', '+modules/GLM.m') not in scores
+    # 示例中调用的加载函数不是流水线步骤
+    assert all('+io/loadNIRx.m' not in pair for pair in scores)
+
+
+def test_loaders_are_not_suggested_as_pipeline_neighbours(make_index, server):
+    index = make_index()
+    record = index['lookups']['modules']['+io/loadNIRx.m']
+    assert all('demo' not in entry['reasons'] for entry in server.suggest_related_modules(index, record))
+
+
+def test_related_table_built_outside_index_lock(make_index, server, monkeypatch):
+    index = make_index()
+    index['related'] = None
+    acquired = []
+    build = server.build_related_table
+    
+    def probe(lookups, term_docs):
+        def try_lock():
+            if index['lock'].acquire(timeout=1):
+                acquired.append(True)
+                index['lock'].release()
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        return build(lookups, term_docs)
+    
+    monkeypatch.setattr(server, 'build_related_table', probe)
+    table = server.get_related_table(index)
+    assert acquired == [True]
+    assert server.get_related_table(index) is table
+
+
+def test_related_table_rebuilt_after_lookups_change(make_index, server):
+    index = make_index()
+    table = server.get_related_table(index)
+    new_file = index['ns'] / '+modules' / 'Resample.m'
+    new_file.write_text("classdef Resample < nirs.modules.AbstractModule\n    % Resample data\nend\n")
+    server.refresh_paths(index, [new_file])
+    rebuilt = server.get_related_table(index)
+    assert rebuilt is not table and '+modules/Resample.m' in rebuilt
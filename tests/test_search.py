@@ -0,0 +1,67 @@
+"""倒排索引与查询解析"""
+
+
+def test_tokenize_splits_camel_case_and_keeps_full_identifier(server):
+    assert server.tokenize('BandPassFilter apply_GLM') == [
+        'bandpassfilter', 'band', 'pass', 'filter', 'apply_glm', 'apply', 'glm']
+
+
+def test_parse_query_switches_to_or_mode(server):
+    assert server.parse_query('band filter') == (['band', 'filter'], 'and')
+    assert server.parse_query('band OR glm') == (['band', 'glm'], 'or')
+    assert server.parse_query('band|glm') == (['band', 'glm'], 'or')
+    assert server.parse_query('band AND filter', 'or') == (['band', 'filter'], 'or')
+
+
+def test_query_terms_require_all_subwords(server):
+    assert server.query_terms('BandPass') == ['band', 'pass']
+    assert server.query_terms('glm') == ['glm']
+
+
+def test_and_or_and_prefix_queries(make_index, server):
+    search = make_index()['search']
+    assert set(server.run_search_query(search, 'band filter')) == {'+modules/BandPassFilter.m'}
+    assert set(server.run_search_query(search, 'bandpass glm')) == set()
+    assert set(server.run_search_query(search, 'bandpass OR glm')) == {
+        '+modules/BandPassFilter.m', '+modules/GLM.m'}
+    # 前缀匹配：hemo -> hemoglobin
+    assert set(server.run_search_query(search, 'hemo')) == {'+modules/BeerLambertLaw.m', '+modules/GLM.m'}
+
+
+def test_remove_document_drops_postings(server):
+    search = server.new_search_index()
+    server.add_document(search, 'a', {'name': ['alpha'], 'description': ['shared']})
+    server.add_document(search, 'b', {'name': ['beta'], 'description': ['shared']})
+    server.remove_document(search, 'a')
+    assert 'alpha' not in search['postings']
+    assert set(search['postings']['shared']) == {'b'}
+    assert search['field_total']['name'] == 1
+    assert server.expand_prefix(search, 'al') == []
+
+
+def test_bm25_name_hit_outranks_description_hit(server):
+    search = server.new_search_index()
+    server.add_document(search, 'name', {'name': ['filter'], 'description': ['other', 'words']})
+    server.add_document(search, 'desc', {'name': ['other'], 'description': ['filter', 'words']})
+    server.add_document(search, 'none', {'name': ['unrelated'], 'description': ['words']})
+    scores = server.bm25_scores(search, ['name', 'desc', 'none'], 'filter')
+    assert scores['name'] > scores['desc'] > 0
+    assert scores['none'] == 0
+
+
+def test_bm25_prefers_rare_terms_and_short_fields(server):
+    search = server.new_search_index()
+    server.add_document(search, 'short', {'description': ['glm']})
+    server.add_document(search, 'long', {'description': ['glm'] + ['padding'] * 20})
+    server.add_document(search, 'common', {'description': ['data']})
+    server.add_document(search, 'common2', {'description': ['data']})
+    server.add_document(search, 'common3', {'description': ['data']})
+    scores = server.bm25_scores(search, ['short', 'long'], 'glm')
+    assert scores['short'] > scores['long']
+    assert server.bm25_scores(search, ['short'], 'glm')['short'] > \
+        server.bm25_scores(search, ['common'], 'data')['common']
+
+
+def test_query_index_ranks_module_name_first(make_index, server):
+    hits, scores, _ = server.query_index(make_index(), 'filter')
+    assert max(scores, key=scores.get) == '+modules/BandPassFilter.m'
@@ -0,0 +1,29 @@
+"""索引快照"""
+
+import json
+
+
+def test_snapshot_round_trip(make_index, server, monkeypatch, tmp_path):
+    monkeypatch.setattr(server, 'INDEX_SNAPSHOT_PATH', str(tmp_path / 'snapshot'))
+    index = make_index()
+    path = server.save_index_snapshot(index)
+    # JSON 快照，不含绝对路径
+    payload = json.loads(path.read_text(encoding='utf-8'))
+    assert 'path' not in payload['modules']['+modules/GLM.m']
+    
+    restored = server.new_index(index['root'])
+    assert server.load_index_snapshot(restored)
+    assert restored['lookups']['modules'] == index['lookups']['modules']
+    assert restored['lookups']['demos'] == index['lookups']['demos']
+    assert restored['search']['postings'] == index['search']['postings']
+    assert server.sync_index(restored)['unchanged'] == len(index['lookups']['modules']) + len(index['lookups']['demos'])
+
+
+def test_snapshot_rejects_paths_outside_toolbox(make_index, server, monkeypatch, tmp_path):
+    monkeypatch.setattr(server, 'INDEX_SNAPSHOT_PATH', str(tmp_path / 'snapshot'))
+    index = make_index()
+    path = server.save_index_snapshot(index)
+    payload = json.loads(path.read_text(encoding='utf-8'))
+    payload['modules']['../../etc/x.m'] = dict(payload['modules']['+modules/GLM.m'], rel='../../etc/x.m')
+    path.write_text(json.dumps(payload), encoding='utf-8')
+    assert not server.load_index_snapshot(server.new_index(index['root']))
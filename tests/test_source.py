@@ -0,0 +1,89 @@
+"""源代码分段读取与续读 cursor"""
+
+import asyncio
+import os
+
+import pytest
+
+
+def read_all(server, record, max_bytes):
+    chunk = server.read_source_chunk(record, max_bytes=max_bytes)
+    text = chunk['text']
+    while chunk['next_cursor']:
+        chunk = server.read_source_chunk(record, chunk['next_cursor'], max_bytes=max_bytes)
+        text += chunk['text']
+    return text
+
+
+def test_cursor_pages_through_whole_file(make_index, server):
+    record = make_index()['lookups']['modules']['+modules/BandPassFilter.m']
+    assert read_all(server, record, 256) == record['path'].read_text()
+
+
+def test_line_range(make_index, server):
+    record = make_index()['lookups']['modules']['+modules/BandPassFilter.m']
+    chunk = server.read_source_chunk(record, start_line=3, end_line=6)
+    assert (chunk['start_line'], chunk['end_line']) == (3, 6)
+    assert chunk['text'].splitlines()[0].strip() == 'properties'
+    assert not chunk['next_cursor']
+
+
+def test_cursor_rejected_after_file_changes(make_index, server):
+    record = make_index()['lookups']['modules']['+modules/BandPassFilter.m']
+    chunk = server.read_source_chunk(record, max_bytes=256)
+    # 索引记录没有更新，文件指纹按打开文件的 fstat 校验
+    path = record['path']
+    path.write_text(path.read_text().replace('0.01', '0.02'))
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10**9,) * 2)
+    with pytest.raises(ValueError, match='源文件已变化'):
+        server.read_source_chunk(record, chunk['next_cursor'])
+
+
+def test_invalid_cursor(make_index, server):
+    record = make_index()['lookups']['modules']['+io/loadNIRx.m']
+    with pytest.raises(ValueError, match='无效的 cursor'):
+        server.read_source_chunk(record, 'abc')
+
+
+def read_section(server, record, name, max_bytes=16384):
+    sections, stat = server.current_sections(record)
+    found, span = server.find_section(sections, name)
+    return found, server.read_section_chunk(record, span, stat, max_bytes)
+
+
+def test_section_reads_only_the_method(make_index, server):
+    record = make_index()['lookups']['modules']['+modules/BandPassFilter.m']
+    name, chunk = read_section(server, record, 'RUNTHIS')
+    assert name == 'runThis'
+    lines = chunk['text'].splitlines()
+    assert lines[0].strip() == 'function data = runThis(obj, data)'
+    assert lines[-1].strip() == 'end'
+    assert 'properties' not in chunk['text']
+
+
+def test_section_continuation_stops_at_section_end(make_index, server):
+    record = make_index()['lookups']['modules']['+modules/BandPassFilter.m']
+    _, chunk = read_section(server, record, 'runThis', max_bytes=256)
+    text = chunk['text']
+    while chunk['next_cursor']:
+        chunk = server.read_source_chunk(record, chunk['next_cursor'], max_bytes=256)
+        text += chunk['text']
+    _, whole = read_section(server, record, 'runThis')
+    assert text == whole['text']
+
+
+def test_section_offsets_follow_edited_file(make_index, server):
+    record = make_index()['lookups']['modules']['+modules/BandPassFilter.m']
+    # 方法前插入几行，索引记录中的偏移已过期
+    path = record['path']
+    path.write_text(path.read_text().replace('    properties\n', '    % added\n    % lines\n    properties\n', 1))
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10**9,) * 2)
+    _, chunk = read_section(server, record, 'runThis')
+    assert chunk['text'].splitlines()[0].strip() == 'function data = runThis(obj, data)'
+    assert chunk['start_line'] == record['sections']['runThis']['start_line'] + 2
+
+
+def test_missing_section_lists_available(make_index, server):
+    record = make_index()['lookups']['modules']['+modules/BandPassFilter.m']
+    output = asyncio.run(server.format_module_section(record, 'nope'))
+    assert output.startswith('❌') and '`runThis`' in output
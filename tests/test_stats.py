@@ -0,0 +1,28 @@
+"""请求级 I/O 统计"""
+
+
+def counted(server, fn, *args):
+    counters = {'files_opened': 0, 'bytes_read': 0}
+    token = server._IO_COUNTERS.set(counters)
+    try:
+        result = fn(*args)
+    finally:
+        server._IO_COUNTERS.reset(token)
+    return result, counters
+
+
+def test_read_text_file_counts_raw_bytes(server, tmp_path):
+    path = tmp_path / 'demo.m'
+    path.write_bytes('% 预处理示例\r\nx = 1;\r\n'.encode('utf-8'))
+    text, counters = counted(server, server.read_text_file, path)
+    assert text == '% 预处理示例\nx = 1;\n'
+    assert counters == {'files_opened': 1, 'bytes_read': path.stat().st_size}
+
+
+def test_scan_demo_file_counts_raw_bytes(server, tmp_path):
+    path = tmp_path / 'demo.m'
+    path.write_bytes('% 中文简介\njob = nirs.modules.OpticalDensity();\n'.encode('utf-8'))
+    record, counters = counted(server, server.scan_demo_file, path)
+    assert record['summary'] == '中文简介'
+    # 只读取一次，按字节计
+    assert counters == {'files_opened': 1, 'bytes_read': path.stat().st_size}
@@ -0,0 +1,63 @@
+"""模块名模糊匹配：三元组召回、编辑距离阈值与"你是不是要找"提示"""
+
+import asyncio
+
+
+def test_edit_distance(server):
+    assert server.edit_distance('kitten', 'sitting') == 3
+    assert server.edit_distance('sitting', 'kitten') == 3
+    assert server.edit_distance('', 'glm') == 3
+    assert server.edit_distance('glm', 'glm') == 0
+
+
+def test_name_trigrams_are_lowercase_with_boundaries(server):
+    assert server.name_trigrams('GLM') == {'$gl', 'glm', 'lm$'}
+    trigrams = server.build_name_trigrams(['GLM', 'GLMx'])
+    assert trigrams['glm'] == ['GLM', 'GLMx']
+    assert trigrams['lm$'] == ['GLM']
+
+
+def test_trigram_candidates_ranked_by_distance(make_index, server):
+    index = make_index()
+    assert server.suggest_module_names(index, 'BandPasFilter') == [('BandPassFilter', 1)]
+    # 忽略大小写
+    assert server.suggest_module_names(index, 'bandpassfilter') == [('BandPassFilter', 0)]
+    # 没有共享三元组的名称不会成为候选，即使编辑距离在阈值内
+    assert server.suggest_module_names(index, 'XYZ') == []
+
+
+def test_candidate_pool_is_capped_by_trigram_overlap(make_index, server, monkeypatch):
+    index = make_index({'+nirs/+modules/GLMxFoo.m': 'function GLMxFoo()\nend\n'})
+    # GLMxFoo 共享的三元组更多但距离超出阈值，GLM 共享较少但距离为 1
+    assert server.suggest_module_names(index, 'GLMx') == [('GLM', 1)]
+    monkeypatch.setattr(server, 'FUZZY_MAX_CANDIDATES', 1)
+    assert server.suggest_module_names(index, 'GLMx') == []
+
+
+def test_limit(make_index, server):
+    index = make_index({f'+nirs/+modules/GLM{i}.m': f'function GLM{i}()\nend\n' for i in range(8)})
+    suggestions = server.suggest_module_names(index, 'GLMx')
+    assert len(suggestions) == 5 and suggestions[0] == ('GLM', 1)
+    assert len(server.suggest_module_names(index, 'GLMx', limit=2)) == 2
+
+
+def test_edit_distance_cutoff(make_index, server):
+    index = make_index()
+    # 长度 11，阈值 3：距离 3 保留
+    assert server.suggest_module_names(index, 'OpticalDens') == [('OpticalDensity', 3)]
+    # 长度 9，阈值 3：距离 5 丢弃
+    assert server.suggest_module_names(index, 'OpticalDe') == []
+    # 短名称阈值至少为 2
+    assert server.suggest_module_names(index, 'GL') == [('GLM', 1)]
+
+
+def test_not_found_message_lists_suggestions(make_index, server):
+    index = make_index()
+    assert server.module_not_found(index, 'BandPasFilter') == "❌ 模块 'BandPasFilter' 不存在。你是不是要找：`BandPassFilter`"
+    assert server.module_not_found(index, 'zzzz') == "❌ 模块 'zzzz' 不存在。使用 search_module() 搜索模块。"
+    assert server.module_not_found(index, 'zzzz', as_json=True) == {'error': "模块 'zzzz' 不存在", 'suggestions': []}
+
+
+def test_tool_reports_suggestions(server, default_index):
+    result = asyncio.run(server.get_module_details('OpticalDensty'))
+    assert result.startswith("❌ 模块 'OpticalDensty' 不存在。你是不是要找：`OpticalDensity`")
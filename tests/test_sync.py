@@ -0,0 +1,105 @@
+"""索引同步"""
+
+import threading
+
+import pytest
+
+
+def test_sync_parses_without_holding_index_lock(make_index, server, monkeypatch):
+    index = make_index()
+    path = index['lookups']['modules']['+modules/GLM.m']['path']
+    path.write_text(path.read_text().replace('basis', 'basis\n        contrasts', 1))
+    
+    acquired = []
+    analyze_jobs = server.analyze_jobs
+    
+    def probe(index, jobs):
+        # 在另一个线程中尝试获取索引锁：解析期间查询不应被阻塞
+        def try_lock():
+            if index['lock'].acquire(timeout=1):
+                acquired.append(True)
+                index['lock'].release()
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        return analyze_jobs(index, jobs)
+    
+    monkeypatch.setattr(server, 'analyze_jobs', probe)
+    changes = server.sync_index(index)
+    assert acquired == [True]
+    assert changes['updated'] == 1
+    assert index['lookups']['modules']['+modules/GLM.m']['property_names'] == ['basis', 'contrasts']
+    assert server.run_search_query(index['search'], 'contrasts') == {'+modules/GLM.m': 1}
+
+
+def test_refresh_paths_adds_and_removes(make_index, server):
+    index = make_index()
+    new_file = index['ns'] / '+modules' / 'Resample.m'
+    new_file.write_text("classdef Resample < nirs.modules.AbstractModule\n    % Resample data\nend\n")
+    old_file = index['ns'] / '+io' / 'loadNIRx.m'
+    old_file.unlink()
+    changes = server.refresh_paths(index, [new_file, old_file])
+    assert (changes['added'], changes['removed']) == (1, 1)
+    assert 'Resample' in index['lookups']['by_name'] and 'loadNIRx' not in index['lookups']['by_name']
+    assert '+io/loadNIRx.m' not in index['search']['doc_terms']
+
+
+
+def test_lookups_are_published_as_one_read_only_object(make_index, server):
+    index = make_index()
+    before = index['lookups']
+    with pytest.raises(TypeError):
+        before['modules'] = {}
+    
+    new_file = index['ns'] / '+modules' / 'Resample.m'
+    new_file.write_text("classdef Resample < nirs.modules.AbstractModule\n    % Resample data\nend\n")
+    server.refresh_paths(index, [new_file])
+    # 旧对象不变，读取方拿到的各表彼此一致
+    assert '+modules/Resample.m' not in before['modules'] and 'Resample' not in before['by_name']
+    assert index['lookups']['by_name']['Resample'] == ['+modules/Resample.m']
+
+
+def test_single_file_edit_updates_tables_incrementally(make_index, server):
+    index = make_index()
+    before = index['lookups']
+    path = before['modules']['+modules/GLM.m']['path']
+    path.write_text(path.read_text().replace('S = data;', 'S = nirs.core.Data();'))
+    server.refresh_paths(index, [path])
+    
+    after = index['lookups']
+    # 路径、父类和简介都没变：名称表、继承图和工作流目录直接沿用
+    assert after['by_name'] is before['by_name']
+    assert after['graph'] is before['graph']
+    assert after['workflows'] is before['workflows']
+    # 引用索引增量更新，结果与全量重建一致
+    assert ('module', '+modules/GLM.m') in after['references']['nirs.core.Data']
+    assert after['references'] == server.build_reference_index(after['modules'], after['demos'])
+    assert ('module', '+modules/GLM.m') not in before['references'].get('nirs.core.Data', {})
+
+
+def test_readers_never_see_half_updated_tables(make_index, server):
+    index = make_index()
+    new_file = index['ns'] / '+modules' / 'Resample.m'
+    errors = []
+    done = threading.Event()
+    
+    def reader():
+        while not done.is_set():
+            try:
+                server.resolve_module(index, 'Resample')
+                server.resolve_class(index, 'nirs.modules.Resample')
+                server.inherited_members(index, 'nirs.modules.Resample')
+                server.category_records(index, 'modules')
+            except Exception as e:
+                errors.append(e)
+    
+    thread = threading.Thread(target=reader)
+    thread.start()
+    for _ in range(30):
+        new_file.write_text("classdef Resample < nirs.modules.AbstractModule\nend\n")
+        server.refresh_paths(index, [new_file])
+        new_file.unlink()
+        server.refresh_paths(index, [new_file])
+    done.set()
+    thread.join()
+    assert errors == []
@@ -0,0 +1,61 @@
+"""示例流水线挖掘与工作流检索"""
+
+import textwrap
+
+
+def test_extract_workflows_chains_steps_and_options(server):
+    workflows = server.extract_workflows(textwrap.dedent("""\
+        raw = nirs.io.loadNIRx('data');
+        job = nirs.modules.OpticalDensity();
+        job = nirs.modules.BandPassFilter(job);
+        job.lowpass = 0.3;  % options belong to the previous step
+        job = nirs.modules.BeerLambertLaw(job);
+        hb = job.run(raw);
+        job = nirs.modules.GLM();
+        job = 5;
+        """))
+    assert len(workflows) == 1
+    steps = workflows[0]['steps']
+    assert [step['module'] for step in steps] == [
+        'nirs.modules.OpticalDensity', 'nirs.modules.BandPassFilter', 'nirs.modules.BeerLambertLaw']
+    assert steps[1]['options'] == ['job.lowpass = 0.3']
+    assert (workflows[0]['line'], steps[2]['line']) == (2, 5)
+
+
+def test_catalog_merges_identical_sequences(make_index):
+    index = make_index({'demos/copy_demo.m': "% Another preprocessing copy\n"
+                        "j = nirs.modules.OpticalDensity();\n"
+                        "j = nirs.modules.BandPassFilter(j);\n"
+                        "j = nirs.modules.BeerLambertLaw(j);\n"})
+    entries = index['lookups']['workflows']['entries']
+    assert len(entries) == 2
+    preprocessing = next(entry for entry in entries if len(entry['demos']) == 2)
+    assert [demo for demo, _ in preprocessing['demos']] == ['copy_demo', 'preprocessing_demo']
+
+
+def test_task_words_match_by_stem_prefix(make_index, server):
+    index = make_index()
+    for task in ('filtering', 'preprocess', 'regression'):
+        matches = server.match_workflows(index, task)
+        assert matches, task
+    assert 'nirs.modules.BandPassFilter' in server.match_workflows(index, 'filtering')[0][0]['modules']
+    assert 'nirs.modules.GLM' in server.match_workflows(index, 'regression')[0][0]['modules']
+    assert server.match_workflows(index, 'tomography') == []
+
+
+def test_preprocessing_falls_back_to_typical_modules(make_index, server):
+    # 示例中没有出现 preprocess 一词时，常见任务名仍能找到对应的流水线
+    index = make_index({
+        'demos/preprocessing_demo.m': None,
+        'demos/glm_demo.m': None,
+        'demos/first_demo.m': "% Shows a basic chain\n"
+                              "job = nirs.modules.OpticalDensity();\n"
+                              "job = nirs.modules.BandPassFilter(job);\n"
+                              "job = nirs.modules.BeerLambertLaw(job);\n",
+        'demos/stats_demo.m': "% Statistics only\n"
+                              "job = nirs.modules.GLM();\n"
+                              "job = nirs.modules.AbstractModule(job);\n",
+    })
+    matches = server.match_workflows(index, 'preprocessing')
+    assert matches[0][0]['demos'][0][0] == 'first_demo'
+    assert server.match_workflows(index, 'glm')[0][0]['demos'][0][0] == 'stats_demo'